@@ -0,0 +1,1087 @@
+"""
+Microbenchmarks: Lcore internals in isolation.
+Each section times one hot path (parsers, header handling, codecs, middleware)
+without the noise of full framework comparisons.
+
+Usage:
+    python microbench.py                 # Run every section
+    python microbench.py multipart       # Run selected sections only
+    python microbench.py multipart --size 1024   # 1 GB multipart upload
+    python microbench.py save --dest /mnt/other  # save() across filesystems
+"""
+import time
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+def _arg(name, default):
+    if name in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+SIZE_MB = _arg('--size', 64)
+RUNS = 3
+
+
+def timeit(func, runs=RUNS):
+    """Call func() `runs` times, return the best wall-clock time in seconds."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def per_call_us(func, iterations=100_000):
+    """Best average cost of func() in microseconds."""
+    def loop():
+        for _ in range(iterations):
+            func()
+    return timeit(loop) / iterations * 1_000_000
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  MULTIPART
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class _ChunkedPayload(io.RawIOBase):
+    """Repeats one block up to `size` bytes without holding it all in memory."""
+
+    def __init__(self, head, block, size, tail):
+        self.parts = [head, block, tail]
+        self.size, self.pos = size, 0
+        self.total = len(head) + size + len(tail)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        head, block, tail = self.parts
+        if self.pos >= self.total:
+            return 0
+        if self.pos < len(head):
+            data = head[self.pos:self.pos + len(b)]
+        elif self.pos < len(head) + self.size:
+            off = (self.pos - len(head)) % len(block)
+            left = len(head) + self.size - self.pos
+            data = block[off:off + min(len(b), left)]
+        else:
+            off = self.pos - len(head) - self.size
+            data = tail[off:off + len(b)]
+        b[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+
+def _multipart_stream(block, size):
+    boundary = 'lcoreBenchBoundary7MA4YWxkTrZu0gW'
+    head = ('--%s\r\nContent-Disposition: form-data; name="upload"; '
+            'filename="data.bin"\r\nContent-Type: application/octet-stream'
+            '\r\n\r\n' % boundary).encode()
+    tail = ('\r\n--%s--\r\n' % boundary).encode()
+    stream = io.BufferedReader(_ChunkedPayload(head, block, size, tail),
+                               buffer_size=2 ** 16)
+    return stream, boundary, len(head) + size + len(tail)
+
+
+def bench_multipart():
+    from lcore import _MultipartParser
+
+    size = SIZE_MB * 1024 * 1024
+    payloads = {
+        'binary (few CRLF)': os.urandom(1024 * 1024),
+        'text (16b lines)': b'abcdefghijklmn\r\n' * 65536,
+    }
+    print(f"Multipart upload: one {SIZE_MB} MB file part, spooled to disk")
+    for label, block in payloads.items():
+        def run():
+            stream, boundary, total = _multipart_stream(block, size)
+            parser = _MultipartParser(stream, boundary, total,
+                                      disk_limit=2 ** 40,
+                                      mem_limit=102400, memfile_limit=102400)
+            for part in parser.parse():
+                assert part.size == size, part.size
+                part.close()
+        best = timeit(run, runs=1 if SIZE_MB >= 512 else RUNS)
+        print(f"  {label:<20} {best:>8.2f} s {SIZE_MB / best:>10.1f} MB/s")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  FILEUPLOAD.SAVE
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def bench_save():
+    from lcore import FileUpload
+
+    size = SIZE_MB * 1024 * 1024
+    dest_dir = tempfile.mkdtemp(dir=_arg('--dest', '') or None)
+    src = tempfile.NamedTemporaryFile(prefix='lcore-bench-')
+    block = os.urandom(1024 * 1024)
+    for _ in range(SIZE_MB):
+        src.write(block)
+    src.flush()
+    src.seek(0)
+
+    def python_loop(upload, dest):
+        with open(dest, 'wb') as fp:
+            while 1:
+                buf = upload.file.read(2 ** 16)
+                if not buf: break
+                fp.write(buf)
+        upload.file.seek(0)
+
+    def save_kernel(upload, dest):
+        upload.save(dest, overwrite=True)
+
+    def save_link(upload, dest):
+        upload._spooled = True
+        upload.save(dest, overwrite=True)
+
+    modes = [('python 64K loop', python_loop),
+             ('save() kernel copy', save_kernel),
+             ('save() link', save_link)]
+    print(f"FileUpload.save: {SIZE_MB} MB spooled upload -> {dest_dir}")
+    try:
+        for label, func in modes:
+            upload = FileUpload(src, 'upload', 'data.bin')
+            dest = os.path.join(dest_dir, 'out.bin')
+
+            def run():
+                if os.path.exists(dest):
+                    os.unlink(dest)
+                func(upload, dest)
+            best = timeit(run)
+            print(f"  {label:<20} {best * 1000:>8.2f} ms {SIZE_MB / best:>10.1f} MB/s")
+    finally:
+        src.close()
+        shutil.rmtree(dest_dir)
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  REQUEST HEADERS
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def _browser_environ(path='/'):
+    return {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '8080',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'CONTENT_LENGTH': '',
+        'HTTP_HOST': 'localhost:8080',
+        'HTTP_USER_AGENT': 'Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0',
+        'HTTP_ACCEPT': 'text/html,application/xhtml+xml,*/*;q=0.8',
+        'HTTP_ACCEPT_LANGUAGE': 'en-US,en;q=0.5',
+        'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br',
+        'HTTP_ORIGIN': 'https://example.com',
+        'HTTP_REFERER': 'https://example.com/page',
+        'HTTP_COOKIE': 'session=abc123; theme=dark; lang=en',
+        'HTTP_CONNECTION': 'keep-alive',
+    }
+
+
+def bench_headers():
+    from lcore import (Lcore, WSGIHeaderDict, CORSMiddleware,
+                       CompressionMiddleware, RequestIDMiddleware,
+                       SecurityHeadersMiddleware)
+
+    environ = _browser_environ()
+    names = ('Origin', 'Accept-Encoding', 'X-Request-ID', 'X-CSRF-Token',
+             'Content-Type', 'Host', 'Authorization', 'If-None-Match')
+
+    def lookups():
+        headers = WSGIHeaderDict(environ)
+        for name in names:
+            headers.get(name)
+
+    def snapshot():
+        headers = WSGIHeaderDict(environ)
+        if hasattr(headers, 'snapshot'):
+            return headers.snapshot()
+        return dict(headers.items())
+
+    app = Lcore()
+    app.use(RequestIDMiddleware())
+    app.use(CORSMiddleware(allow_origins=['https://example.com']))
+    app.use(SecurityHeadersMiddleware())
+    app.use(CompressionMiddleware())
+
+    @app.route('/')
+    def index():
+        return 'ok'
+
+    def full_request():
+        body = app.wsgi(dict(environ), lambda status, headers, exc=None: None)
+        for _ in body:
+            pass
+
+    print("Request headers: 13-header browser request")
+    print(f"  {'8 header lookups':<28} {per_call_us(lookups):>8.2f} us")
+    print(f"  {'snapshot of all headers':<28} {per_call_us(snapshot):>8.2f} us")
+    print(f"  {'4-middleware request':<28} "
+          f"{per_call_us(full_request, 20_000):>8.2f} us")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  COOKIES
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def _analytics_cookie_header(size=3500):
+    import random
+    rnd = random.Random(42)
+    pairs = ['_ga=GA1.2.1234567890.1700000000', '_gid=GA1.2.987654321.1700000000']
+    while sum(len(p) + 2 for p in pairs) < size:
+        name = '_%s_%d' % (rnd.choice(['fbp', 'hjid', 'uetsid', 'clck', 'gcl_au']),
+                           len(pairs))
+        value = ''.join(rnd.choice('abcdef0123456789') for _ in range(rnd.randint(20, 90)))
+        pairs.append('%s=%s' % (name, value))
+    pairs.insert(len(pairs) // 2, 'session=s3ss10n-t0k3n')
+    return '; '.join(pairs)
+
+
+def bench_cookies():
+    from http.cookies import SimpleCookie
+    import lcore
+    from lcore import BaseRequest, FormsDict
+
+    header = _analytics_cookie_header()
+    environ = {'HTTP_COOKIE': header}
+
+    def simplecookie():
+        cookies = SimpleCookie(header).values()
+        return FormsDict((c.key, c.value) for c in cookies).get('session')
+
+    def parse_cold():
+        lcore._cookie_cache.clear()
+        return BaseRequest(dict(environ)).cookies.get('session')
+
+    def parse_cached():
+        return BaseRequest(dict(environ)).cookies.get('session')
+
+    def get_cookie_scan():
+        lcore._cookie_cache.clear()
+        return BaseRequest(dict(environ)).get_cookie('session')
+
+    def get_cookie_cached():
+        return BaseRequest(dict(environ)).get_cookie('session')
+
+    assert simplecookie() == parse_cold() == get_cookie_scan() == 's3ss10n-t0k3n'
+    lcore._cookie_cache.clear()
+    parse_cached()
+    print(f"Cookies: {len(header)} byte header, "
+          f"{header.count(';') + 1} cookies, read 'session'")
+    for label, func in [('SimpleCookie + FormsDict', simplecookie),
+                        ('request.cookies (cold)', parse_cold),
+                        ('request.cookies (cached)', parse_cached),
+                        ('get_cookie() scan', get_cookie_scan),
+                        ('get_cookie() cached', get_cookie_cached)]:
+        print(f"  {label:<28} {per_call_us(func, 10_000):>8.2f} us")
+
+
+def bench_signed_cookies():
+    import base64, hashlib, hmac, json
+    from lcore import CookieCodec
+
+    secret = b'bench-secret-0123456789abcdef'
+    value = 'user:4242|role:admin|exp:1893456000'
+
+    def legacy_encode():
+        msg = base64.b64encode(json.dumps(['session', value]).encode())
+        sig = base64.b64encode(hmac.new(secret, msg, hashlib.sha256).digest())
+        return (b'!' + sig + b'?' + msg).decode()
+
+    raw = legacy_encode()
+
+    def legacy_decode():
+        sig, msg = map(str.encode, raw[1:].split('?', 1))
+        hashed = hmac.new(secret, msg, hashlib.sha256).digest()
+        if hmac.compare_digest(sig, base64.b64encode(hashed)):
+            return json.loads(base64.b64decode(msg))[1]
+
+    cold = CookieCodec(secret, cache_size=0)
+    warm = CookieCodec(secret)
+    assert cold.decode('session', raw) == warm.decode('session', raw) == value
+
+    print("Signed cookies: HMAC-SHA256 session cookie")
+    for label, func in [('old encode (per call HMAC)', legacy_encode),
+                        ('codec encode, no cache', lambda: cold.encode('session', value)),
+                        ('codec encode, cached', lambda: warm.encode('session', value)),
+                        ('old decode (per call HMAC)', legacy_decode),
+                        ('codec decode, no cache', lambda: cold.decode('session', raw)),
+                        ('codec decode, cached', lambda: warm.decode('session', raw))]:
+        print(f"  {label:<28} {per_call_us(func):>8.2f} us")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  RESPONSE HEADERS
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def bench_response_headers():
+    import lcore
+    from lcore import BaseResponse, SecurityHeadersMiddleware
+
+    security = SecurityHeadersMiddleware(hsts=True).headers
+
+    def set_one_by_one():
+        r = BaseResponse()
+        for name, value in security.items():
+            r.set_header(name, value)
+
+    block = getattr(lcore, 'HeaderBlock', None)
+    block = block(security) if block else None
+
+    def set_block():
+        BaseResponse().set_headers(block)
+
+    r = BaseResponse()
+    r.set_header('Content-Type', 'application/json')
+    r.set_header('Content-Length', '1234')
+    r.set_header('Cache-Control', 'no-store')
+    r.set_header('X-Request-ID', 'b3f1c2d4-8e9a-4f6b-a1c2-d3e4f5a6b7c8')
+    for name, value in security.items():
+        r.set_header(name, value)
+
+    print("Response headers: 5 security headers, 9-header headerlist")
+    print(f"  {'set_header() x5':<28} {per_call_us(set_one_by_one):>8.2f} us")
+    if block is not None:
+        print(f"  {'set_headers(HeaderBlock)':<28} {per_call_us(set_block):>8.2f} us")
+    print(f"  {'headerlist':<28} {per_call_us(lambda: r.headerlist):>8.2f} us")
+
+
+def bench_hkey():
+    import lcore
+    from lcore import BaseResponse, touni
+
+    def old_hkey(key):
+        key = touni(key)
+        if '\n' in key or '\r' in key or '\0' in key:
+            raise ValueError(key)
+        return key.title().replace('_', '-')
+
+    names = ('Content-Type', 'content-length', 'X-Request-ID', 'Cache-Control',
+             'x-app-trace', 'X-App-Trace', 'etag', 'Vary')
+
+    def run(hkey):
+        def loop():
+            for name in names:
+                hkey(name)
+        return loop
+
+    def set_headers():
+        r = BaseResponse()
+        for name in names:
+            r.set_header(name, 'v')
+
+    print(f"Header names: {len(names)} names per call (standard + custom)")
+    print(f"  {'old _hkey':<28} {per_call_us(run(old_hkey)):>8.2f} us")
+    print(f"  {'_hkey (interned/memo)':<28} {per_call_us(run(lcore._hkey)):>8.2f} us")
+    print(f"  {'set_header() x8':<28} {per_call_us(set_headers):>8.2f} us")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  STATIC RESPONSES
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def bench_precomputed():
+    from lcore import Lcore, PrecomputedResponse
+
+    app = Lcore()
+    flags = {'dark_mode': True, 'beta': False, 'max_items': 50,
+             'regions': ['eu', 'us', 'ap']}
+    flags_response = PrecomputedResponse(flags, headers={'Cache-Control': 'no-cache'})
+
+    @app.route('/health')
+    def health():
+        return 'ok'
+
+    @app.route('/health/pre')
+    def health_pre(_ok=PrecomputedResponse('ok')):
+        return _ok
+
+    @app.route('/flags')
+    def flags_dynamic():
+        app_response.set_header('Cache-Control', 'no-cache')
+        return flags
+
+    @app.route('/flags/pre')
+    def flags_pre():
+        return flags_response
+
+    from lcore import response as app_response
+
+    def call(path):
+        def run():
+            for _ in app.wsgi(_browser_environ(path), lambda s, h, e=None: None):
+                pass
+        return run
+
+    print("Static responses: full app.wsgi() round trip")
+    for label, path in [('str body', '/health'),
+                        ('PrecomputedResponse', '/health/pre'),
+                        ('dict -> JSON each time', '/flags'),
+                        ('PrecomputedResponse(JSON)', '/flags/pre')]:
+        print(f"  {label:<28} {per_call_us(call(path), 20_000):>8.2f} us")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  JSON
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def _json_payloads():
+    user = {'id': 1, 'name': 'Ada Lovelace', 'email': 'ada@example.com',
+            'active': True, 'score': 98.5, 'tags': ['admin', 'beta']}
+    return {
+        'small (1 object)': user,
+        'medium (100 objects)': {'items': [dict(user, id=i) for i in range(100)]},
+        'large (10k objects)': {'items': [dict(user, id=i) for i in range(10_000)]},
+    }
+
+
+def bench_json():
+    from lcore import Lcore, _json_backend
+
+    print("JSON serialization: dumps() + encode to bytes")
+    backends = {}
+    for name in ('json', 'ujson', 'orjson'):
+        try:
+            backends[name] = _json_backend(name)
+        except ImportError:
+            print(f"  ({name} not installed, skipped)")
+
+    def to_bytes(dumps, obj):
+        out = dumps(obj)
+        return out if isinstance(out, bytes) else out.encode('utf8')
+
+    for label, payload in _json_payloads().items():
+        iterations = 200 if 'large' in label else 20_000
+        for name, dumps in backends.items():
+            us = per_call_us(lambda: to_bytes(dumps, payload), iterations)
+            print(f"  {label:<22} {name:<7} {us:>10.2f} us")
+
+    print("JSON responses: full app.wsgi() round trip, medium payload")
+    medium = _json_payloads()['medium (100 objects)']
+    for name in backends:
+        app = Lcore()
+        app.config['json.dump_func'] = name
+
+        @app.route('/')
+        def index():
+            return medium
+
+        def run():
+            for _ in app.wsgi(_browser_environ('/'), lambda s, h, e=None: None):
+                pass
+        print(f"  {name:<30} {per_call_us(run, 5_000):>8.2f} us")
+
+
+def bench_streaming_json():
+    import tracemalloc
+    from lcore import Lcore, StreamingJSON
+
+    count = _arg('--rows', 50_000)
+    rows = [{'id': i, 'name': 'user%d' % i, 'email': 'user%d@example.com' % i,
+             'active': i % 3 == 0, 'score': i * 0.5} for i in range(count)]
+
+    app = Lcore()
+
+    @app.route('/full')
+    def full():
+        return {'items': rows}
+
+    @app.route('/stream')
+    def stream():
+        return StreamingJSON(rows)
+
+    def measure(path, trace=False):
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        first = None
+        total = 0
+        for chunk in app.wsgi(_browser_environ(path), lambda s, h, e=None: None):
+            if first is None:
+                first = time.perf_counter() - start
+            total += len(chunk)
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return first, elapsed, peak, total
+
+    print(f"Streaming JSON: {count} rows")
+    print(f"  {'':<26} {'first byte':>11} {'total':>9} {'peak mem':>10}")
+    for label, path in [('dict -> one JSON string', '/full'),
+                        ('StreamingJSON', '/stream')]:
+        measure(path)  # warm up
+        first, elapsed, _, total = measure(path)
+        peak = measure(path, trace=True)[2]
+        print(f"  {label:<26} {first * 1000:>8.1f} ms {elapsed * 1000:>6.1f} ms"
+              f" {peak / 2 ** 20:>7.1f} MB  ({total / 2 ** 20:.1f} MB sent)")
+
+
+def bench_response_models():
+    import dataclasses
+    import datetime
+    from typing import List
+    from lcore import Lcore, _json_encoder, json_dumps
+
+    @dataclasses.dataclass
+    class Address:
+        city: str
+        country: str
+
+    @dataclasses.dataclass
+    class User:
+        id: int
+        name: str
+        email: str
+        active: bool
+        score: float
+        created: datetime.datetime
+        address: Address
+        tags: List[str]
+
+    created = datetime.datetime(2024, 1, 1, 12, 30)
+    users = [User(i, 'Ada Lovelace', 'ada@example.com', True, 98.5, created,
+                  Address('London', 'UK'), ['admin', 'beta']) for i in range(100)]
+
+    def via_asdict(items):
+        out = []
+        for user in items:
+            data = dataclasses.asdict(user)
+            data['created'] = data['created'].isoformat()
+            out.append(data)
+        return json_dumps(out)
+
+    encode = _json_encoder(List[User])
+    print("Response models: 100 nested dataclasses -> JSON")
+    for label, func in [('asdict() + json', lambda: via_asdict(users)),
+                        ('compiled encoder + json', lambda: json_dumps(encode(users)))]:
+        print(f"  {label:<28} {per_call_us(func, 2_000):>8.2f} us")
+
+    app = Lcore()
+
+    @app.route('/')
+    def index() -> List[User]:
+        return users
+
+    def run():
+        for _ in app.wsgi(_browser_environ('/'), lambda s, h, e=None: None):
+            pass
+    print(f"  {'app.wsgi() round trip':<28} {per_call_us(run, 2_000):>8.2f} us")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  VALIDATION
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def bench_validation():
+    import dataclasses
+    import json
+    from typing import Optional
+    from lcore import request, validate_request
+
+    types = [str, int, float, bool, Optional[str]]
+    fields = [('f%d' % i, types[i % len(types)]) for i in range(20)]
+    Schema = dataclasses.make_dataclass('Schema', fields)
+    payload = json.dumps({name: ' 42 ' if tp is str else '7' if tp is int
+                          else 1.5 if tp is float else 'yes' if tp is bool
+                          else None for name, tp in fields}).encode()
+    Query = dataclasses.make_dataclass(
+        'Query', [('q', str), ('page', int), ('limit', int),
+                  ('sort', Optional[str]), ('desc', bool)])
+
+    environ = _browser_environ('/')
+    environ.update({'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': 'application/json',
+                    'CONTENT_LENGTH': str(len(payload)),
+                    'wsgi.input': io.BytesIO(payload),
+                    'QUERY_STRING': 'q=lcore&page=2&limit=50&desc=true'})
+    request.bind(environ)
+    request.json  # parse once; only validation is timed
+
+    handler = lambda: None
+    body_only = validate_request(body=Schema)(handler)
+    query_only = validate_request(query=Query)(handler)
+
+    print("validate_request: per-request cost (body parsed beforehand)")
+    for label, func in [('no validation', handler),
+                        ('body, 20-field dataclass', body_only),
+                        ('query, 5-field dataclass', query_only)]:
+        print(f"  {label:<28} {per_call_us(func, 20_000):>8.2f} us")
+
+
+def bench_bulk_validation():
+    import dataclasses
+    import json
+    from typing import List
+    from lcore import request, validate_request
+
+    count = _arg('--items', 5_000)
+    Item = dataclasses.make_dataclass(
+        'Item', [('sku', str), ('name', str), ('qty', int), ('price', float),
+                 ('active', bool), ('warehouse', str), ('weight', float),
+                 ('batch', int), ('color', str), ('size', str)])
+    row = {'sku': 'A-1', 'name': ' Widget ', 'qty': '3', 'price': 9.5,
+           'active': 'yes', 'warehouse': 'KTM', 'weight': '1.25', 'batch': 7,
+           'color': 'red', 'size': 'M'}
+    good = json.dumps([row] * count).encode()
+    bad = json.dumps([dict(row, qty='many')] * count).encode()
+
+    def call(handler, payload):
+        environ = _browser_environ('/')
+        environ.update({'REQUEST_METHOD': 'POST',
+                        'CONTENT_TYPE': 'application/json',
+                        'CONTENT_LENGTH': str(len(payload)),
+                        'wsgi.input': io.BytesIO(payload)})
+        request.bind(environ)
+        try:
+            handler()
+        except Exception:
+            pass
+
+    parse_only = lambda: request.json
+    batch = validate_request(body=List[Item])(lambda: None)
+    streamed = validate_request(body=List[Item], stream=True)(lambda: None)
+
+    print(f"Bulk validation: JSON array of {count} 10-field objects")
+    for label, handler, payload in [
+            ('parse only (request.json)', parse_only, good),
+            ('body=List[Item]', batch, good),
+            ('body=List[Item], stream', streamed, good),
+            ('all invalid, capped', batch, bad),
+            ('all invalid, capped, stream', streamed, bad)]:
+        ms = per_call_us(lambda: call(handler, payload), 20) / 1000
+        print(f"  {label:<30} {ms:>8.2f} ms")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  CONDITIONAL REQUESTS
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def bench_etag():
+    from lcore import Lcore, ETagMiddleware
+
+    medium = _json_payloads()['medium (100 objects)']
+    app = Lcore()
+    app.use(ETagMiddleware())
+
+    @app.route('/plain', skip=['etag'])
+    def plain():
+        return medium
+
+    @app.route('/hashed')
+    def hashed():
+        return medium
+
+    @app.route('/versioned', etag=lambda: 'items-42')
+    def versioned():
+        return medium
+
+    def call(path, etag=None):
+        environ = _browser_environ(path)
+        if etag:
+            environ['HTTP_IF_NONE_MATCH'] = etag
+        sent = []
+        def run():
+            del sent[:]
+            for chunk in app.wsgi(environ, lambda s, h, e=None: None):
+                sent.append(len(chunk))
+        return run, sent
+
+    tag = {}
+    def start_response(status, headers, exc_info=None):
+        tag.update(headers)
+    b''.join(app.wsgi(_browser_environ('/hashed'), start_response))
+
+    print("ETag middleware: polled endpoint, 100-object JSON body")
+    for label, path, etag in [('no ETag', '/plain', None),
+                              ('hashed, changed', '/hashed', None),
+                              ('hashed, 304', '/hashed', tag['Etag']),
+                              ('route version, 304', '/versioned', '"items-42"')]:
+        run, sent = call(path, etag)
+        us = per_call_us(run, 5_000)
+        print(f"  {label:<22} {us:>8.2f} us  {sum(sent):>6} bytes")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  COMPRESSION
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def bench_streaming_compression():
+    import tracemalloc
+    from lcore import Lcore, CompressionMiddleware
+
+    megabytes = _arg('--mb', 100)
+    row = b''.join(b'%08d,user%d@example.com,active,%d.50\n' % (i, i, i)
+                   for i in range(1500))
+    chunk_count = megabytes * 2 ** 20 // len(row)
+
+    def export():
+        for i in range(chunk_count):
+            yield row
+
+    print(f"Streaming compression: {chunk_count * len(row) / 2 ** 20:.0f} MB"
+          f" generator export, gzip level 6")
+    print(f"  {'':<14} {'first byte':>11} {'total':>9} {'peak mem':>10} {'sent':>9}")
+    for label, stream in [('buffered', False), ('streaming', True)]:
+        app = Lcore()
+        app.use(CompressionMiddleware(stream=stream))
+        app.route('/export')(export)
+
+        def measure(trace=False):
+            environ = _browser_environ('/export')
+            if trace:
+                tracemalloc.start()
+            start = time.perf_counter()
+            first, sent = None, 0
+            for chunk in app.wsgi(environ, lambda s, h, e=None: None):
+                if first is None:
+                    first = time.perf_counter() - start
+                sent += len(chunk)
+            elapsed = time.perf_counter() - start
+            peak = 0
+            if trace:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            return first, elapsed, peak, sent
+
+        first, elapsed, _, sent = measure()
+        peak = measure(trace=True)[2]
+        print(f"  {label:<14} {first * 1000:>8.1f} ms {elapsed:>7.2f} s"
+              f" {peak / 2 ** 20:>7.1f} MB {sent / 2 ** 20:>6.1f} MB")
+
+
+def bench_encodings():
+    import json
+    from lcore import CompressionMiddleware, _negotiate_encoding, _compression_codecs
+
+    codecs = CompressionMiddleware(encodings=tuple(_compression_codecs)).codecs
+    for name in _compression_codecs:
+        if name not in codecs:
+            print(f"  ({name} not installed, skipped)")
+    print("Content-Encoding: size and time per codec, level 6")
+    for label, payload in _json_payloads().items():
+        body = json.dumps(payload).encode()
+        iterations = 20 if 'large' in label else 500
+        for name, codec in codecs.items():
+            size = len(codec.compress(body, 6))
+            us = per_call_us(lambda: codec.compress(body, 6), iterations)
+            print(f"  {label:<22} {name:<8} {size / len(body):>6.1%}"
+                  f" of {len(body):>8} B {us:>10.1f} us")
+
+    header = 'gzip, deflate, br, zstd;q=0.9, *;q=0.1'
+    middleware = CompressionMiddleware()
+    print("Accept-Encoding negotiation")
+    print(f"  {'parse q-values':<28}"
+          f" {per_call_us(lambda: _negotiate_encoding(header, codecs), 50_000):>8.2f} us")
+    print(f"  {'memoized per header':<28}"
+          f" {per_call_us(lambda: middleware._negotiate(header), 50_000):>8.2f} us")
+
+
+def bench_parallel_compression():
+    import concurrent.futures
+    import random
+    from lcore import _ZlibCodec
+
+    megabytes = _arg('--mb', 16)
+    rnd = random.Random(0)
+    lines, size = [], 0
+    while size < megabytes * 2 ** 20:
+        line = b'{"id": %d, "user": "u%x", "score": %d.%d}\n' % (
+            size, rnd.getrandbits(32), rnd.randrange(1000), rnd.randrange(100))
+        lines.append(line)
+        size += len(line)
+    body = b''.join(lines)
+    codec = _ZlibCodec(31)
+
+    print(f"Parallel gzip: {len(body) / 2 ** 20:.0f} MB body, level 6,"
+          f" 128 KB blocks, {os.cpu_count()} CPUs")
+    start = time.perf_counter()
+    serial = len(codec.compress(body, 6))
+    elapsed = time.perf_counter() - start
+    print(f"  {'one-shot (request thread)':<28} {len(body) / 2 ** 20 / elapsed:>7.1f} MB/s"
+          f"  ratio {serial / len(body):.3f}")
+    for workers in (1, 2, 4, 8):
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            codec.compress_blocks(body[:2 ** 20], 6, 2 ** 17, pool)  # warm up
+            start = time.perf_counter()
+            size = len(codec.compress_blocks(body, 6, 2 ** 17, pool))
+            elapsed = time.perf_counter() - start
+        print(f"  {'blocks, %d workers' % workers:<28}"
+              f" {len(body) / 2 ** 20 / elapsed:>7.1f} MB/s  ratio {size / len(body):.3f}")
+
+
+def bench_compression_cache():
+    import json
+    from lcore import Lcore, CompressionMiddleware
+
+    print("Compressed-body cache: repeated identical JSON, gzip level 6")
+    for label, payload in list(_json_payloads().items())[1:]:
+        body = json.dumps(payload)
+        iterations = 100 if 'large' in label else 5_000
+        for cache_bytes in (0, 16 * 2 ** 20):
+            app = Lcore()
+            middleware = CompressionMiddleware(cache_bytes=cache_bytes)
+            app.use(middleware)
+            app.route('/')(lambda: body)
+
+            def run():
+                for _ in app.wsgi(_browser_environ('/'), lambda s, h, e=None: None):
+                    pass
+            us = per_call_us(run, iterations)
+            note = ''
+            if cache_bytes:
+                info = middleware.cache_info()
+                note = (f"  hit rate {info['hit_rate']:.1%},"
+                        f" {info['bytes_saved'] / 2 ** 20:.0f} MB not recompressed")
+            print(f"  {label:<22} {'cached' if cache_bytes else 'uncached':<9}"
+                  f" {us:>9.1f} us{note}")
+
+
+def bench_precompressed_static():
+    import zlib
+    from lcore import Lcore, static_file, precompress_static
+
+    print("static_file: 200 KB JavaScript asset, Accept-Encoding: gzip, deflate, br")
+    root = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(root, 'app.js'), 'wb') as f:
+            f.write(b''.join(b'function f%d(a, b) { return a + b * %d; }\n' % (i, i)
+                             for i in range(5000)))
+        app = Lcore()
+        app.route('/static/<name>')(
+            lambda name: static_file(name, root=root, precompressed=True))
+
+        def call(on_the_fly=False):
+            sent = []
+
+            def run():
+                sent.clear()
+                body = b''.join(app.wsgi(_browser_environ('/static/app.js'),
+                                         lambda s, h, e=None: None))
+                if on_the_fly:
+                    c = zlib.compressobj(6, zlib.DEFLATED, 31)
+                    body = c.compress(body) + c.flush()
+                sent.append(len(body))
+            return run, sent
+
+        for label, build, on_the_fly in (('raw file', False, False),
+                                         ('gzip per request', False, True),
+                                         ('precompressed', True, False)):
+            if build:
+                precompress_static(root)
+            run, sent = call(on_the_fly)
+            us = per_call_us(run, 500)
+            print(f"  {label:<20} {us:>9.1f} us  {sent[0]:>7} bytes")
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_response_cache():
+    import threading
+    from lcore import Lcore, ResponseCacheMiddleware
+
+    print("ResponseCacheMiddleware: JSON endpoint doing 2 ms of work per call")
+    for label, payload in list(_json_payloads().items())[1:3]:
+        for cached in (False, True):
+            app = Lcore()
+            if cached:
+                app.use(ResponseCacheMiddleware(ttl=300))
+
+            @app.route('/')
+            def index():
+                time.sleep(0.002)  # stands in for a database query
+                return payload
+
+            def run():
+                for _ in app.wsgi(_browser_environ('/'), lambda s, h, e=None: None):
+                    pass
+            us = per_call_us(run, 100)
+            print(f"  {label:<22} {'cached' if cached else 'uncached':<9} {us:>9.1f} us")
+
+    print("Stampede: 32 concurrent cold requests for one key")
+    app = Lcore()
+    app.use(ResponseCacheMiddleware())
+    calls = []
+
+    @app.route('/report')
+    def report():
+        calls.append(1)
+        time.sleep(0.05)
+        return {'rows': 1000}
+
+    def hit():
+        for _ in app.wsgi(_browser_environ('/report'), lambda s, h, e=None: None):
+            pass
+    threads = [threading.Thread(target=hit) for _ in range(32)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"  handler runs: {len(calls)}, wall time {elapsed:.0f} ms")
+
+
+def bench_memoize():
+    from lcore import Lcore
+
+    print("Route memoization: /users/<id> doing 2 ms of work, 100 distinct ids")
+    for label, conf in (('uncached', None), ('cache ttl=30', dict(ttl=30)),
+                        ('stale + refresh', dict(ttl=0.0001, swr=60))):
+        app = Lcore()
+        calls = []
+        extra = {'cache': conf} if conf else {}
+
+        @app.get('/users/<id:int>', **extra)
+        def user(id):
+            calls.append(id)
+            time.sleep(0.002)  # stands in for a database query
+            return {'id': id, 'name': 'user %d' % id, 'roles': ['a', 'b']}
+
+        environs = [_browser_environ('/users/%d' % i) for i in range(100)]
+        for environ in environs:  # warm
+            for _ in app.wsgi(dict(environ), lambda s, h, e=None: None):
+                pass
+        n = [0]
+
+        def run():
+            environ = dict(environs[n[0] % 100])
+            n[0] += 1
+            for _ in app.wsgi(environ, lambda s, h, e=None: None):
+                pass
+        us = per_call_us(run, 500)
+        print(f"  {label:<18} {us:>9.1f} us/request  handler runs: {len(calls)}")
+
+
+def bench_pipeline_depth():
+    from lcore import Lcore, Middleware
+
+    class Passthrough(Middleware):
+        def __call__(self, ctx, next_handler):
+            return next_handler(ctx)
+
+    print("Middleware pipeline: no-op middleware around a trivial handler")
+    print(f"  {'depth':<8} {'execute()':>11} {'full request':>14}")
+    for depth in (0, 1, 3, 6, 12):
+        app = Lcore()
+        for i in range(depth):
+            app.use(Passthrough(), order=i)
+        app.route('/')(lambda: 'ok')
+        pipeline = app.middleware
+        environ = _browser_environ('/')
+
+        def full():
+            for _ in app.wsgi(dict(environ), lambda s, h, e=None: None):
+                pass
+        full()
+
+        class Ctx:  # what _handle passes, minus the thread-locals
+            request = type('R', (), {'path': '/'})()
+            route = app.routes[0]
+        handler = lambda: 'ok'
+
+        def execute():
+            pipeline.execute(Ctx, handler)
+        us = per_call_us(execute, 100_000)
+        full_us = per_call_us(full, 10_000)
+        print(f"  {depth:<8} {us:>8.2f} us {full_us:>11.2f} us")
+
+
+def bench_route_chains():
+    from lcore import Lcore, Middleware
+
+    class Passthrough(Middleware):
+        def __call__(self, ctx, next_handler):
+            return next_handler(ctx)
+
+    print("Scoped middleware on /api/users/<id>: 3 global + 5 routes= patterns")
+    app = Lcore()
+    for i in range(3):
+        app.use(Passthrough(), order=i)
+    for i, prefix in enumerate(('/api/', '/api/users/', '/admin/', '/static/',
+                                '/webhooks/')):
+        app.use(Passthrough(), routes='^' + prefix, order=10 + i)
+    app.route('/api/users/<id:int>')(lambda id: 'ok')
+    for label, ids in (('same id', 1), ('20k distinct ids', 20_000)):
+        environs = [_browser_environ('/api/users/%d' % i) for i in range(ids)]
+        n = [0]
+
+        def run():
+            environ = dict(environs[n[0] % ids])
+            n[0] += 1
+            for _ in app.wsgi(environ, lambda s, h, e=None: None):
+                pass
+        us = per_call_us(run, 20_000)
+        print(f"  {label:<18} {us:>8.2f} us/request"
+              f"  path cache entries: {len(getattr(app.middleware._local, 'paths', {}))}")
+
+
+def bench_threaded_pipeline():
+    import threading
+    from lcore import Lcore, Middleware
+
+    class Passthrough(Middleware):
+        def __call__(self, ctx, next_handler):
+            return next_handler(ctx)
+
+    print("Worker threads on one app, scoped pre + post middleware, 4k paths")
+    app = Lcore()
+    app.use(Passthrough(), order=0)
+    pre = Passthrough()
+    pre.phase = 'pre'
+    app.use(pre, routes='^/api/')
+    app.use(Passthrough(), routes=r'^/api/\d+$')
+    app.route('/api/<id>')(lambda id: 'ok')
+    environs = [_browser_environ('/api/%d' % i) for i in range(4_000)]
+    total = 40_000
+    print(f"  {'threads':<8} {'requests/s':>12}")
+    for workers in (1, 4, 8):
+        def work(offset):
+            for i in range(total // workers):
+                environ = dict(environs[(offset + i) % len(environs)])
+                for _ in app.wsgi(environ, lambda s, h, e=None: None):
+                    pass
+        threads = [threading.Thread(target=work, args=(n * 997,))
+                   for n in range(workers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print(f"  {workers:<8} {total / (time.perf_counter() - start):>12,.0f}")
+
+
+BENCHES = {
+    'multipart': bench_multipart,
+    'save': bench_save,
+    'headers': bench_headers,
+    'cookies': bench_cookies,
+    'signed': bench_signed_cookies,
+    'response_headers': bench_response_headers,
+    'hkey': bench_hkey,
+    'precomputed': bench_precomputed,
+    'json': bench_json,
+    'streaming_json': bench_streaming_json,
+    'response_models': bench_response_models,
+    'validation': bench_validation,
+    'bulk_validation': bench_bulk_validation,
+    'etag': bench_etag,
+    'streaming_compression': bench_streaming_compression,
+    'encodings': bench_encodings,
+    'parallel_compression': bench_parallel_compression,
+    'compression_cache': bench_compression_cache,
+    'precompressed_static': bench_precompressed_static,
+    'response_cache': bench_response_cache,
+    'memoize': bench_memoize,
+    'pipeline_depth': bench_pipeline_depth,
+    'route_chains': bench_route_chains,
+    'threaded_pipeline': bench_threaded_pipeline,
+}
+
+if __name__ == '__main__':
+    selected = [a for a in sys.argv[1:] if a in BENCHES] or list(BENCHES)
+    for name in selected:
+        BENCHES[name]()
+        print()
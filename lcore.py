@@ -23,6 +23,8 @@ def _cli_parse(args):
     opt("--debug", action="store_true", help="start server in debug mode.")
     opt("--reload", action="store_true", help="auto-reload on file changes.")
     opt("--docs", action="store_true", help="open documentation in browser.")
+    opt("--precompress", metavar="DIR",
+        help="write .br/.gz files next to static assets in DIR and exit.")
     opt('app', help='WSGI app entry point.', nargs='?')
 
     cli_args = parser.parse_args(args[1:])
@@ -46,8 +48,8 @@ if __name__ == '__main__':
 
 # stdlib imports that's it, no pip install required
 import abc, asyncio, atexit, base64, calendar, concurrent.futures, email.utils, \
-    functools, gzip, hmac, itertools, logging, mimetypes, os, re, tempfile, \
-    threading, time, uuid, warnings, weakref, hashlib
+    functools, hmac, itertools, logging, mimetypes, os, re, tempfile, \
+    threading, time, uuid, warnings, weakref, hashlib, zlib
 
 from types import FunctionType
 from datetime import date as datedate, datetime, timedelta
@@ -447,6 +449,7 @@ class Route:
         self.skiplist = skiplist or []
         self.config = app.config._make_overlay()
         self.config.load_dict(config)
+        self._cache_options()  # fail at registration, not on first request
 
     @cached_property
     def call(self):  # compiled callback with all plugins applied (cached)
@@ -468,9 +471,29 @@ class Route:
             if name: unique.add(name)
             yield p
 
+    _cache_params = ('ttl', 'swr', 'max_entries', 'max_bytes', 'key', 'pool')
+
+    # memoize() kwargs from the route's own cache= option, never app config
+    def _cache_options(self):
+        # cache=30 or cache=dict(ttl=30, swr=60) (stored as cache.ttl, cache.swr)
+        inherited = self.config._virtual_keys
+        conf = {key[6:]: value for key, value in self.config.items()
+                if key.startswith('cache.') and key not in inherited}
+        unknown = sorted(set(conf) - set(self._cache_params))
+        if unknown:
+            raise TypeError("Route %s %s: unknown cache option(s): %s (expected %s)"
+                            % (self.method, self.rule, ', '.join(unknown),
+                               ', '.join(self._cache_params)))
+        if 'cache' not in inherited and self.config.get('cache'):
+            conf.setdefault('ttl', self.config['cache'])
+        return conf
+
     # Apply plugins, wrap async handlers for sync execution.
     def _make_callback(self):
         callback = self.callback
+        conf = self._cache_options()
+        if conf:  # innermost: memoize the raw return value
+            callback = memoize(**conf)(callback)
         for plugin in self.all_plugins():
             if hasattr(plugin, 'apply'):
                 callback = plugin.apply(callback, self)
@@ -1045,6 +1068,7 @@ class Lcore:
     def add_route(self, route):
         self.routes.append(route)
         self.router.add(route.rule, route.method, route, name=route.name)
+        self.middleware.register(route)
         if DEBUG: route.prepare()
 
     def route(self,
@@ -1198,6 +1222,12 @@ class Lcore:
     # Turn whatever the handler returned into a WSGI iterable
     def _cast(self, out, peek=None):
 
+        if isinstance(out, PrecomputedResponse):
+            body = out.body
+            if response.body is not body or not body:  # not applied by _handle
+                out.apply(response)
+            return [body] if body else []
+
         if inspect.iscoroutine(out):
             out = _run_async(out)
 
@@ -1350,24 +1380,18 @@ class BaseRequest:
     @DictProperty('environ', 'lcore.request.cookies', read_only=True)
     def cookies(self):
         cookie_header = _wsgi_recode(self.environ.get('HTTP_COOKIE', ''))
-        cookies = SimpleCookie(cookie_header).values()
-        return FormsDict((c.key, c.value) for c in cookies)
+        return FormsDict(_parse_cookies(cookie_header))
 
     # Read a cookie, optionally verifying HMAC signature if secret is provided
     def get_cookie(self, key, default=None, secret=None, digestmod=hashlib.sha256):
-        value = self.cookies.get(key)
+        cookies = self.environ.get('lcore.request.cookies')
+        if cookies is None:  # Scan for just this cookie
+            value = _find_cookie(
+                _wsgi_recode(self.environ.get('HTTP_COOKIE', '')), key)
+        else:
+            value = cookies.get(key)
         if secret:
-            if value and value.startswith('!') and '?' in value:
-                sig, msg = map(tob, value[1:].split('?', 1))
-                hashed = hmac.new(tob(secret), msg, digestmod=digestmod).digest()
-                if _lscmp(sig, base64.b64encode(hashed)):
-                    try:
-                        dst = json_loads(base64.b64decode(msg))
-                    except (ValueError, TypeError):
-                        return default
-                    if dst and dst[0] == key:
-                        return dst[1]
-            return default
+            return _cookie_codec(secret, digestmod).decode(key, value, default)
         return value or default
 
     @DictProperty('environ', 'lcore.request.query', read_only=True)
@@ -1539,11 +1563,37 @@ class BaseRequest:
             if not part.filename and part.is_buffered():
                 post[part.name] = part.value
             else:
-                post[part.name] = FileUpload(part.file, part.name,
-                                            part.filename, part.headerlist)
+                upload = FileUpload(part.file, part.name,
+                                    part.filename, part.headerlist)
+                upload._spooled = not part.is_buffered()
+                post[part.name] = upload
 
         return post
 
+    # Stream multipart parts straight off the wire: no temp files, one pass.
+    def iter_parts(self, buffer_size=2 ** 16):
+        """Yield :class:`StreamingPart` objects while the body is read.
+        Each part must be consumed before the next one is produced; parts
+        skipped by the caller are drained automatically."""
+        content_type = self.environ.get('CONTENT_TYPE', '')
+        content_type, options = _parse_http_header(content_type)[0]
+        if not content_type.startswith('multipart/'):
+            raise MultipartError("Not a multipart request")
+        boundary = options.get("boundary")
+        if not boundary:
+            raise MultipartError("Invalid content type header, missing boundary")
+        if 'lcore.request.body' in self.environ or 'wsgi.input' not in self.environ:
+            stream = self.body
+        else:
+            body_iter = self._iter_chunked if self.chunked else self._iter_body
+            stream = body_iter(self.environ['wsgi.input'].read, buffer_size)
+            # The raw input is consumed from here on; don't let request.body
+            # try to buffer what's left of it.
+            self.environ['lcore.request.body'] = BytesIO()
+        parser = _MultipartParser(stream, boundary, buffer_size=buffer_size,
+                                  charset=options.get("charset", "utf8"))
+        return parser.iter_parts()
+
     @property
     def url(self):
         return self.urlparts.geturl()
@@ -1703,19 +1753,103 @@ class BaseRequest:
         except KeyError:
             raise AttributeError("Attribute not defined: %s" % name)
 
+# Canonical (interned) names for well-known headers, plus a bounded memo of
+# custom ones: _hkey() is one dict lookup for almost every call.
+_STANDARD_HEADERS = (
+    'Accept', 'Accept-Charset', 'Accept-Encoding', 'Accept-Language',
+    'Accept-Ranges', 'Access-Control-Allow-Credentials',
+    'Access-Control-Allow-Headers', 'Access-Control-Allow-Methods',
+    'Access-Control-Allow-Origin', 'Access-Control-Expose-Headers',
+    'Access-Control-Max-Age', 'Access-Control-Request-Headers',
+    'Access-Control-Request-Method', 'Age', 'Allow', 'Authorization',
+    'Cache-Control', 'Connection', 'Content-Disposition', 'Content-Encoding',
+    'Content-Language', 'Content-Length', 'Content-Location', 'Content-Md5',
+    'Content-Range', 'Content-Security-Policy', 'Content-Type', 'Cookie',
+    'Date', 'ETag', 'Expect', 'Expires', 'Forwarded', 'From', 'Host',
+    'If-Match', 'If-Modified-Since', 'If-None-Match', 'If-Range',
+    'If-Unmodified-Since', 'Keep-Alive', 'Last-Modified', 'Link', 'Location',
+    'Origin', 'Permissions-Policy', 'Pragma', 'Proxy-Authenticate',
+    'Proxy-Authorization', 'Range', 'Referer', 'Referrer-Policy',
+    'Retry-After', 'Server', 'Set-Cookie', 'Strict-Transport-Security', 'TE',
+    'Trailer', 'Transfer-Encoding', 'Upgrade', 'User-Agent', 'Vary', 'Via',
+    'WWW-Authenticate', 'Warning', 'X-Content-Type-Options', 'X-CSRF-Token',
+    'X-Forwarded-For', 'X-Forwarded-Host', 'X-Forwarded-Proto',
+    'X-Frame-Options', 'X-Powered-By', 'X-RateLimit-Limit',
+    'X-RateLimit-Remaining', 'X-RateLimit-Reset', 'X-Real-IP', 'X-Request-ID',
+    'X-Requested-With', 'X-Response-Time', 'X-XSS-Protection',
+)
+
+_hkey_cache = {}
+for _name in _STANDARD_HEADERS:
+    _canonical = sys.intern(_name.title())
+    for _spelling in (_name, _name.lower(), _canonical):
+        _hkey_cache[_spelling] = _canonical
+_hkey_cache_max = len(_hkey_cache) + 1024
+del _name, _canonical, _spelling
+
 # Header name normalisation: underscores become hyphens, Title-Case enforced
 def _hkey(key):
-    key = touni(key)
-    if '\n' in key or '\r' in key or '\0' in key:
-        raise ValueError("Header names must not contain control characters: %r" % key)
-    return key.title().replace('_', '-')
+    try:
+        name = _hkey_cache.get(key)
+    except TypeError:  # unhashable; let touni() deal with it
+        name = None
+    if name is not None:
+        return name
+    name = touni(key)
+    if '\n' in name or '\r' in name or '\0' in name:
+        raise ValueError("Header names must not contain control characters: %r" % name)
+    name = sys.intern(name.title().replace('_', '-'))
+    if isinstance(key, (str, bytes)) and len(_hkey_cache) < _hkey_cache_max:
+        _hkey_cache[key] = name
+    return name
 
 def _hval(value):
-    value = touni(value)
+    if value.__class__ is not str:
+        value = touni(value)
     if '\n' in value or '\r' in value or '\0' in value:
         raise ValueError("Header value must not contain control characters: %r" % value)
     return value
 
+# Frozen, pre-validated set of response headers. Build once, apply per response.
+class HeaderBlock:
+    """ An immutable group of response headers whose names and values were
+        validated once, at construction. ``response.set_headers(block)``
+        applies them without re-running :func:`_hkey`/:func:`_hval`. """
+
+    __slots__ = ('_items',)
+
+    def __init__(self, headers=()):
+        if isinstance(headers, HeaderBlock):
+            items = headers._items
+        else:
+            if isinstance(headers, dict):
+                headers = headers.items()
+            grouped = {}
+            for name, value in headers:
+                grouped.setdefault(_hkey(name), []).append(_hval(value))
+            items = tuple((name, tuple(values)) for name, values in grouped.items())
+        object.__setattr__(self, '_items', items)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable." % self.__class__.__name__)
+
+    def __iter__(self):
+        for name, values in self._items:
+            for value in values:
+                yield name, value
+
+    def __len__(self):
+        return sum(len(values) for _, values in self._items)
+
+    def __eq__(self, other):
+        return isinstance(other, HeaderBlock) and self._items == other._items
+
+    def __hash__(self):
+        return hash(self._items)
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, list(self))
+
 # Descriptor for typed access to a specific response header
 class HeaderProperty:
     def __init__(self, name, reader=None, writer=None, default=''):
@@ -1843,6 +1977,15 @@ class BaseResponse:
     def add_header(self, name, value):
         self._headers.setdefault(_hkey(name), []).append(_hval(value))
 
+    def set_headers(self, headers):
+        """ Set several headers at once, replacing existing values. Accepts a
+            :class:`HeaderBlock` (applied as is), a dict or (name, value) pairs. """
+        if not isinstance(headers, HeaderBlock):
+            headers = HeaderBlock(headers)
+        target = self._headers
+        for name, values in headers._items:
+            target[name] = list(values)
+
     def iter_headers(self):
         return self.headerlist
 
@@ -1851,18 +1994,20 @@ class BaseResponse:
 
     @property
     def headerlist(self):
-        out = []
-        headers = list(self._headers.items())
-        if 'Content-Type' not in self._headers:
-            headers.append(('Content-Type', [self.default_content_type]))
-        if self._status_code in self.bad_headers:
-            bad_headers = self.bad_headers[self._status_code]
-            headers = [h for h in headers if h[0] not in bad_headers]
-        out += [(name, val) for (name, vals) in headers for val in vals]
+        headers = self._headers
+        bad_headers = self.bad_headers.get(self._status_code, ())
+        out = [(name, val if val.isascii() else
+                val.encode('utf8', 'surrogateescape').decode('latin1'))
+               for (name, vals) in headers.items() if name not in bad_headers
+               for val in vals]
+        if 'Content-Type' not in headers and 'Content-Type' not in bad_headers:
+            out.append(('Content-Type', self.default_content_type))
         if self._cookies:
             for c in self._cookies.values():
-                out.append(('Set-Cookie', _hval(c.OutputString())))
-        out = [(k, v.encode('utf8', 'surrogateescape').decode('latin1')) for (k, v) in out]
+                val = _hval(c.OutputString())
+                if not val.isascii():
+                    val = val.encode('utf8', 'surrogateescape').decode('latin1')
+                out.append(('Set-Cookie', val))
         return out
 
     content_type = HeaderProperty('Content-Type')
@@ -1887,10 +2032,7 @@ class BaseResponse:
             Morsel._reserved.setdefault('samesite', 'SameSite')
 
         if secret:
-            encoded = base64.b64encode(tob(json_dumps([name, str(value)])))
-            sig = base64.b64encode(hmac.new(tob(secret), encoded,
-                                            digestmod=digestmod).digest())
-            value = touni(b'!' + sig + b'?' + encoded)
+            value = _cookie_codec(secret, digestmod).encode(name, str(value))
         elif not isinstance(value, str):
             raise TypeError('Secret key required for non-string cookies.')
 
@@ -2030,116 +2172,288 @@ class Middleware:
     def __call__(self, ctx, next_handler):
         return next_handler(ctx)
 
+def _pre_terminal(c):
+    return None
+
+def _chain_link(middleware):
+    """ bind(next_handler) -> link(ctx) for one middleware. Whether it is
+        async is decided here, once, not on every call. """
+    if _is_async(middleware) or _is_async(getattr(middleware, '__call__', None)):
+        def bind(next_handler):
+            def link(c):
+                result = middleware(c, next_handler)
+                if inspect.iscoroutine(result):
+                    result = _run_async(result)
+                return result
+            return link
+    else:
+        def bind(next_handler):
+            return lambda c: middleware(c, next_handler)
+    return bind
+
+# A resolved chain (still a tuple of middleware) with its links prepared
+# once: bind(terminal) folds them into run(ctx), which calls
+# chain[0](ctx, next) ... down to terminal. Pre chains have a fixed terminal
+# and are folded up front (.run); post chains are bound to each request's
+# handler, so next_handler works from any thread. Immutable.
+class _MiddlewareChain(tuple):
+
+    def __new__(cls, middleware, terminal=None):
+        chain = tuple.__new__(cls, middleware)
+        object.__setattr__(chain, '_links',
+                           tuple(_chain_link(m) for m in reversed(chain)))
+        object.__setattr__(chain, 'terminal', terminal)
+        object.__setattr__(chain, 'run',
+                           chain.bind(terminal) if terminal else None)
+        return chain
+
+    def bind(self, terminal):
+        run = terminal
+        for link in self._links:
+            run = link(run)
+        return run
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable." % self.__class__.__name__)
+
+# Static analysis of routes= patterns against route rules
+def _literal_prefix(pattern):
+    """ (literal, exact) for a compiled routes= regex: every match starts
+        with literal, and exact means the pattern is only that literal.
+        None when the pattern cannot be analysed. """
+    if not isinstance(pattern, re.Pattern) or not isinstance(pattern.pattern, str) \
+       or pattern.flags & re.IGNORECASE or '|' in pattern.pattern:
+        return None
+    src = pattern.pattern
+    i, n, out = (1 if src.startswith('^') else 0), len(src), []
+    while i < n:
+        c = src[i]
+        if c == '\\':
+            if i + 1 < n and not src[i + 1].isalnum():
+                out.append(src[i + 1])
+                i += 2
+                continue
+            break
+        if c in '.^$*+?{}[]()':
+            break
+        out.append(c)
+        i += 1
+    if i < n and src[i] in '*?{' and out:
+        out.pop()  # quantified: the last character may be absent
+    return ''.join(out), i == n
+
+def _rule_prefix(route):
+    """ (literal prefix, static) of a route rule. """
+    prefix = ''
+    for key, mode, _ in route.app.router._itertokens(route.rule):
+        if mode:
+            return prefix, False
+        prefix += key
+    return prefix, True
+
+def _route_matches(pattern, prefix, static):
+    """ Whether pattern matches every path a route serves (True), none of
+        them (False), or depends on the wildcard values (None). """
+    if static:
+        return bool(pattern.match(prefix))
+    literal = _literal_prefix(pattern)
+    if literal is None:
+        return None
+    literal, exact = literal
+    if prefix.startswith(literal):
+        return True if exact else None
+    if literal.startswith(prefix):
+        return None
+    return False
+
+# Everything the request path needs from a MiddlewarePipeline, built by
+# writers and published with one attribute assignment. Never mutated after
+# that, so readers on any thread need no lock.
+class _FrozenPipeline:
+    __slots__ = ('middleware', 'pre', 'post', 'routes', 'chains')
+
+    def __init__(self, middleware, pre, post, routes, chains):
+        object.__setattr__(self, 'middleware', middleware)  # sorted (m, pattern)
+        object.__setattr__(self, 'pre', pre)  # None: some pre middleware is scoped
+        object.__setattr__(self, 'post', post)  # None: some post middleware is scoped
+        object.__setattr__(self, 'routes', routes)  # Route -> post chain, skiplist applied
+        object.__setattr__(self, 'chains', chains)  # (ids, terminal) -> chain
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable." % self.__class__.__name__)
+
 # Builds & executes middleware chains. Two phases: 'pre' runs before routing
-# (CORS, CSRF, body limits), 'post' wraps the handler. Chains are LRU-cached.
+# (CORS, CSRF, body limits), 'post' wraps the handler. Chains are compiled
+# when middleware or routes are added, into a frozen snapshot that requests
+# only read. Scoped pre-phase middleware and patterns a rule cannot decide
+# fall back to path lookups, cached per thread.
 class MiddlewarePipeline:
 
     def __init__(self):
         self._middleware = []
-        self._sorted = False
-        self._global_pre_chain = None
-        self._global_post_chain = None
-        self._path_cache = OrderedDict()  # LRU cache: path -> (pre_chain, post_chain)
+        self._routes = []
+        self._pending = []  # registered routes not yet in the snapshot
+        self._lock = threading.Lock()  # serialises writers; readers never take it
+        self._local = threading.local()  # .frozen, .paths, .chains: per thread
         self._path_cache_max = 1024
-
-    def _invalidate(self):
-        self._sorted = False
-        self._global_pre_chain = None
-        self._global_post_chain = None
-        self._path_cache.clear()
+        self._frozen = self._freeze()
 
     def add(self, middleware, routes=None, order=None):
         if order is not None:
             middleware.order = order
         pattern = re.compile(routes) if isinstance(routes, str) else routes
-        self._middleware.append((middleware, pattern))
-        self._invalidate()
+        with self._lock:
+            self._middleware.append((middleware, pattern))
+            self._frozen = self._freeze()
 
     def remove(self, middleware):
-        self._middleware = [(m, p) for m, p in self._middleware
-                           if m is not middleware]
-        self._invalidate()
+        with self._lock:
+            self._middleware = [(m, p) for m, p in self._middleware
+                               if m is not middleware]
+            self._frozen = self._freeze()
+
+    def register(self, route):
+        """Queue a newly added route. Its post chain is resolved into the
+        snapshot on the next dispatch, together with every other route
+        registered since, so startup copies the tables once, not per route."""
+        with self._lock:
+            self._routes.append(route)
+            self._pending.append(route)
+
+    def _flush(self):
+        # Fold queued routes into one new snapshot
+        with self._lock:
+            if not self._pending:  # another thread got here first
+                return
+            frozen = self._frozen
+            chains, routes = dict(frozen.chains), dict(frozen.routes)
+            for route in self._pending:
+                chain = self._route_chain(frozen.middleware, route, chains)
+                if chain is not None:
+                    routes[route] = chain
+            self._pending = []
+            self._frozen = _FrozenPipeline(frozen.middleware, frozen.pre,
+                                           frozen.post, routes, chains)
+
+    def _freeze(self):
+        middleware = tuple(sorted(self._middleware,
+                                  key=lambda x: getattr(x[0], 'order', 50)))
+        chains = {}
+        pre = [(m, pat) for m, pat in middleware
+               if getattr(m, 'phase', 'post') == 'pre']
+        post = [(m, pat) for m, pat in middleware
+                if getattr(m, 'phase', 'post') != 'pre']
+        pre_chain = post_chain = None
+        if all(pat is None for _, pat in pre):
+            pre_chain = self._chain((m for m, _ in pre), _pre_terminal, chains)
+        if all(pat is None for _, pat in post):
+            post_chain = self._chain((m for m, _ in post), None, chains)
+        routes = {}
+        for route in self._routes:
+            chain = self._route_chain(middleware, route, chains)
+            if chain is not None:
+                routes[route] = chain
+        self._pending = []  # every route in self._routes is resolved above
+        return _FrozenPipeline(middleware, pre_chain, post_chain, routes, chains)
 
-    def _get_chains(self, path):
+    @staticmethod
+    def _chain(middleware, terminal, chains, spill=None):
+        # Paths with the same middleware share one compiled chain. Readers
+        # pass the published mapping plus a per-thread spill for misses.
+        middleware = tuple(middleware)
+        key = (tuple(map(id, middleware)), terminal)
+        chain = chains.get(key)
+        if chain is None and spill is not None:
+            chain = spill.get(key)
+            chains = spill
+        if chain is None:
+            chain = chains[key] = _MiddlewareChain(middleware, terminal)
+        return chain
+
+    def _route_chain(self, middleware, route, chains):
+        """Post chain for a route, its routes= patterns decided once against
+        the rule and its skiplist applied. None if a pattern depends on the
+        wildcard values, so the request path has to decide."""
+        prefix, static = _rule_prefix(route)
+        members = []
+        for m, pat in middleware:
+            if getattr(m, 'phase', 'post') == 'pre':
+                continue
+            if pat is not None:
+                hit = _route_matches(pat, prefix, static)
+                if hit is None:
+                    return None
+                if not hit:
+                    continue
+            members.append(m)
+        if route.skiplist:
+            members = [m for m in members
+                       if getattr(m, 'name', None) not in route.skiplist]
+        return self._chain(members, None, chains)
+
+    def _thread_cache(self, frozen):
+        # This thread's path cache and chains; a new snapshot starts over
+        local = self._local
+        if getattr(local, 'frozen', None) is not frozen:
+            local.frozen, local.paths, local.chains = frozen, {}, {}
+        return local
+
+    def _get_chains(self, path, skiplist=None):
         """Return (pre_chain, post_chain) tuples for the given path."""
-        if not self._sorted:
-            self._middleware.sort(key=lambda x: getattr(x[0], 'order', 50))
-            self._sorted = True
-        has_patterns = any(pat is not None for _, pat in self._middleware)
-        if not has_patterns:
-            if self._global_pre_chain is None:
-                pre = tuple(m for m, _ in self._middleware
-                           if getattr(m, 'phase', 'post') == 'pre')
-                post = tuple(m for m, _ in self._middleware
-                            if getattr(m, 'phase', 'post') != 'pre')
-                self._global_pre_chain = pre
-                self._global_post_chain = post
-            return self._global_pre_chain, self._global_post_chain
-        if path in self._path_cache:
-            self._path_cache.move_to_end(path)
-            return self._path_cache[path]
-        pre = tuple(m for m, pat in self._middleware
-                    if getattr(m, 'phase', 'post') == 'pre'
-                    and (pat is None or pat.match(path)))
-        post = tuple(m for m, pat in self._middleware
-                     if getattr(m, 'phase', 'post') != 'pre'
-                     and (pat is None or pat.match(path)))
-        if len(self._path_cache) >= self._path_cache_max:
-            self._path_cache.popitem(last=False)
-        self._path_cache[path] = (pre, post)
+        frozen = self._frozen
+        local = self._thread_cache(frozen)
+        paths = local.paths
+        try:
+            key = (path, tuple(skiplist)) if skiplist else path
+            return paths[key]
+        except TypeError:
+            key = None
+        except KeyError:
+            pass
+        chains, spill = frozen.chains, local.chains
+        members = [(m, getattr(m, 'phase', 'post') == 'pre')
+                   for m, pat in frozen.middleware
+                   if pat is None or pat.match(path)]
+        pre = self._chain((m for m, is_pre in members if is_pre),
+                          _pre_terminal, chains, spill)
+        post = self._chain((m for m, is_pre in members if not is_pre
+                            and not (skiplist and
+                                     getattr(m, 'name', None) in skiplist)),
+                           None, chains, spill)
+        if len(spill) >= self._path_cache_max:
+            spill.clear()
+        if key is not None:
+            if len(paths) >= self._path_cache_max:
+                paths.clear()
+            paths[key] = (pre, post)
         return pre, post
 
     def execute_pre_routing(self, ctx):
         """Run pre-routing middleware. If any returns a truthy value, return
         it as the response (short-circuiting routing)."""
-        pre_chain, _ = self._get_chains(ctx.request.path)
+        pre_chain = self._frozen.pre
+        if pre_chain is None:  # some pre-phase middleware has routes=
+            pre_chain, _ = self._get_chains(ctx.request.path)
         if not pre_chain:
             return None
-        idx = 0
-        n = len(pre_chain)
-
-        def run(c):
-            nonlocal idx
-            i = idx
-            if i >= n:
-                return None
-            idx = i + 1
-            try:
-                return pre_chain[i](c, run)
-            finally:
-                idx = i
-
-        return run(ctx)
+        return pre_chain.run(ctx)
 
     def execute(self, ctx, handler):
         """Run post-routing middleware chain. Respects the route's skiplist."""
-        _, post_chain = self._get_chains(ctx.request.path)
-        # Filter out middleware whose name is in the route's skiplist
+        if self._pending:
+            self._flush()
+        frozen = self._frozen
         route = getattr(ctx, 'route', None)
-        skiplist = set(getattr(route, 'skiplist', []) if route else [])
-        if skiplist and post_chain:
-            post_chain = tuple(m for m in post_chain
-                               if getattr(m, 'name', None) not in skiplist)
+        try:
+            post_chain = frozen.routes[route]
+        except KeyError:  # no route, not registered here, or undecidable
+            skiplist = route.skiplist if route is not None else None
+            post_chain = frozen.post
+            if post_chain is None or skiplist:
+                _, post_chain = self._get_chains(ctx.request.path, skiplist)
         if not post_chain:
             return handler()
-        idx = 0
-        n = len(post_chain)
-
-        def run(c):
-            nonlocal idx
-            i = idx
-            if i >= n:
-                return handler()
-            idx = i + 1
-            try:
-                result = post_chain[i](c, run)
-                if inspect.iscoroutine(result):
-                    result = _run_async(result)
-                return result
-            finally:
-                idx = i
-
-        return run(ctx)
+        return post_chain.bind(lambda c: handler())(ctx)
 
 # Slaps an X-Request-ID on every request/response
 class RequestIDMiddleware(Middleware):
@@ -2196,11 +2510,19 @@ class SecurityHeadersMiddleware(Middleware):
         if hsts:
             self.headers['Strict-Transport-Security'] = \
                 'max-age=%d; includeSubDomains' % hsts_max_age
+        self._block = HeaderBlock(self.headers)
+        self._block_source = dict(self.headers)
+
+    def _header_block(self):
+        # Rebuilt only if someone edited self.headers after construction
+        if self._block_source != self.headers:
+            self._block = HeaderBlock(self.headers)
+            self._block_source = dict(self.headers)
+        return self._block
 
     def __call__(self, ctx, next_handler):
         result = next_handler(ctx)
-        for key, value in self.headers.items():
-            ctx.response.set_header(key, value)
+        ctx.response.set_headers(self._header_block())
         return result
 
 # CSRF via double-submit cookie pattern. The cookie is HMAC-signed so sibling
@@ -2322,29 +2644,225 @@ class CORSMiddleware(Middleware):
         return result
 
 
-# gzip for responses skips tiny bodies and already-encoded ones
+# Content-Encoding codecs: one-shot compress() and a streaming
+# (compress, sync_flush, finish) triple. Optional ones import lazily.
+class _ZlibCodec:
+    def __init__(self, wbits):
+        self.wbits = wbits
+
+    def compress(self, body, level):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+        return compressor.compress(body) + compressor.flush()
+
+    def stream(self, level):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+        return (compressor.compress,
+                lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush)
+
+    def compress_blocks(self, body, level, block_size, pool):
+        """ pigz-style: deflate fixed-size blocks on a thread pool (zlib
+            releases the GIL), each primed with the 32 KB before it, and
+            join them into one gzip/zlib stream. """
+        view, size = memoryview(body), len(body)
+
+        def deflate(start):
+            end = start + block_size
+            if start:
+                window = bytes(view[max(0, start - 32768):start])
+                compressor = zlib.compressobj(level, zlib.DEFLATED, -15,
+                                              zdict=window)
+            else:
+                compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            data = compressor.compress(view[start:end])
+            return data + compressor.flush(
+                zlib.Z_FINISH if end >= size else zlib.Z_SYNC_FLUSH)
+
+        if self.wbits == 31:
+            check = pool.submit(zlib.crc32, body)
+            blocks = list(pool.map(deflate, range(0, size, block_size)))
+            return b''.join([b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff']
+                            + blocks
+                            + [check.result().to_bytes(4, 'little'),
+                               (size & 0xffffffff).to_bytes(4, 'little')])
+        check = pool.submit(zlib.adler32, body)
+        blocks = list(pool.map(deflate, range(0, size, block_size)))
+        return b''.join([b'\x78\x9c'] + blocks
+                        + [check.result().to_bytes(4, 'big')])
+
+class _BrotliCodec:
+    def __init__(self):
+        import brotli
+        self.brotli = brotli
+
+    def compress(self, body, level):
+        return self.brotli.compress(body, quality=min(level, 11))
+
+    def stream(self, level):
+        compressor = self.brotli.Compressor(quality=min(level, 11))
+        return compressor.process, compressor.flush, compressor.finish
+
+class _ZstdCodec:
+    def __init__(self):
+        import zstandard
+        self.zstd = zstandard
+
+    def compress(self, body, level):
+        return self.zstd.ZstdCompressor(level=level).compress(body)
+
+    def stream(self, level):
+        compressor = self.zstd.ZstdCompressor(level=level).compressobj()
+        block = self.zstd.COMPRESSOBJ_FLUSH_BLOCK
+        return (compressor.compress, lambda: compressor.flush(block),
+                compressor.flush)
+
+_compression_codecs = {
+    'br': _BrotliCodec,
+    'zstd': _ZstdCodec,
+    'gzip': lambda: _ZlibCodec(31),
+    'deflate': lambda: _ZlibCodec(15),  # HTTP "deflate" is the zlib format
+}
+
+# Picks the acceptable encoding with the highest q-value; ties go to server order
+def _negotiate_encoding(header, available):
+    accepted = {}
+    try:
+        for token, params in _parse_http_header(header):
+            token = token.lower()
+            accepted['gzip' if token == 'x-gzip' else token] = \
+                float(params.get('q', 1))
+    except ValueError:
+        return None
+    best, best_q = None, 0.0
+    wildcard = accepted.get('*', 0.0)
+    for name in available:
+        q = accepted.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+# Compresses responses (brotli/zstd/gzip/deflate by Accept-Encoding), skips tiny bodies
 class CompressionMiddleware(Middleware):
     name = 'compression'
     order = 90
 
     def __init__(self, min_size=256, level=6,
-                 content_types=None):
+                 content_types=None, stream=True, flush_size=16384,
+                 encodings=('br', 'zstd', 'gzip', 'deflate'),
+                 parallel_size=None, block_size=131072, workers=None,
+                 cache_bytes=0):
         self.min_size = min_size
         self.level = level
         self.content_types = content_types or (
             'text/', 'application/json', 'application/javascript',
             'application/xml', 'application/xhtml+xml',
         )
+        self.stream = stream
+        self.flush_size = flush_size
+        self.codecs = {}
+        for name in encodings:
+            try:
+                self.codecs[name] = _compression_codecs[name]()
+            except ImportError:
+                pass
+        self._choices = {}  # Accept-Encoding header -> negotiated encoding
+        # Bodies of parallel_size bytes or more are gzip/deflated in parallel blocks
+        self.parallel_size = parallel_size
+        self.block_size = block_size
+        self._workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # LRU of compressed bodies, keyed by (body digest, encoding, level)
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cache_used = 0
+        self._cache_lock = threading.Lock()
+        self._hits = self._misses = self._bytes_saved = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self._workers or os.cpu_count() or 1,
+                        thread_name_prefix='lcore-compress')
+                    atexit.register(self._pool.shutdown, wait=False)
+        return self._pool
+
+    def cache_info(self):
+        """ Compressed-body cache statistics. ``bytes_saved`` counts the
+            uncompressed bytes that did not have to be compressed again. """
+        with self._cache_lock:
+            lookups = self._hits + self._misses
+            return {'hits': self._hits, 'misses': self._misses,
+                    'hit_rate': self._hits / lookups if lookups else 0.0,
+                    'bytes_saved': self._bytes_saved,
+                    'entries': len(self._cache), 'size': self._cache_used,
+                    'max_size': self.cache_bytes}
+
+    def _compress(self, body, encoding):
+        codec = self.codecs[encoding]
+        if self.parallel_size and len(body) >= self.parallel_size \
+           and hasattr(codec, 'compress_blocks'):
+            return codec.compress_blocks(body, self.level, self.block_size,
+                                         self._get_pool())
+        return codec.compress(body, self.level)
+
+    def _compress_cached(self, body, encoding):
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding,
+               self.level)
+        cache = self._cache
+        with self._cache_lock:
+            compressed = cache.get(key)
+            if compressed is not None:
+                cache.move_to_end(key)
+                self._hits += 1
+                self._bytes_saved += len(body)
+                return compressed
+            self._misses += 1
+        compressed = self._compress(body, encoding)
+        if len(compressed) <= self.cache_bytes:
+            with self._cache_lock:
+                if key not in cache:
+                    cache[key] = compressed
+                    self._cache_used += len(compressed)
+                    while self._cache_used > self.cache_bytes:
+                        self._cache_used -= len(cache.popitem(last=False)[1])
+        return compressed
+
+    def _negotiate(self, accept):
+        try:
+            return self._choices[accept]
+        except KeyError:
+            pass
+        if len(self._choices) >= 256:
+            self._choices.clear()
+        choice = self._choices[accept] = _negotiate_encoding(accept, self.codecs)
+        return choice
 
     def _should_compress(self, ctx):
         ct = ctx.response.get_header('Content-Type', '') or 'text/html'
         return any(ct.startswith(t) for t in self.content_types)
 
+    def _set_headers(self, ctx, encoding):
+        etag = ctx.response.get_header('ETag')
+        if etag and not etag.startswith('W/'):  # no longer byte-identical
+            ctx.response.set_header('ETag', 'W/' + etag)
+        ctx.response.set_header('Content-Encoding', encoding)
+        ctx.response.set_header('Vary', 'Accept-Encoding')
+
     def __call__(self, ctx, next_handler):
         result = next_handler(ctx)
-        accept = ctx.request.get_header('Accept-Encoding', '')
-        if 'gzip' not in accept:
+        accept = ctx.request.get_header('Accept-Encoding')
+        encoding = self._negotiate(accept) if accept else None
+        if encoding is None:
             return result
+        if isinstance(result, HTTPResponse) and not isinstance(result, HTTPError):
+            result.apply(ctx.response)  # its headers decide what to compress
+            result = result.body
+        status = ctx.response.status_code
+        if not 200 <= status < 300 or status == 206 \
+           or 'Content-Range' in ctx.response:
+            return result  # redirects, errors, ranges (offsets are identity)
         if not self._should_compress(ctx):
             return result
         if ctx.response.get_header('Content-Encoding'):
@@ -2353,6 +2871,8 @@ class CompressionMiddleware(Middleware):
             body = result
         elif isinstance(result, str):
             body = result.encode('utf-8')
+        elif self.stream and not isinstance(result, (list, tuple)):
+            return self._compress_stream(ctx, result, encoding)
         else:
             # Generators/iterators: collect all chunks first
             try:
@@ -2366,12 +2886,396 @@ class CompressionMiddleware(Middleware):
                 _try_close(result)
         if len(body) < self.min_size:
             return body
-        compressed = gzip.compress(body, compresslevel=self.level)
-        ctx.response.set_header('Content-Encoding', 'gzip')
+        if self.cache_bytes:
+            compressed = self._compress_cached(body, encoding)
+        else:
+            compressed = self._compress(body, encoding)
+        self._set_headers(ctx, encoding)
         ctx.response.set_header('Content-Length', str(len(compressed)))
-        ctx.response.set_header('Vary', 'Accept-Encoding')
         return compressed
 
+    def _compress_stream(self, ctx, result, encoding):
+        """ Compress an iterable (or file) body chunk by chunk. Chunks are read
+            until min_size bytes are seen, so short streams go out as-is.
+            Event streams skip that read-ahead: each event is sent at once. """
+        if hasattr(result, 'read'):
+            chunks = iter(functools.partial(result.read, 65536), b'')
+        else:
+            chunks = iter(result)
+        event_stream = ctx.response.content_type.startswith('text/event-stream')
+        head, size = [], 0
+        try:
+            for chunk in (() if event_stream else chunks):
+                if not isinstance(chunk, bytes):
+                    chunk = tob(chunk)
+                head.append(chunk)
+                size += len(chunk)
+                if size >= self.min_size:
+                    break
+            else:
+                if not event_stream:
+                    _try_close(result)
+                    return b''.join(head)
+        except BaseException:
+            _try_close(result)
+            raise
+        self._set_headers(ctx, encoding)
+        if 'Content-Length' in ctx.response:
+            del ctx.response['Content-Length']
+        return self._compress_chunks(self.codecs[encoding].stream(self.level),
+                                     itertools.chain(head, chunks), result,
+                                     0 if event_stream else self.flush_size)
+
+    def _compress_chunks(self, compressor, chunks, source, flush_size):
+        # Sync flushes hand the client everything sent so far; SSE flushes per event
+        compress, sync_flush, finish = compressor
+        out, pending = [], 0
+        try:
+            for chunk in chunks:
+                if not isinstance(chunk, bytes):
+                    chunk = tob(chunk)
+                out.append(compress(chunk))
+                pending += len(chunk)
+                if pending >= flush_size:
+                    out.append(sync_flush())
+                    yield b''.join(out)
+                    out, pending = [], 0
+            out.append(finish())
+            yield b''.join(out)
+        finally:
+            _try_close(source)
+
+
+# If-None-Match check using weak comparison (RFC 9110 13.1.2)
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    etag = etag[2:] if etag.startswith('W/') else etag
+    for tag in header.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+    return False
+
+# ETags for dynamic responses, and 304 Not Modified when the client has them
+class ETagMiddleware(Middleware):
+    """ Tags successful GET/HEAD responses and answers matching
+        ``If-None-Match`` requests with 304. A handler-set ``ETag`` is used
+        as-is; otherwise the body is hashed with blake2b. Routes declaring
+        ``etag=func`` get ``func(**url_args)`` as their tag, checked before
+        the handler runs. Streamed bodies are not buffered or tagged. """
+    name = 'etag'
+    order = 95  # inside compression: hash the identity body, skip gzip on 304
+
+    def __init__(self, weak=False, digest_size=16):
+        self.weak = weak
+        self.digest_size = digest_size
+
+    def _format(self, tag):
+        if tag.startswith(('"', 'W/"')):
+            return tag
+        return ('W/"%s"' if self.weak else '"%s"') % tag
+
+    def _not_modified(self, ctx, etag):
+        ctx.response.status = 304
+        ctx.response.set_header('ETag', etag)
+        return b''
+
+    def __call__(self, ctx, next_handler):
+        request = ctx.request
+        if request.method not in ('GET', 'HEAD'):
+            return next_handler(ctx)
+        route = ctx.route
+        version = None
+        if route is not None and 'etag' not in route.config._virtual_keys:
+            version = route.config.get('etag')  # the route's own, not app config
+        if version is not None:
+            tag = version(**request.url_args)
+            if tag is not None:
+                etag = self._format(str(tag))
+                if _etag_matches(request.get_header('If-None-Match'), etag):
+                    return self._not_modified(ctx, etag)
+                result = next_handler(ctx)
+                ctx.response.set_header('ETag', etag)
+                return result
+        result = next_handler(ctx)
+        if isinstance(result, HTTPResponse) and not isinstance(result, HTTPError):
+            result.apply(ctx.response)
+            result = result.body
+        resp = ctx.response
+        if resp.status_code != 200 or 'Content-Range' in resp:
+            return result
+        etag = resp.get_header('ETag')
+        if etag is None:
+            if isinstance(result, str):
+                result = result.encode(resp.charset or 'utf8')
+            elif isinstance(result, (list, tuple)) \
+                 and all(isinstance(part, bytes) for part in result):
+                result = b''.join(result)
+            if not isinstance(result, bytes):
+                return result
+            etag = self._format(hashlib.blake2b(
+                result, digest_size=self.digest_size).hexdigest())
+            resp.set_header('ETag', etag)
+        if _etag_matches(request.get_header('If-None-Match'), etag):
+            _try_close(result)
+            return self._not_modified(ctx, etag)
+        return result
+
+
+# Response-cache backends. Subclass ResponseCacheBackend for a shared store.
+class ResponseCacheBackend(abc.ABC):
+    """ABC for ResponseCacheMiddleware storage. Override get() and set().
+    Entries are tuples of str, bytes and ints, so a shared store can pickle them."""
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Return the entry stored under *key*, or ``None`` if it is missing
+        or expired."""
+
+    @abc.abstractmethod
+    def set(self, key, entry, ttl, size):
+        """Store *entry* under *key* for *ttl* seconds.
+
+        Args:
+            key   : cache key string (host, path, query and varied headers).
+            entry : opaque tuple to hand back from :meth:`get`.
+            ttl   : lifetime in seconds.
+            size  : approximate size of the entry in bytes.
+        """
+
+    def delete(self, key):
+        """Optional: drop one entry."""
+
+    def clear(self):
+        """Optional: drop every entry."""
+
+    def close(self):
+        """Optional: release resources (connection pool, threads)."""
+
+
+class MemoryResponseCacheBackend(ResponseCacheBackend):
+    """In-process LRU with per-entry TTL, bounded by total entry size in bytes.
+    Each worker process has its own copy."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, size, entry)
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._entries[key]
+                self._used -= item[1]
+                return None
+            self._entries.move_to_end(key)
+            return item[2]
+
+    def set(self, key, entry, ttl, size):
+        if size > self.max_bytes:
+            return
+        entries = self._entries
+        with self._lock:
+            old = entries.pop(key, None)
+            if old is not None:
+                self._used -= old[1]
+            entries[key] = (time.monotonic() + ttl, size, entry)
+            self._used += size
+            while self._used > self.max_bytes or \
+                  (self.max_entries and len(entries) > self.max_entries):
+                self._used -= entries.popitem(last=False)[1][1]
+
+    def delete(self, key):
+        with self._lock:
+            item = self._entries.pop(key, None)
+            if item is not None:
+                self._used -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._used = 0
+
+    @property
+    def size(self):
+        """Bytes currently held."""
+        return self._used
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _cache_control(header):
+    """Parse a Cache-Control header into {directive: value or None}."""
+    directives = {}
+    for part in header.split(','):
+        name, _, value = part.partition('=')
+        name = name.strip().lower()
+        if name:
+            directives[name] = value.strip().strip('"') or None
+    return directives
+
+# Caches whole GET responses (status, headers, body) server-side
+class ResponseCacheMiddleware(Middleware):
+    """ Serves repeated GET/HEAD requests from a cache keyed by host, path,
+        query and ``key_headers``. Handler responses decide cacheability:
+        ``Cache-Control: no-store``/``private``/``no-cache``, ``Set-Cookie``,
+        ``Vary: *`` and streamed bodies are not stored; ``s-maxage`` or
+        ``max-age`` overrides ``ttl``; other ``Vary`` headers become part of
+        the key. Requests with ``Authorization``, or with ``Cookie`` unless
+        ``cookies=True`` or ``Cookie`` is in ``key_headers``, bypass the
+        cache. Concurrent misses for one key run the handler once. """
+    name = 'response_cache'
+    order = 97  # inside compression and etag: store the identity body
+
+    def __init__(self, backend=None, ttl=60, statuses=(200,), key_headers=(),
+                 wait_timeout=30, cookies=False):
+        self.backend = backend if backend is not None \
+                       else MemoryResponseCacheBackend()
+        self.ttl = ttl
+        self.statuses = frozenset(statuses)
+        self.key_headers = tuple(key_headers)
+        self.wait_timeout = wait_timeout
+        # Handlers may personalise from cookies without saying so; opt in
+        self.cookies = cookies or 'cookie' in (h.lower() for h in key_headers)
+        self._flights = {}  # key -> Event set when the leading request is done
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._coalesced = 0
+
+    def cache_info(self):
+        """ Hit/miss counters. ``coalesced`` counts requests that waited for
+            a concurrent miss instead of running the handler. """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {'hits': self._hits, 'misses': self._misses,
+                    'coalesced': self._coalesced,
+                    'hit_rate': self._hits / lookups if lookups else 0.0,
+                    'in_flight': len(self._flights)}
+
+    def _key(self, request):
+        env = request.environ
+        key = '%s%s%s?%s' % (env.get('HTTP_HOST', ''), env.get('SCRIPT_NAME', ''),
+                             env.get('PATH_INFO', ''), env.get('QUERY_STRING', ''))
+        if self.key_headers:
+            key += '#' + '\n'.join(request.get_header(name, '')
+                                   for name in self.key_headers)
+        return key
+
+    def _lookup(self, key, request):
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] is None:
+            # Vary marker: variants live under key + request header values
+            entry = self.backend.get(key + '|' + '\n'.join(
+                request.get_header(name, '') for name in entry[1]))
+        return entry
+
+    def _replay(self, ctx, entry):
+        resp = ctx.response
+        resp.status = entry[0]
+        headers = resp._headers
+        for name, values in entry[1]:
+            headers[name] = list(values)
+        return entry[2]
+
+    def __call__(self, ctx, next_handler):
+        request = ctx.request
+        method = request.method
+        if method not in ('GET', 'HEAD') or request.get_header('Authorization') \
+           or (not self.cookies and request.get_header('Cookie')):
+            return next_handler(ctx)
+        key = self._key(request)
+        entry = self._lookup(key, request)
+        if entry is not None:
+            with self._lock:
+                self._hits += 1
+            return self._replay(ctx, entry)
+        if method == 'HEAD':
+            with self._lock:
+                self._misses += 1
+            return next_handler(ctx)  # HEAD bodies never fill the cache
+        with self._lock:
+            self._misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Event()
+        if not leader:
+            flight.wait(self.wait_timeout)
+            entry = self._lookup(key, request)
+            if entry is None:  # not cacheable, or the leader timed out
+                return next_handler(ctx)
+            with self._lock:
+                self._coalesced += 1
+            return self._replay(ctx, entry)
+        try:
+            return self._fill(ctx, next_handler, key)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.set()
+
+    def _fill(self, ctx, next_handler, key):
+        resp = ctx.response
+        before = {name: tuple(values) for name, values in resp._headers.items()}
+        cookies = len(resp._cookies or ())
+        result = next_handler(ctx)
+        if isinstance(result, HTTPResponse) and not isinstance(result, HTTPError):
+            result.apply(resp)
+            result = result.body
+        if resp.status_code not in self.statuses or 'Content-Range' in resp \
+           or len(resp._cookies or ()) != cookies:
+            return result
+        if isinstance(result, str):
+            result = result.encode(resp.charset)
+        elif isinstance(result, (list, tuple)) \
+             and all(isinstance(part, bytes) for part in result):
+            result = b''.join(result)
+        if not isinstance(result, bytes):
+            return result
+        ttl = self.ttl
+        control = resp.get_header('Cache-Control')
+        if control:
+            directives = _cache_control(control)
+            if 'no-store' in directives or 'private' in directives \
+               or 'no-cache' in directives:
+                return result
+            age = directives.get('s-maxage') or directives.get('max-age')
+            if age is not None:
+                try:
+                    ttl = int(age)
+                except ValueError:
+                    return result
+        if ttl <= 0:
+            return result
+        vary = resp.get_header('Vary')
+        if vary:
+            vary = tuple(sorted(set(name.strip().title()
+                                    for name in vary.split(',') if name.strip())))
+            if '*' in vary:
+                return result
+        # Only headers the handler (and inner middleware) set or changed
+        headers = tuple((name, tuple(values))
+                        for name, values in resp._headers.items()
+                        if before.get(name) != tuple(values))
+        entry = (resp.status_line, headers, result)
+        size = len(key) + len(result) + sum(
+            len(name) + sum(len(v) for v in values) for name, values in headers)
+        backend = self.backend
+        if vary:
+            backend.set(key, (None, vary, None), ttl, len(key) + sum(map(len, vary)))
+            key += '|' + '\n'.join(ctx.request.get_header(name, '')
+                                   for name in vary)
+        backend.set(key, entry, ttl, size)
+        return result
+
 
 # Rejects bodies over max_size before they clog your pipes
 class BodyLimitMiddleware(Middleware):
@@ -2566,6 +3470,171 @@ class BackgroundTaskPool:
         self._pool.shutdown(wait=wait)
 
 
+_memoize_pool = None
+_memoize_pool_lock = threading.Lock()
+
+def _memoize_default_pool():
+    global _memoize_pool
+    if _memoize_pool is None:
+        with _memoize_pool_lock:
+            if _memoize_pool is None:
+                _memoize_pool = BackgroundTaskPool(max_workers=4)
+                atexit.register(_memoize_pool.shutdown, wait=False)
+    return _memoize_pool
+
+def _approx_size(value):
+    """Rough deep size in bytes of a handler return value."""
+    size, stack, seen = 0, [value], set()
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+            stack.append(obj.__dict__)
+    return size
+
+# Cache handler return values per url_args: TTL, stale-while-revalidate,
+# one caller per cold key. Route option: @app.get(..., cache=dict(ttl=30, swr=60))
+def memoize(ttl=30, swr=0, max_entries=1024, max_bytes=None, key=None, pool=None):
+    """ Decorator: memoize a handler's return value (before JSON/template
+        conversion) keyed by its URL arguments, or by ``key(**url_args)``.
+        For ``swr`` seconds after ``ttl`` the stale value is served while one
+        background task refreshes it, with ``request``, ``ctx`` and injected
+        dependencies bound but no hooks or middleware run. Concurrent misses
+        run the handler once.
+        Entries are evicted LRU past ``max_entries`` or ``max_bytes``
+        (approximate deep size). Generators, files and ``HTTPResponse``
+        objects are never stored, and headers set on ``response`` are not
+        replayed. The wrapper has ``cache_info()`` and ``cache_clear()``. """
+    def decorator(func):
+        entries = OrderedDict()  # key -> (value, fresh_until, stale_until, size)
+        flights = {}  # key -> Event set when the leading call is done
+        refreshing = set()
+        lock = threading.Lock()
+        stats = {'hits': 0, 'stale': 0, 'misses': 0, 'refreshes': 0}
+        used = [0]
+        log = logging.getLogger('lcore.memoize')
+
+        def store(k, value):
+            if isinstance(value, HTTPResponse) or hasattr(value, 'read') \
+               or hasattr(value, '__next__') or inspect.iscoroutine(value):
+                return
+            size = _approx_size(value) if max_bytes else 0
+            if max_bytes and size > max_bytes:
+                return
+            now = time.monotonic()
+            with lock:
+                old = entries.pop(k, None)
+                if old is not None:
+                    used[0] -= old[3]
+                entries[k] = (value, now + ttl, now + ttl + swr, size)
+                used[0] += size
+                while len(entries) > max_entries or \
+                      (max_bytes and used[0] > max_bytes):
+                    used[0] -= entries.popitem(last=False)[1][3]
+
+        def refresh(k, environ, a, ka):
+            # Runs on the pool: bind request, response, ctx and the DI scope
+            # like _handle does (hooks and middleware don't run), then unbind
+            app = environ.get('lcore.app')
+            deps = app._dependencies if app is not None else None
+            request.bind(environ)
+            response.bind()
+            ctx.bind(request, response, app)
+            ctx.route = environ.get('lcore.route')
+            try:
+                if deps:
+                    deps._begin_scope(ctx)
+                store(k, func(*a, **ka))
+            except Exception:
+                log.warning('Background refresh of %s%r failed',
+                            func.__name__, k, exc_info=True)
+            else:
+                with lock:
+                    stats['refreshes'] += 1
+            finally:
+                if deps:
+                    deps._end_scope(ctx)
+                request.bind({})  # don't keep the stale request alive
+                response.bind()
+                ctx.bind()
+                with lock:
+                    refreshing.discard(k)
+
+        @functools.wraps(func)
+        def wrapper(*a, **ka):
+            k = key(**ka) if key is not None else \
+                (a + tuple(sorted(ka.items())) if a else tuple(sorted(ka.items())))
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(k)
+                if entry is not None:
+                    if now < entry[1]:
+                        entries.move_to_end(k)
+                        stats['hits'] += 1
+                        return entry[0]
+                    if now < entry[2]:
+                        entries.move_to_end(k)
+                        stats['stale'] += 1
+                        start = k not in refreshing
+                        if start:
+                            refreshing.add(k)
+                    else:
+                        entry = None
+                if entry is None:
+                    stats['misses'] += 1
+                    flight = flights.get(k)
+                    leader = flight is None
+                    if leader:
+                        flight = flights[k] = threading.Event()
+            if entry is not None:
+                if start:
+                    try:
+                        (pool or _memoize_default_pool()).submit(
+                            refresh, k, dict(request.environ), a, ka)
+                    except RuntimeError:  # pool shut down
+                        with lock:
+                            refreshing.discard(k)
+                return entry[0]
+            if not leader:
+                flight.wait()
+                with lock:
+                    entry = entries.get(k)
+                if entry is not None:
+                    return entry[0]
+                return func(*a, **ka)  # leader failed or result not cacheable
+            try:
+                value = func(*a, **ka)
+                store(k, value)
+                return value
+            finally:
+                with lock:
+                    del flights[k]
+                flight.set()
+
+        def cache_info():
+            with lock:
+                return dict(stats, entries=len(entries), size=used[0],
+                            refreshing=len(refreshing))
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+                used[0] = 0
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
 # Rate-limit backends. Subclass RateLimitBackend for cross-worker enforcement.
 class RateLimitBackend(abc.ABC):
     """ABC for rate-limit backends. Override consume(). Use RedisRateLimitBackend."""
@@ -2729,128 +3798,288 @@ def rate_limit(limit, per=60, max_buckets=10000, backend=None):
         return wrapper
     return decorator
 
-# Validates request.json / query params against a schema. Supports Optional[type].
-def validate_request(body=None, query=None):
-    import dataclasses
-    import typing
+# validate_request coercions: return the cleaned value or raise on a type mismatch
+def _coerce_str(value):
+    return str(value).strip()
 
-    def _is_optional(tp):
-        """Return (True, inner_type) if tp is Optional[X], else (False, tp)."""
-        origin = getattr(tp, '__origin__', None)
-        if origin is typing.Union:
-            args = getattr(tp, '__args__', [])
-            non_none = [a for a in args if a is not type(None)]
-            if len(non_none) == 1:
-                return True, non_none[0]
-        return False, tp
-
-    def _coerce(value, expected_type):
-        """Try to coerce *value* to *expected_type*.  Returns (success, result)."""
-        if expected_type is str:
-            return True, str(value).strip()
-        if expected_type is int:
-            try:
-                return True, int(value)
-            except (TypeError, ValueError):
-                return False, value
-        if expected_type is float:
-            try:
-                return True, float(value)
-            except (TypeError, ValueError):
-                return False, value
-        if expected_type is bool:
-            if isinstance(value, bool):
-                return True, value
-            if isinstance(value, str):
-                return True, value.lower() in ('true', '1', 'yes', 'on')
-            return True, bool(value)
-        if callable(expected_type):
-            try:
-                result = expected_type(value)
-                return True, result if result is not False else value
-            except Exception:
-                return False, value
-        return True, value
-
-    def _validate_dict_schema(data, schema):
-        errors = {}
-        validated = {}
-        for name, expected_type in schema.items():
-            is_opt, inner_type = _is_optional(expected_type)
-            if name not in data:
-                if not is_opt:
-                    errors[name] = '%s is required' % name
-                continue
-            ok, result = _coerce(data[name], inner_type)
-            if not ok:
-                type_name = getattr(inner_type, '__name__', str(inner_type))
-                errors[name] = '%s must be %s' % (name, type_name)
-            else:
-                validated[name] = result
-        return errors, validated
+def _coerce_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.lower() in ('true', '1', 'yes', 'on')
+    return bool(value)
+
+_schema_coercions = {str: _coerce_str, int: int, float: float, bool: _coerce_bool}
 
-    def _validate_dataclass_schema(data, schema):
-        errors = {}
-        validated = {}
+def _optional_type(tp):
+    """Return (True, inner_type) if tp is Optional[X], else (False, tp)."""
+    import typing
+    if typing.get_origin(tp) is typing.Union:
+        non_none = [a for a in typing.get_args(tp) if a is not type(None)]
+        if len(non_none) == 1:
+            return True, non_none[0]
+    return False, tp
+
+def _compile_coercion(tp):
+    """ Return (coerce, nested) for a schema type. Nested coercions take
+        ``(value, path, errors)`` and report errors for their own items. """
+    import dataclasses, typing
+    if isinstance(tp, dict) or dataclasses.is_dataclass(tp):
+        validate = _compile_validator(tp)
+
+        def coerce_object(value, path, errors):
+            if not isinstance(value, dict):
+                raise TypeError(value)
+            sub_errors, validated = validate(value, path + '.')
+            errors.update(sub_errors)
+            return validated
+        return coerce_object, True
+    if tp is list or typing.get_origin(tp) is list:
+        args = typing.get_args(tp)
+        item, item_nested = _compile_coercion(args[0]) if args else (None, False)
+        item_name = _schema_type_name(args[0]) if args else None
+
+        def coerce_list(value, path, errors):
+            if not isinstance(value, list):
+                raise TypeError(value)
+            if item is None:
+                return value
+            result = []
+            for i, element in enumerate(value):
+                where = '%s[%d]' % (path, i)
+                try:
+                    result.append(item(element, where, errors) if item_nested
+                                  else item(element))
+                except Exception:
+                    errors[where] = '%s must be %s' % (where, item_name)
+            return result
+        return coerce_list, True
+    if tp in _schema_coercions:
+        return _schema_coercions[tp], False
+    if callable(tp) and not typing.get_origin(tp):
+        def coerce_callable(value):
+            result = tp(value)
+            return value if result is False else result
+        return coerce_callable, False
+    return None, False
+
+def _schema_type_name(tp):
+    import typing
+    if isinstance(tp, dict):
+        return 'object'
+    tp = typing.get_origin(tp) or tp  # List[int] -> list on every Python
+    return getattr(tp, '__name__', str(tp))
+
+# Compiles a validate_request schema once into validate(data, path) -> (errors, validated)
+def _compile_validator(schema, multi=False):
+    # multi: data is a MultiDict (query string); list fields read getall()
+    import dataclasses, typing
+    fields = []
+    if isinstance(schema, dict):
+        for name, tp in schema.items():
+            fields.append((name, tp, _UNSET, None))
+    else:
+        try:
+            hints = typing.get_type_hints(schema)
+        except Exception:
+            hints = {}
         for field in dataclasses.fields(schema):
-            is_opt, inner_type = _is_optional(field.type)
-            if field.name not in data:
-                if not is_opt and field.default is dataclasses.MISSING \
-                   and field.default_factory is dataclasses.MISSING:
-                    errors[field.name] = '%s is required' % field.name
+            default = _UNSET if field.default is dataclasses.MISSING \
+                else field.default
+            factory = None if field.default_factory is dataclasses.MISSING \
+                else field.default_factory
+            fields.append((field.name, hints.get(field.name, field.type),
+                           default, factory))
+    spec = []
+    for name, tp, default, factory in fields:
+        optional, tp = _optional_type(tp)
+        coerce, nested = _compile_coercion(tp)
+        many = multi and (tp is list or typing.get_origin(tp) is list)
+        spec.append((name, optional, default, factory, coerce, nested,
+                     _schema_type_name(tp), many))
+    spec = tuple(spec)
+
+    def validate(data, path=''):
+        errors, validated = {}, {}
+        for name, optional, default, factory, coerce, nested, type_name, many \
+                in spec:
+            if name not in data:
+                if default is not _UNSET:
+                    validated[name] = default
+                elif factory is not None:
+                    validated[name] = factory()
+                elif not optional:
+                    errors[path + name] = '%s%s is required' % (path, name)
                 continue
-            ok, result = _coerce(data[field.name], inner_type)
-            if not ok:
-                type_name = getattr(inner_type, '__name__', str(inner_type))
-                errors[field.name] = '%s must be %s' % (field.name, type_name)
-            else:
-                validated[field.name] = result
+            value = data.getall(name) if many else data[name]
+            if coerce is None or (value is None and optional):
+                validated[name] = value
+                continue
+            try:
+                validated[name] = coerce(value, path + name, errors) if nested \
+                    else coerce(value)
+            except Exception:
+                errors[path + name] = '%s%s must be %s' % (path, name, type_name)
         return errors, validated
+    validate.lists = frozenset(entry[0] for entry in spec if entry[-1])
+    return validate
+
+# Runs a compiled validator over each element of a JSON array, up to max_errors
+def _validate_items(items, validate, type_name, max_errors):
+    errors, validated = {}, []
+    append = validated.append
+    for i, item in enumerate(items):
+        if isinstance(item, dict):
+            item_errors, values = validate(item)
+            if not item_errors:
+                item.update(values)
+                append(item)
+                continue
+            prefix = '[%d].' % i
+            for key, message in item_errors.items():
+                errors[prefix + key] = prefix + message
+        else:
+            errors['[%d]' % i] = '[%d] must be %s' % (i, type_name)
+        if len(errors) >= max_errors:
+            return dict(itertools.islice(errors.items(), max_errors)), None, True
+    return errors, validated, False
+
+_json_ws = re.compile(r'[ \t\n\r]*').match
+_json_array_sep = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*').match
+
+# Yields the elements of a JSON array as they are parsed from a file object
+def _iter_json_array(fp, bufsize=2 ** 16):
+    import codecs, json
+    decode = codecs.getincrementaldecoder('utf8')().decode
+    scan = json.JSONDecoder().scan_once
+    buf, pos, eof = '', 0, False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = fp.read(bufsize)
+        eof = not chunk
+        buf = buf[pos:] + decode(chunk, final=eof)
+        pos = 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = _json_ws(buf, pos).end()
+            if pos < len(buf) or eof:
+                return buf[pos:pos + 1]
+            more()
+
+    if peek() != '[':
+        raise TypeError('Expecting a JSON array')
+    pos += 1
+    if peek() == ']':
+        pos += 1
+    else:
+        while True:
+            while True:  # re-read until the element is complete
+                try:
+                    item, end = scan(buf, pos)
+                    if eof or (end < len(buf)
+                               and buf[end] not in '0123456789.eE+-'):
+                        break
+                except (StopIteration, ValueError):
+                    if eof:
+                        raise ValueError('Invalid JSON array element')
+                    if buf[pos:pos + 1].isspace():
+                        peek()
+                        continue
+                more()
+            yield item
+            pos = end
+            while True:
+                sep = _json_array_sep(buf, pos)
+                if sep is not None or eof:
+                    break
+                more()
+            if sep is None:
+                raise ValueError('Expecting \',\' or \']\' in JSON array')
+            pos = sep.end()
+            if sep.group(1) == ']':
+                break
+    if peek():
+        raise ValueError('Extra data after JSON array')
+
+# Validates request.json / query params against a schema. Supports Optional[type].
+# body=List[Schema] validates a JSON array; stream=True validates while parsing.
+def validate_request(body=None, query=None, max_errors=100, stream=False):
+    import typing
+    validate_body = validate_items = None
+    if typing.get_origin(body) is list:
+        item_schema = typing.get_args(body)[0]
+        validate_items = _compile_validator(item_schema)
+        item_name = _schema_type_name(item_schema)
+    elif body:
+        validate_body = _compile_validator(body)
+    validate_query = _compile_validator(query, multi=True) if query else None
+
+    def _fail(status, errors, truncated=False):
+        result = {'error': 'Validation failed', 'fields': errors}
+        if truncated:
+            result['truncated'] = True
+        raise HTTPError(status, body=json_dumps(result),
+                        content_type='application/json')
+
+    def _array_error():
+        raise HTTPError(400, 'Request body must be a JSON array',
+                        content_type='application/json')
+
+    def _check_items():
+        environ = request.environ
+        if not stream or 'lcore.request.json' in environ:
+            items = request.json
+            if items is None:
+                return
+            if not isinstance(items, list):
+                _array_error()
+        else:
+            ctype = environ.get('CONTENT_TYPE', '').lower().split(';')[0]
+            if ctype not in ('application/json', 'application/json-rpc') \
+               or request.content_length == 0:
+                return
+            items = _iter_json_array(request.body)
+        try:
+            errors, validated, truncated = _validate_items(
+                items, validate_items, item_name, max_errors)
+        except TypeError:
+            _array_error()
+        except ValueError as err:
+            raise HTTPError(400, 'Invalid JSON', exception=err)
+        if errors:
+            _fail(422, errors, truncated)
+        environ['lcore.request.json'] = validated
 
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*a, **ka):
-            if body and request.json is not None:
+            if validate_items is not None:
+                _check_items()
+            elif validate_body is not None and request.json is not None:
                 data = request.json
                 if not isinstance(data, dict):
                     raise HTTPError(400, 'Request body must be a JSON object',
                                     content_type='application/json')
-                if isinstance(body, dict):
-                    errors, validated = _validate_dict_schema(data, body)
-                else:
-                    errors, validated = _validate_dataclass_schema(data, body)
+                errors, validated = validate_body(data)
                 if errors:
-                    raise HTTPError(422,
-                                    body=json_dumps({
-                                        'error': 'Validation failed',
-                                        'fields': errors,
-                                    }),
-                                    content_type='application/json')
+                    _fail(422, errors)
                 data.update(validated)
-            if query:
-                errors = {}
-                if isinstance(query, dict):
-                    for name, expected_type in query.items():
-                        val = request.query.get(name)
-                        if val is None:
-                            is_opt, _ = _is_optional(expected_type)
-                            if not is_opt:
-                                errors[name] = '%s is required' % name
-                else:
-                    for field in dataclasses.fields(query):
-                        val = request.query.get(field.name)
-                        is_opt, _ = _is_optional(field.type)
-                        if val is None and not is_opt \
-                           and field.default is dataclasses.MISSING \
-                           and field.default_factory is dataclasses.MISSING:
-                            errors[field.name] = '%s is required' % field.name
+            if validate_query is not None:
+                params = request.query
+                errors, validated = validate_query(params)
                 if errors:
-                    raise HTTPError(400,
-                                    body=json_dumps({
-                                        'error': 'Validation failed',
-                                        'fields': errors,
-                                    }),
-                                    content_type='application/json')
+                    _fail(400, errors)
+                for name, value in validated.items():
+                    values = params.dict.get(name)
+                    if not values:  # defaults stay out of request.query
+                        continue
+                    if name in validate_query.lists:
+                        values[:] = value  # List[...] field: every value coerced
+                    else:
+                        values[-1] = value  # the value query[name] returns
             return func(*a, **ka)
         return wrapper
     return decorator
@@ -2877,6 +4106,95 @@ class HTTPResponse(Response, LcoreException):
                     other._cookies[k] = v
         other.body = self.body
 
+# Static response built once: body encoded, headers validated, Content-Length set
+class PrecomputedResponse(HTTPResponse):
+    """ A response whose body bytes, status line and headers are computed at
+        construction. Return or raise it from handlers and error handlers;
+        applying it to a request is a few dict assignments. It is shared
+        between threads, so it cannot be changed after construction.
+        ``dict``/``list`` bodies are encoded as JSON. """
+
+    # Always describe *this* body, even if the handler set them already
+    body_headers = ('Content-Type', 'Content-Length')
+
+    def __init__(self, body=b'', status=None, headers=None, **more_headers):
+        super(PrecomputedResponse, self).__init__(b'', status)
+        if isinstance(headers, dict):
+            headers = headers.items()
+        for name, value in itertools.chain(headers or (), more_headers.items()):
+            BaseResponse.add_header(self, name, value)
+        if isinstance(body, (dict, list)):
+            body = json_dumps(body)
+            self._headers.setdefault('Content-Type', ['application/json'])
+        if isinstance(body, str):
+            body = body.encode(self.charset)
+        elif not isinstance(body, bytes):
+            raise TypeError('PrecomputedResponse body must be bytes, str, '
+                            'dict or list, not %s' % type(body).__name__)
+        self._headers.setdefault('Content-Type', [self.default_content_type])
+        self._headers['Content-Length'] = [str(len(body))]
+        self.body = body
+        self._items = tuple((k, tuple(v)) for (k, v) in self._headers.items())
+
+    def _readonly(self, *a, **ka):
+        raise TypeError('PrecomputedResponse is immutable.')
+
+    def __setattr__(self, name, value):
+        if '_items' in self.__dict__:
+            self._readonly()
+        object.__setattr__(self, name, value)
+
+    set_header = add_header = set_headers = set_cookie = delete_cookie = \
+        __setitem__ = __delitem__ = _readonly
+
+    def apply(self, other):
+        other._status_code = self._status_code
+        other._status_line = self._status_line
+        headers, body_headers = other._headers, self.body_headers
+        for key, values in self._items:
+            if key in body_headers or key not in headers:
+                headers[key] = list(values)
+        other.body = self.body
+
+# Streams a big JSON array in chunks instead of building one giant string
+class StreamingJSON(HTTPResponse):
+    """ A response that encodes ``items`` (any iterable) as a JSON array while
+        it is being sent. Items are serialized ``batch_size`` at a time and
+        coalesced into chunks of about ``chunk_size`` bytes, so memory stays
+        flat. No Content-Length is set; the server uses chunked transfer.
+        ``dumps`` is a callable or a backend name as for ``json.dump_func``. """
+
+    def __init__(self, items, status=None, headers=None, dumps=None,
+                 batch_size=256, chunk_size=2 ** 16, **more_headers):
+        dumps = _json_backend(dumps) if dumps else json_dumps
+        body = self._iter_chunks(items, dumps, batch_size, chunk_size)
+        super(StreamingJSON, self).__init__(body, status, headers, **more_headers)
+        if 'Content-Type' not in self._headers:
+            self.content_type = 'application/json'
+
+    @staticmethod
+    def _iter_chunks(items, dumps, batch_size, chunk_size):
+        source = iter(items)
+        buf, size, sep = [b'['], 1, b''
+        try:
+            while True:
+                batch = list(itertools.islice(source, batch_size))
+                if not batch:
+                    break
+                data = dumps(batch)  # '[a, b, c]' -> keep 'a, b, c'
+                if isinstance(data, str):
+                    data = data.encode('utf8')
+                buf += (sep, memoryview(data)[1:-1])
+                size += len(sep) + len(data) - 2
+                sep = b','
+                if size >= chunk_size:
+                    yield b''.join(buf)
+                    buf, size = [], 0
+            buf.append(b']')
+            yield b''.join(buf)
+        finally:
+            _try_close(items)
+
 # Raise this. Triggers your error_handler if you registered one.
 class HTTPError(HTTPResponse):
 
@@ -2897,6 +4215,182 @@ class HTTPError(HTTPResponse):
 class PluginError(LcoreException):
     pass
 
+# Resolves the 'json.dump_func' setting: a callable, or the name of a backend
+def _json_backend(name):
+    if callable(name):
+        return name
+    if name == 'auto':
+        for backend in ('orjson', 'ujson'):
+            try:
+                return _json_backend(backend)
+            except ImportError:
+                pass
+        name = 'json'
+    if name == 'orjson':
+        import orjson  # returns bytes; _cast sends them without re-encoding
+        return orjson.dumps
+    if name == 'ujson':
+        import ujson
+        return ujson.dumps
+    if name == 'json':
+        import json
+        return json.dumps
+    raise ValueError("Unknown JSON backend %r (use 'json', 'ujson', 'orjson',"
+                     " 'auto' or a callable)" % (name,))
+
+# Compiled response-model encoders: dataclass/TypedDict -> plain JSON data
+_json_encoders = {}
+
+def _json_encoder(tp):
+    """ Return a function turning values annotated as ``tp`` into data the
+        JSON backend accepts, or None if they can be passed through as-is.
+        Encoders are compiled once per type and cached. """
+    try:
+        return _json_encoders[tp]
+    except KeyError:
+        pass
+    except TypeError:  # unhashable annotation
+        return _json_encode_any
+    _json_encoders[tp] = _json_encode_any  # recursive models resolve lazily
+    encoder = _json_encoders[tp] = _compile_json_encoder(tp)
+    return encoder
+
+def _is_typeddict(tp):
+    return isinstance(tp, type) and issubclass(tp, dict) \
+        and hasattr(tp, '__total__')
+
+def _compile_json_encoder(tp):
+    import dataclasses, decimal, enum, types, typing
+    origin, args = typing.get_origin(tp), typing.get_args(tp)
+    union_type = getattr(types, 'UnionType', None)  # X | Y, Python 3.10+
+    if origin is typing.Union or (union_type is not None and origin is union_type):
+        non_none = [a for a in args if a is not type(None)]
+        if len(non_none) != 1:
+            return _json_encode_any
+        inner = _json_encoder(non_none[0])
+        if inner is None:
+            return None
+        return lambda value: None if value is None else inner(value)
+    if origin in (list, tuple, set, frozenset):
+        if origin is tuple and not (len(args) == 2 and args[1] is Ellipsis):
+            return _json_encode_any
+        inner = _json_encoder(args[0]) if args else _json_encode_any
+        if inner is None:
+            return list if origin in (set, frozenset) else None
+        return lambda value: [inner(item) for item in value]
+    if origin is dict:
+        inner = _json_encoder(args[1]) if args else _json_encode_any
+        if inner is None:
+            return None
+        return lambda value: {k: inner(v) for k, v in value.items()}
+    if not isinstance(tp, type) or tp is object:
+        return _json_encode_any
+    if dataclasses.is_dataclass(tp):
+        return _compile_dataclass_encoder(tp)
+    if _is_typeddict(tp):
+        return _compile_typeddict_encoder(tp)
+    if issubclass(tp, enum.Enum):
+        return lambda value: value.value
+    if issubclass(tp, (str, int, float, bool, type(None))):
+        return None
+    if hasattr(tp, 'isoformat'):  # datetime, date, time
+        return lambda value: value.isoformat()
+    if issubclass(tp, (uuid.UUID, decimal.Decimal)):
+        return str
+    return _json_encode_any
+
+def _compile_dataclass_encoder(cls):
+    """ Generate ``encode(obj) -> {'field': obj.field, ...}`` for a dataclass.
+        Unlike ``asdict()`` nothing is deep-copied: plain fields are read
+        straight off the instance, only typed fields are converted. """
+    import dataclasses, typing
+    try:
+        hints = typing.get_type_hints(cls)
+    except Exception:
+        hints = {}
+    env, items = {}, []
+    for i, field in enumerate(dataclasses.fields(cls)):
+        value = 'obj.%s' % field.name
+        encoder = _json_encoder(hints.get(field.name, field.type))
+        if encoder is not None:
+            env['_enc%d' % i] = encoder
+            value = '_enc%d(%s)' % (i, value)
+        items.append('%r: %s' % (field.name, value))
+    source = 'def encode(obj):\n    return {%s}\n' % ', '.join(items)
+    exec(compile(source, '<json encoder %s>' % cls.__qualname__, 'exec'), env)
+    return env['encode']
+
+def _compile_typeddict_encoder(cls):
+    import typing
+    try:
+        hints = typing.get_type_hints(cls)
+    except Exception:
+        return _json_encode_any
+    convert = [(key, _json_encoder(tp)) for key, tp in hints.items()]
+    convert = [(key, encoder) for key, encoder in convert if encoder is not None]
+    if not convert:
+        return None
+
+    def encode(value):
+        value = dict(value)
+        for key, encoder in convert:
+            if key in value:
+                value[key] = encoder(value[key])
+        return value
+    return encode
+
+def _json_encode_any(value):
+    """ Fallback for untyped values: dispatch on the runtime type. """
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, dict):
+        return {k: _json_encode_any(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_json_encode_any(item) for item in value]
+    cls = type(value)
+    if hasattr(cls, '__dataclass_fields__') or hasattr(cls, 'isoformat') \
+       or isinstance(value, uuid.UUID):
+        return _json_encoder(cls)(value)
+    import decimal, enum
+    if isinstance(value, (enum.Enum, decimal.Decimal)):
+        return _json_encoder(cls)(value)
+    return value
+
+# The model a handler's return annotation describes: (runtime type, encoder)
+def _response_model(callback):
+    import dataclasses, typing
+    try:
+        hint = typing.get_type_hints(callback).get('return')
+    except Exception:
+        return None, None
+    tp = hint
+    while True:
+        origin, args = typing.get_origin(tp), typing.get_args(tp)
+        if origin in (list, tuple, set, frozenset, dict) and args:
+            tp = args[-1] if origin is dict else args[0]
+        elif origin is not None and args and type(None) in args:
+            non_none = [a for a in args if a is not type(None)]
+            if len(non_none) != 1:
+                return None, None
+            tp = non_none[0]
+        else:
+            break
+    if not (isinstance(tp, type)
+            and (dataclasses.is_dataclass(tp) or _is_typeddict(tp))):
+        return None, None
+    runtime = hint
+    while True:  # list[User] passes isinstance(.., type) on 3.9/3.10
+        origin, args = typing.get_origin(runtime), typing.get_args(runtime)
+        if origin is None:
+            break
+        if origin in (list, tuple, set, frozenset, dict):
+            runtime = origin
+        else:
+            runtime = [a for a in args if a is not type(None)][0]
+    if _is_typeddict(runtime):
+        runtime = dict
+    return runtime, _json_encoder(hint)
+
 # Turns your dict returns into JSON with the right Content-Type
 class JSONPlugin:
     name = 'json'
@@ -2915,20 +4409,40 @@ class JSONPlugin:
         app.config._define('json.dump_func', default=None,
                           help="If defined, use this function to transform"
                                " dict into json. The other options no longer"
-                               " apply.")
+                               " apply. Also accepts a backend name: 'json',"
+                               " 'ujson', 'orjson' or 'auto' (fastest"
+                               " installed). Backends may return bytes.")
 
     def apply(self, callback, route):
         dumps = self.json_dumps
         if not self.json_dumps: return callback
+        dump_func = route.config.get('json.dump_func')
+        if dump_func:
+            dumps = _json_backend(dump_func)
+
+        model, encode = _response_model(route.callback)
+
+        def _to_plain(data):
+            # JSON-ready data for dict/model/dataclass results, else None
+            if model is not None and isinstance(data, model):
+                return data if encode is None else encode(data)
+            if isinstance(data, dict):
+                return data
+            if hasattr(type(data), '__dataclass_fields__'):
+                return _json_encoder(type(data))(data)
+            return None
 
         def _json_convert(rv):
-            if isinstance(rv, dict):
-                json_response = dumps(rv)
+            data = _to_plain(rv)
+            if data is not None:
+                json_response = dumps(data)
                 response.content_type = 'application/json'
                 return json_response
-            elif isinstance(rv, HTTPResponse) and isinstance(rv.body, dict):
-                rv.body = dumps(rv.body)
-                rv.content_type = 'application/json'
+            elif isinstance(rv, HTTPResponse):
+                data = _to_plain(rv.body)
+                if data is not None:
+                    rv.body = dumps(data)
+                    rv.content_type = 'application/json'
             return rv
 
         @functools.wraps(callback)
@@ -3122,16 +4636,51 @@ class WSGIHeaderDict(DictMixin):
 
     def __init__(self, environ):
         self.environ = environ
+        self._index = None
 
     def _ekey(self, key):
-        key = key.replace('-', '_').upper()
-        if key in self.cgikeys:
-            return key
-        return 'HTTP_' + key
+        try:
+            return _wsgi_ekeys[key]
+        except KeyError:
+            pass
+        ekey = key.replace('-', '_').upper()
+        if ekey not in self.cgikeys:
+            ekey = 'HTTP_' + ekey
+        if len(_wsgi_ekeys) < _WSGI_KEY_MEMO_SIZE:
+            _wsgi_ekeys[key] = ekey
+        return ekey
+
+    def _names(self):
+        """ Header name -> environ key for every header in the environ. Built
+            once per request and rebuilt only if the environ's keys change. """
+        index = self._index
+        if index is None or self.environ.keys() != self._index_keys:
+            index = {}
+            for key in self.environ:
+                if key[:5] == 'HTTP_' or key in self.cgikeys:
+                    name = _wsgi_hnames.get(key)
+                    if name is None:
+                        name = _hkey(key[5:] if key[:5] == 'HTTP_' else key)
+                        if len(_wsgi_hnames) < _WSGI_KEY_MEMO_SIZE:
+                            _wsgi_hnames[key] = name
+                    if key in self.cgikeys or name not in index:
+                        index[name] = key  # CONTENT_TYPE beats HTTP_CONTENT_TYPE
+            self._index, self._index_keys = index, set(self.environ)
+        return index
 
     def raw(self, key, default=None):
         return self.environ.get(self._ekey(key), default)
 
+    def get(self, key, default=None):
+        value = self.environ.get(self._ekey(key), _UNSET)
+        return default if value is _UNSET else _wsgi_recode(value)
+
+    def snapshot(self):
+        """ Return all request headers as a plain ``{name: value}`` dict. """
+        environ = self.environ
+        return {name: _wsgi_recode(environ[key])
+                for name, key in self._names().items()}
+
     def __getitem__(self, key):
         return _wsgi_recode(self.environ[self._ekey(key)])
 
@@ -3142,21 +4691,22 @@ class WSGIHeaderDict(DictMixin):
         raise TypeError("%s is read-only." % self.__class__)
 
     def __iter__(self):
-        for key in self.environ:
-            if key[:5] == 'HTTP_':
-                yield _hkey(key[5:])
-            elif key in self.cgikeys:
-                yield _hkey(key)
+        return iter(list(self._names()))
 
     def keys(self):
-        return [x for x in self]
+        return list(self._names())
 
     def __len__(self):
-        return len(self.keys())
+        return len(self._names())
 
     def __contains__(self, key):
         return self._ekey(key) in self.environ
 
+# Process-wide memo of header name <-> environ key transforms (bounded)
+_WSGI_KEY_MEMO_SIZE = 1024
+_wsgi_ekeys = {}
+_wsgi_hnames = {}
+
 # Hierarchical config: overlays, dotted keys, .env loading, dataclass validation
 class ConfigDict(dict):
 
@@ -3480,6 +5030,17 @@ class ResourceManager:
         if not fname: raise IOError("Resource %r not found." % name)
         return self.opener(fname, mode=mode, *args, **kwargs)
 
+def _current_umask():
+    try:
+        with open('/proc/self/status') as fp:
+            for line in fp:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (IOError, OSError, ValueError):
+        pass
+    # Reading the umask means setting it, which would race with other threads
+    return None
+
 # Your uploaded file, with a sanitized filename and a save() method
 class FileUpload:
     def __init__(self, fileobj, name, filename, headers=None):
@@ -3496,7 +5057,7 @@ class FileUpload:
 
     @cached_property
     def filename(self):
-        fname = self.raw_filename
+        fname = self.raw_filename or ''
         fname = normalize('NFKD', fname)
         fname = fname.encode('ASCII', 'ignore').decode('ASCII')
         fname = os.path.basename(fname.replace('\\', os.path.sep))
@@ -3504,14 +5065,81 @@ class FileUpload:
         fname = re.sub(r'[-\s]+', '-', fname).strip('.-')
         return fname[:255] or 'empty'
 
+    _spooled = False  # True when self.file is a parser temp file we may link
+
+    def _kernel_copy(self, fp, offset):
+        """Copy self.file[offset:] into fp with copy_file_range() or sendfile().
+        Returns the number of bytes copied; 0 means use the Python loop."""
+        try:
+            src, dst = self.file.fileno(), fp.fileno()
+            if not fp.seekable():
+                return 0
+            fp.flush()
+            pos = fp.tell()
+            remaining = os.fstat(src).st_size - offset
+        except (AttributeError, ValueError, OSError):
+            return 0
+        copied = 0
+        for method in ('copy_file_range', 'sendfile'):
+            if not hasattr(os, method):
+                continue
+            try:
+                while copied < remaining:
+                    if method == 'sendfile':
+                        n = os.sendfile(dst, src, offset + copied, remaining - copied)
+                    else:
+                        n = os.copy_file_range(src, dst, remaining - copied,
+                                               offset + copied)
+                    if not n:
+                        break
+                    copied += n
+            except OSError:
+                pass  # unsupported for this fd pair; try the next method
+            if copied:
+                break
+        fp.seek(pos + copied)  # resync fp's buffered position with the fd
+        return copied
+
     def _copy_file(self, fp, chunk_size=2 ** 16):
-        read, write, offset = self.file.read, fp.write, self.file.tell()
+        offset = self.file.tell()
+        copied = self._kernel_copy(fp, offset)
+        if copied:
+            self.file.seek(offset + copied)
+        read, write = self.file.read, fp.write
         while 1:
             buf = read(chunk_size)
             if not buf: break
             write(buf)
         self.file.seek(offset)
 
+    def _link(self, destination, overwrite):
+        """Hard-link the spooled temp file to destination. No data is copied.
+        Returns False when linking isn't possible (other filesystem, etc.)."""
+        umask = _current_umask()
+        if umask is None:  # can't give the link open()'s mode; copy instead
+            return False
+        try:
+            if self.file.tell() != 0:
+                return False
+            self.file.flush()
+            if overwrite:
+                tmp = '%s.%s.tmp' % (destination, uuid.uuid4().hex)
+                os.link(self.file.name, tmp)
+                try:
+                    os.replace(tmp, destination)
+                except OSError:
+                    os.unlink(tmp)
+                    raise
+            else:
+                os.link(self.file.name, destination)
+        except FileExistsError:
+            raise IOError('File exists.')
+        except (AttributeError, ValueError, OSError):
+            return False
+        # Temp files are 0600; give the result the mode open() would have.
+        os.chmod(destination, 0o666 & ~umask)
+        return True
+
     def validate_content_type(self, allowed_types):
         """Raise 415 if Content-Type isn't in *allowed_types*.
         Checks the header only. For real security, also sniff the magic bytes."""
@@ -3534,6 +5162,9 @@ class FileUpload:
         if isinstance(destination, str):
             if os.path.isdir(destination):
                 destination = os.path.join(destination, self.filename)
+            if self._spooled and self._link(destination, overwrite):
+                self._spooled = False  # link once; later saves get their own inode
+                return
             try:
                 fp = open(destination, 'wb' if overwrite else 'xb')
             except FileExistsError:
@@ -3543,6 +5174,50 @@ class FileUpload:
         else:
             self._copy_file(destination, chunk_size)
 
+# A multipart part read straight from the request stream by request.iter_parts().
+# Single pass: iterate it, read() it or save() it, but only once.
+class StreamingPart(FileUpload):
+    def __init__(self, events, headerlist, charset='utf8'):
+        meta = _MultipartPart(charset=charset)
+        meta.write_headers(headerlist)
+        super(StreamingPart, self).__init__(None, meta.name, meta.filename,
+                                            headerlist)
+        self.charset = meta.charset
+        self.size = 0
+        self._limit = meta.content_length
+        self._events = events
+        self._done = False
+
+    def __iter__(self):
+        if self._done:
+            return
+        for event, data in self._events:
+            if event != "body":
+                break
+            self.size += len(data)
+            if self._limit > 0 and self.size > self._limit:
+                raise MultipartError("Size of body exceeds Content-Length header.")
+            yield data
+        self._done = True
+
+    iter_chunks = __iter__
+
+    def read(self):
+        return b''.join(self)
+
+    @cached_property
+    def value(self):
+        return str(self.read(), self.charset)
+
+    def _drain(self):
+        for _ in self:
+            pass
+
+    def _copy_file(self, fp, chunk_size=2 ** 16):
+        write = fp.write
+        for chunk in self:
+            write(chunk)
+
 def pretty_error_page(exception, traceback_str=None):
     if traceback_str is None:
         traceback_str = format_exc()
@@ -3636,13 +5311,86 @@ def _rangeiter(fp, offset, limit, bufsize=1024 * 1024):
         limit -= len(part)
         yield part
 
+_precompressed_suffixes = (('br', '.br'), ('zstd', '.zst'), ('gzip', '.gz'))
+
+# Picks a precompressed sibling (app.js.br, app.js.gz) the client accepts.
+# Returns (path, encoding, varies); sidecars older than the file are ignored.
+def _precompressed_sidecar(filename, accept):
+    mtime = os.stat(filename).st_mtime
+    available = {}
+    for encoding, suffix in _precompressed_suffixes:
+        try:
+            if os.stat(filename + suffix).st_mtime >= mtime:
+                available[encoding] = filename + suffix
+        except OSError:
+            pass
+    if not available:
+        return filename, None, False
+    encoding = _negotiate_encoding(accept, available) if accept else None
+    if encoding is None:
+        return filename, None, True
+    return available[encoding], encoding, True
+
+# Build step: writes .br/.gz (/.zst) siblings for compressible files under root
+def precompress_static(root, encodings=('br', 'gzip'), level=None, min_size=256,
+                       extensions=('.html', '.htm', '.css', '.js', '.mjs',
+                                   '.json', '.map', '.svg', '.txt', '.xml',
+                                   '.wasm')):
+    """ Compress every matching file under ``root`` once, for
+        ``static_file`` to serve. Missing codecs (brotli, zstandard) are
+        skipped, up-to-date sidecars are kept, and sidecars that would not
+        be smaller are not written. Returns the paths written. """
+    suffixes = dict(_precompressed_suffixes)
+    unsupported = [name for name in encodings if name not in suffixes]
+    if unsupported:
+        raise ValueError("Cannot precompress as %s (supported: %s)"
+                         % (', '.join(unsupported), ', '.join(suffixes)))
+    best = {'br': 11, 'zstd': 19, 'gzip': 9}
+    codecs = {}
+    for name in encodings:
+        try:
+            codecs[name] = _compression_codecs[name]()
+        except ImportError:
+            pass
+    written = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if not name.lower().endswith(extensions):
+                continue
+            path = os.path.join(dirpath, name)
+            stats = os.stat(path)
+            if stats.st_size < min_size:
+                continue
+            body = None
+            for encoding, codec in codecs.items():
+                target = path + suffixes[encoding]
+                try:
+                    if os.stat(target).st_mtime >= stats.st_mtime:
+                        continue
+                except OSError:
+                    pass
+                if body is None:
+                    with open(path, 'rb') as fp:
+                        body = fp.read()
+                data = codec.compress(body, level or best[encoding])
+                if len(data) >= len(body):
+                    continue
+                tmp = '%s.%s.tmp' % (target, uuid.uuid4().hex)
+                with open(tmp, 'wb') as fp:
+                    fp.write(data)
+                os.utime(tmp, (stats.st_atime, stats.st_mtime))
+                os.replace(tmp, target)
+                written.append(target)
+    return written
+
 # Serve a file with ETag, Range, Last-Modified, and download support
 def static_file(filename, root,
                 mimetype=True,
                 download=False,
                 charset='UTF-8',
                 etag=None,
-                headers=None):
+                headers=None,
+                precompressed=False):
 
     root = os.path.join(os.path.realpath(root), '')
     filename = os.path.realpath(os.path.join(root, filename.strip('/\\')))
@@ -3654,12 +5402,22 @@ def static_file(filename, root,
         return HTTPError(403, "Access denied.")
     if not os.path.isfile(filename):
         return HTTPError(404, "File does not exist.")
-    
+
+    # Serve file.br / file.gz instead when present and accepted
+    path, content_encoding = filename, None
+    if precompressed:  # opt-in: up to 3 extra stat() calls per request
+        path, content_encoding, varies = _precompressed_sidecar(
+            filename, getenv('HTTP_ACCEPT_ENCODING'))
+        if varies:  # even without Accept-Encoding, for shared caches
+            headers['Vary'] = 'Accept-Encoding'
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+
     if request.method == 'HEAD':
         body = ''
     else:
         try:
-            body = open(filename, 'rb')
+            body = open(path, 'rb')
         except (IOError, OSError):
             return HTTPError(403, "Permission denied.")
 
@@ -3667,14 +5425,14 @@ def static_file(filename, root,
     try:
         fd_path = '/proc/self/fd/%d' % body.fileno()
         real = os.path.realpath(fd_path) if os.path.exists(fd_path) \
-               else os.path.realpath(filename)
+               else os.path.realpath(path)
     except (IOError, OSError, AttributeError):
-        real = os.path.realpath(filename)
+        real = os.path.realpath(path)
     if not real.startswith(root):
         _try_close(body)
         return HTTPError(403, "Access denied.")
 
-    stats = os.fstat(body.fileno()) if hasattr(body, 'fileno') else os.stat(filename)
+    stats = os.fstat(body.fileno()) if hasattr(body, 'fileno') else os.stat(path)
 
     if mimetype is True:
         name = download if isinstance(download, str) else filename
@@ -3705,8 +5463,10 @@ def static_file(filename, root,
 
     if etag is None:
         etag = '%d:%d:%d:%d:%s' % (stats.st_dev, stats.st_ino, stats.st_mtime,
-                                   clen, filename)
+                                   clen, path)
         etag = hashlib.sha256(tob(etag)).hexdigest()
+    elif etag and content_encoding:
+        etag = '%s-%s' % (etag, content_encoding)  # one tag per representation
 
     if etag:
         headers['ETag'] = etag
@@ -3834,6 +5594,72 @@ def _parse_qsl(qs, encoding="utf8", max_fields=1000):
         r.append((key, value))
     return r
 
+_cookie_escape = re.compile(r'\\(?:([0-3][0-7]{2})|(.))')
+
+def _cookie_value(value):
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] == '"':
+        value = _cookie_escape.sub(
+            lambda m: chr(int(m.group(1), 8)) if m.group(1) else m.group(2),
+            value[1:-1])
+    return value
+
+# Recently seen Cookie headers -> {name: value}. Clients resend the same header.
+_cookie_cache = OrderedDict()
+_cookie_cache_max = 256
+_cookie_cache_max_header = 8192
+
+def _parse_cookies(header):
+    """ Parse a Cookie header (RFC 6265 ``name=value; ...``) into a dict.
+        The last duplicate wins. The result is shared; copy before mutating. """
+    try:
+        cookies = _cookie_cache[header]
+        _cookie_cache.move_to_end(header)
+        return cookies
+    except KeyError:
+        pass
+    cookies = {}
+    for pair in header.split(';'):
+        name, sep, value = pair.partition('=')
+        name = name.strip()
+        if sep and name:
+            cookies[name] = _cookie_value(value)
+    if len(header) <= _cookie_cache_max_header:
+        _cookie_cache[header] = cookies
+        while len(_cookie_cache) > _cookie_cache_max:
+            try:
+                _cookie_cache.popitem(last=False)
+            except KeyError:
+                break
+    return cookies
+
+def _find_cookie(header, name):
+    """ Value of one cookie without parsing the others. Agrees with
+        _parse_cookies(header).get(name). """
+    cookies = _cookie_cache.get(header)
+    if cookies is not None:
+        return cookies.get(name)
+    if not name or name != name.strip() or ';' in name or '=' in name:
+        return None
+    end, size = len(header), len(name)
+    while True:
+        i = header.rfind(name, 0, end)
+        if i < 0:
+            return None
+        end = i + size - 1
+        start = i
+        while start and header[start - 1] in ' \t':
+            start -= 1
+        if start and header[start - 1] != ';':
+            continue
+        j = i + size
+        while j < len(header) and header[j] in ' \t':
+            j += 1
+        if j == len(header) or header[j] != '=':
+            continue
+        stop = header.find(';', j + 1)
+        return _cookie_value(header[j + 1:stop if stop >= 0 else None])
+
 # Timing-safe string comparison (prevents timing attacks on signatures)
 def _lscmp(a, b):
     try:
@@ -3841,6 +5667,86 @@ def _lscmp(a, b):
     except TypeError:
         return False
 
+# Signs and verifies cookie values. Same '!sig?msg' format as set_cookie(secret=...)
+class CookieCodec:
+    """ Encode/verify signed cookies for one secret. The HMAC key schedule
+        is computed once and copied per message. Recent results are
+        memoized: verifying the same session cookie again is a dict lookup. """
+
+    def __init__(self, secret, digestmod=hashlib.sha256, cache_size=1024):
+        self._mac = hmac.new(tob(secret), digestmod=digestmod)
+        self.digestmod = digestmod
+        self.cache_size = cache_size
+        self._verified = OrderedDict()  # raw cookie value -> (name, value)
+        self._signed = OrderedDict()    # (name, value) -> raw cookie value
+
+    def _recall(self, cache, key):
+        value = cache.get(key)
+        if value is not None:
+            try:
+                cache.move_to_end(key)
+            except KeyError:  # evicted by another thread
+                pass
+        return value
+
+    def _remember(self, cache, key, value):
+        if self.cache_size > 0:
+            cache[key] = value
+            while len(cache) > self.cache_size:
+                try:
+                    cache.popitem(last=False)
+                except KeyError:
+                    break
+
+    def _sign(self, msg):
+        mac = self._mac.copy()
+        mac.update(msg)
+        return base64.b64encode(mac.digest())
+
+    def encode(self, name, value):
+        """ Return the signed cookie value for ``name=value``. """
+        key = (name, value)
+        raw = self._recall(self._signed, key)
+        if raw is None:
+            msg = base64.b64encode(tob(json_dumps([name, value])))
+            raw = touni(b'!' + self._sign(msg) + b'?' + msg)
+            self._remember(self._signed, key, raw)
+        return raw
+
+    def decode(self, name, raw, default=None):
+        """ Return the value signed into ``raw`` for cookie ``name``, or
+            ``default`` if it is unsigned, tampered or was signed for a
+            different cookie name. """
+        hit = self._recall(self._verified, raw)
+        if hit is not None:
+            return hit[1] if hit[0] == name else default
+        if not raw or not raw.startswith('!') or '?' not in raw:
+            return default
+        sig, msg = map(tob, raw[1:].split('?', 1))
+        if not _lscmp(sig, self._sign(msg)):
+            return default
+        try:
+            dst = json_loads(base64.b64decode(msg))
+        except (ValueError, TypeError):
+            return default
+        if not (isinstance(dst, list) and len(dst) == 2):
+            return default
+        self._remember(self._verified, raw, (dst[0], dst[1]))
+        return dst[1] if dst[0] == name else default
+
+_cookie_codecs = {}
+
+def _cookie_codec(secret, digestmod):
+    if isinstance(secret, CookieCodec):
+        return secret
+    key = (secret, digestmod)
+    codec = _cookie_codecs.get(key)
+    if codec is None:
+        if len(_cookie_codecs) >= 16:  # rotating secrets; don't grow forever
+            _cookie_codecs.clear()
+        codec = _cookie_codecs[key] = CookieCodec(secret, digestmod)
+    return codec
+
 def cookie_encode(data, key, digestmod=None):
     depr(0, 0, "cookie_encode() will be removed soon.",
                 "Do not use this API directly.")
@@ -4074,8 +5980,12 @@ class MultipartError(HTTPError):
     def __init__(self, msg):
         HTTPError.__init__(self, 400, "MultipartError: " + msg)
 
-# Reads multipart streams part by part, enforcing memory and disk limits
+# Reads multipart streams part by part, enforcing memory and disk limits.
+# Scans for the CRLF--boundary delimiter across buffer edges rather than
+# splitting on every CRLF, so part bodies are written in large slices.
 class _MultipartParser:
+    header_limit = 2 ** 16  # max bytes in one part's header section
+
     def __init__(
         self,
         stream,
@@ -4102,89 +6012,143 @@ class _MultipartParser:
         if self.buffer_size - 6 < len(boundary):
             raise MultipartError("Boundary does not fit into buffer_size.")
 
-    def _lineiter(self):
-        read = self.stream.read
-        maxread, maxbuf = self.content_length, self.buffer_size
-        partial = b""
+    def _parse_header_block(self, block):
+        headerlist = []
+        for line in str(block, self.charset).split("\r\n"):
+            if line[:1] in (" ", "\t") and headerlist:
+                name, value = headerlist.pop()
+                headerlist.append((name, value + line.strip()))
+            elif ":" not in line:
+                raise MultipartError("Syntax error in header: No colon.")
+            else:
+                name, value = line.split(":", 1)
+                headerlist.append((name.strip(), value.strip()))
+        return headerlist
+
+    def _iter_events(self):
+        """Yield ('headers', headerlist), ('body', bytes) and ('end', None)
+        events for each part. Body slices are at most ~buffer_size bytes."""
+        read, bufsize = getattr(self.stream, 'read', None), self.buffer_size
+        maxread = self.content_length
+        if read is None:  # an iterator of byte chunks, e.g. request._iter_body
+            chunks = iter(self.stream)
+            read = lambda size: next(chunks, b"")
+            maxread = -1
+        delim = b"\r\n--" + tob(self.boundary)
+        dlen = len(delim)
+        # A leading CRLF lets a boundary on the very first line match delim.
+        buf, scan, skip = b"\r\n", 0, 0
+        in_part = eof = False
 
         while True:
-            chunk = read(maxbuf if maxread < 0 else min(maxbuf, maxread))
-            maxread -= len(chunk)
-            if not chunk:
-                if partial:
-                    yield partial, b''
-                break
+            i = buf.find(delim, scan)
+            kind = None
+            if i >= 0:
+                # Delimiter line: boundary, optional "--", padding, CRLF.
+                j = k = i + dlen
+                if buf[j:j + 2] == b"--":
+                    k += 2
+                while buf[k:k + 1] in (b" ", b"\t"):
+                    k += 1
+                if buf[k:k + 2] == b"\r\n" or (eof and k == len(buf)):
+                    kind = "last" if k > j and buf[j:j + 2] == b"--" else "next"
+                    j = k + 2
+                elif k + 2 <= len(buf) or eof:
+                    # Boundary text followed by anything else is plain data.
+                    scan = i + 1
+                    continue
+
+            if kind is None:
+                # Flush everything that can't be the start of a delimiter.
+                safe = i if i >= 0 else max(len(buf) - dlen + 1, 0)
+                if in_part and safe > skip:
+                    yield "body", buf[skip:safe]
+                skip -= min(skip, safe)
+                buf, scan = buf[safe:], 0
+                if eof:
+                    if in_part:
+                        raise MultipartError("Unexpected end of multipart stream.")
+                    raise MultipartError("Stream does not contain boundary")
+                if len(buf) > bufsize:
+                    raise MultipartError("Boundary line too long.")
+                chunk = read(bufsize if maxread < 0 else min(bufsize, maxread))
+                maxread -= len(chunk)
+                buf += chunk
+                eof = not chunk
+                continue
 
-            if partial:
-                chunk = partial + chunk
+            if in_part:
+                if i > skip:
+                    yield "body", buf[skip:i]
+                yield "end", None
+            elif kind == "last":
+                if buf[j:] or (not eof and maxread and read(1)):
+                    raise MultipartError("Found data after empty multipart stream")
 
-            scanpos = 0
+            if kind == "last":
+                return
+
+            # Header section: ends at the first empty line. Its CRLF stays in
+            # buf so a boundary right after the headers is still a delimiter.
+            buf = buf[j:]
             while True:
-                i = chunk.find(b'\r\n', scanpos)
-                if i >= 0:
-                    yield chunk[scanpos:i], b'\r\n'
-                    scanpos = i + 2
-                else:
-                    partial = chunk[scanpos:] if scanpos else chunk
+                if buf[:2] == b"\r\n":
+                    block = None
                     break
-
-            if len(partial) > maxbuf:
-                yield partial[:-1], b""
-                partial = partial[-1:]
+                h = buf.find(b"\r\n\r\n")
+                if h >= 0:
+                    block, buf = buf[:h], buf[h + 2:]
+                    break
+                if len(buf) > self.header_limit:
+                    raise MultipartError("Header section too large.")
+                chunk = read(bufsize if maxread < 0 else min(bufsize, maxread))
+                if not chunk:
+                    raise MultipartError("Unexpected end of multipart stream.")
+                maxread -= len(chunk)
+                buf += chunk
+            yield "headers", self._parse_header_block(block) if block else []
+            in_part, scan, skip = True, 0, 2
 
     def parse(self):
-
-        lines, line = self._lineiter(), ""
-        separator = b"--" + tob(self.boundary)
-        terminator = separator + b"--"
         mem_used, disk_used = 0, 0
-        is_tail = False
-        for line, nl in lines:
-            if line in (separator, terminator):
-                break
-        else:
-            raise MultipartError("Stream does not contain boundary")
-
-        if line == terminator:
-            for _ in lines:
-                raise MultipartError("Found data after empty multipart stream")
-            return
-
         part_options = {
             "buffer_size": self.buffer_size,
             "memfile_limit": self.memfile_limit,
             "charset": self.charset,
         }
-        part = _MultipartPart(**part_options)
-
-        for line, nl in lines:
-            if not is_tail and (line == separator or line == terminator):
-                part.finish()
-                if part.is_buffered():
-                    mem_used += part.size
-                else:
-                    disk_used += part.size
-                yield part
-                if line == terminator:
-                    break
-                part = _MultipartPart(**part_options)
-            else:
-                is_tail = not nl
-                try:
-                    part.feed(line, nl)
+        part = None
+        try:
+            for event, data in self._iter_events():
+                if event == "body":
+                    part.write_body(data)
                     if part.is_buffered():
                         if part.size + mem_used > self.mem_limit:
                             raise MultipartError("Memory limit reached.")
                     elif part.size + disk_used > self.disk_limit:
                         raise MultipartError("Disk limit reached.")
-                except MultipartError:
-                    part.close()
-                    raise
-        else:
-            part.close()
+                elif event == "headers":
+                    part = _MultipartPart(**part_options)
+                    part.write_headers(data)
+                else:
+                    part.finish()
+                    if part.is_buffered():
+                        mem_used += part.size
+                    else:
+                        disk_used += part.size
+                    done, part = part, None
+                    yield done
+        except MultipartError:
+            if part is not None:
+                part.close()
+            raise
 
-        if line != terminator:
-            raise MultipartError("Unexpected end of multipart stream.")
+    def iter_parts(self):
+        events = self._iter_events()
+        for event, data in events:
+            if event == "headers":
+                part = StreamingPart(events, data, self.charset)
+                yield part
+                part._drain()
 
 # One part from a multipart stream. Keeps small stuff in memory, spills large to disk.
 class _MultipartPart:
@@ -4193,7 +6157,6 @@ class _MultipartPart:
         self.headers = None
         self.file = False
         self.size = 0
-        self._buf = b""
         self.disposition = None
         self.name = None
         self.filename = None
@@ -4202,50 +6165,20 @@ class _MultipartPart:
         self.memfile_limit = memfile_limit
         self.buffer_size = buffer_size
 
-    def feed(self, line, nl=""):
-        if self.file:
-            return self.write_body(line, nl)
-        return self.write_header(line, nl)
-
-    def write_header(self, line, nl):
-        line = str(line, self.charset)
+    def write_headers(self, headerlist):
+        self.headerlist = headerlist
+        self.finish_header()
 
-        if not nl:
-            raise MultipartError("Unexpected end of line in header.")
-
-        if not line.strip():
-            self.finish_header()
-        elif line[0] in " \t" and self.headerlist:
-            name, value = self.headerlist.pop()
-            self.headerlist.append((name, value + line.strip()))
-        else:
-            if ":" not in line:
-                raise MultipartError("Syntax error in header: No colon.")
-
-            name, value = line.split(":", 1)
-            self.headerlist.append((name.strip(), value.strip()))
-
-    def write_body(self, line, nl):
-        if not line and not nl:
-            return
-
-        self.size += len(line) + len(self._buf)
-        self.file.write(self._buf + line)
-        self._buf = nl
+    def write_body(self, data):
+        self.size += len(data)
+        self.file.write(data)
 
         if self.content_length > 0 and self.size > self.content_length:
             raise MultipartError("Size of body exceeds Content-Length header.")
 
         if self.size > self.memfile_limit and isinstance(self.file, BytesIO):
             self.file, old = NamedTemporaryFile(mode="w+b"), self.file
-            old.seek(0)
-
-            copied, maxcopy, chunksize = 0, self.size, self.buffer_size
-            read, write = old.read, self.file.write
-            while copied < maxcopy:
-                chunk = read(min(chunksize, maxcopy - copied))
-                write(chunk)
-                copied += len(chunk)
+            self.file.write(old.getvalue())
 
     def finish_header(self):
         self.file = BytesIO()
@@ -5478,6 +7411,10 @@ def _main(argv):
         webbrowser.open('https://lcore.lusansapkota.com.np')
         print("Opening documentation in browser...")
         sys.exit(0)
+    if args.precompress:
+        written = precompress_static(args.precompress)
+        print("Precompressed %d file(s) in %s" % (len(written), args.precompress))
+        sys.exit(0)
     if not args.app:
         _cli_error("No application entry point specified.")
 
@@ -7,7 +7,15 @@ from helpers import run_request
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from lcore import Lcore, request, response
+from http.cookies import SimpleCookie
+
+import lcore
+import base64
+import hashlib
+import hmac
+import json
+
+from lcore import Lcore, request, response, BaseRequest, CookieCodec
 
 
 class TestSetCookie(unittest.TestCase):
@@ -115,6 +123,71 @@ class TestSignedCookie(unittest.TestCase):
         self.assertEqual(body, b'invalid')
 
 
+class TestCookieCodec(unittest.TestCase):
+    def setUp(self):
+        self.codec = CookieCodec('s3cret')
+
+    def legacy_encode(self, name, value, secret='s3cret', digestmod=hashlib.sha256):
+        msg = base64.b64encode(json.dumps([name, value]).encode())
+        sig = base64.b64encode(hmac.new(secret.encode(), msg, digestmod).digest())
+        return (b'!' + sig + b'?' + msg).decode()
+
+    def test_wire_format_unchanged(self):
+        raw = self.codec.encode('sid', 'user-1')
+        self.assertEqual(self.codec.decode('sid', self.legacy_encode('sid', 'user-1')),
+                         'user-1')
+        self.assertEqual(self.codec.decode('sid', raw), 'user-1')
+
+    def test_rejects_tampering_and_wrong_name(self):
+        raw = self.codec.encode('sid', 'user-1')
+        self.assertEqual(self.codec.decode('other', raw, 'no'), 'no')
+        self.assertEqual(self.codec.decode('other', raw, 'no'), 'no')  # cached
+        self.assertIsNone(self.codec.decode('sid', raw[:-2] + 'AA'))
+        self.assertIsNone(self.codec.decode('sid', 'plain'))
+        self.assertIsNone(self.codec.decode('sid', None))
+        self.assertIsNone(CookieCodec('other').decode('sid', raw))
+        msg = base64.b64encode(b'{"sid": 1}')
+        odd = '!%s?%s' % (self.codec._sign(msg).decode(), msg.decode())
+        self.assertIsNone(self.codec.decode('sid', odd))
+
+    def test_results_are_cached_and_bounded(self):
+        codec = CookieCodec('s3cret', cache_size=2)
+        raws = [codec.encode('sid', str(i)) for i in range(3)]
+        self.assertIs(codec.encode('sid', '2'), raws[2])
+        self.assertEqual(len(codec._signed), 2)
+        for i, raw in enumerate(raws):
+            self.assertEqual(codec.decode('sid', raw), str(i))
+        self.assertEqual(list(codec._verified), raws[1:])
+        calls = []
+        codec._sign = lambda msg: calls.append(msg)
+        self.assertEqual(codec.decode('sid', raws[2]), '2')
+        self.assertEqual(calls, [])
+
+    def test_configurable_digest(self):
+        codec = CookieCodec('s3cret', digestmod=hashlib.sha512)
+        raw = codec.encode('sid', 'v')
+        self.assertEqual(raw, self.legacy_encode('sid', 'v', digestmod=hashlib.sha512))
+        self.assertIsNone(self.codec.decode('sid', raw))
+
+    def test_codec_as_secret(self):
+        app = Lcore()
+        codec = CookieCodec('k', digestmod='sha384')
+
+        @app.route('/set')
+        def set_cookie():
+            response.set_cookie('sid', 42, secret=codec)
+            return 'ok'
+
+        @app.route('/get')
+        def get_cookie():
+            return request.get_cookie('sid', 'none', secret=codec)
+
+        _, headers, _ = run_request(app, 'GET', '/set')
+        cookie = headers['Set-Cookie'].split(';')[0]
+        _, _, body = run_request(app, 'GET', '/get', headers={'Cookie': cookie})
+        self.assertEqual(body, b'42')
+
+
 class TestDeleteCookie(unittest.TestCase):
     def setUp(self):
         self.app = Lcore()
@@ -131,5 +204,64 @@ class TestDeleteCookie(unittest.TestCase):
         self.assertIn('Max-Age', set_cookie)
 
 
+class TestCookieParser(unittest.TestCase):
+    def setUp(self):
+        lcore._cookie_cache.clear()
+        self.addCleanup(lcore._cookie_cache.clear)
+
+    def req(self, header):
+        return BaseRequest({'HTTP_COOKIE': header})
+
+    def test_pairs_and_whitespace(self):
+        cookies = self.req(' a=1 ;b = two;  c=; d=x=y').cookies
+        self.assertEqual(dict(cookies), {'a': '1', 'b': 'two', 'c': '', 'd': 'x=y'})
+
+    def test_last_duplicate_wins(self):
+        req = self.req('a=1; b=2; a=3')
+        self.assertEqual(req.get_cookie('a'), '3')
+        self.assertEqual(list(req.cookies), ['a', 'b'])
+        self.assertEqual(req.cookies['a'], '3')
+
+    def test_quoted_values_match_simplecookie(self):
+        jar = SimpleCookie()
+        jar['q'] = 'semi;colon "quote" back\\slash, comma'
+        header = jar['q'].OutputString()
+        self.assertEqual(self.req(header).get_cookie('q'), jar['q'].value)
+        self.assertEqual(self.req(header).cookies['q'], jar['q'].value)
+
+    def test_malformed_pairs_are_skipped(self):
+        req = self.req('flag; =novalue; path=/; ok=1')
+        self.assertEqual(dict(req.cookies), {'path': '/', 'ok': '1'})
+
+    def test_single_lookup_matches_full_parse(self):
+        header = 'xa=1; a b=2; aa=3;a=4 ; ba=5'
+        names = ('a', 'aa', 'a b', 'b', 'ba', 'xa', 'x', '')
+        found = [lcore._find_cookie(header, n) for n in names]
+        parsed = lcore._parse_cookies(header)
+        self.assertEqual(found, [parsed.get(n) for n in names])
+        self.assertEqual(found[:4], ['4', '3', '2', None])
+
+    def test_get_cookie_does_not_parse_whole_header(self):
+        req = self.req('a=1; b=2')
+        self.assertEqual(req.get_cookie('b'), '2')
+        self.assertNotIn('lcore.request.cookies', req.environ)
+        self.assertEqual(len(lcore._cookie_cache), 0)
+
+    def test_parsed_headers_are_cached(self):
+        header = 'sid=abc; theme=dark'
+        self.req(header).cookies['theme'] = 'light'
+        self.assertIn(header, lcore._cookie_cache)
+        self.assertEqual(self.req(header).cookies['theme'], 'dark')
+        self.assertEqual(self.req(header).get_cookie('theme'), 'dark')
+
+    def test_cache_is_bounded(self):
+        for i in range(lcore._cookie_cache_max + 10):
+            self.req('n=%d' % i).cookies
+        self.assertEqual(len(lcore._cookie_cache), lcore._cookie_cache_max)
+        self.assertNotIn('n=0', lcore._cookie_cache)
+        self.req('big=' + 'x' * lcore._cookie_cache_max_header).cookies
+        self.assertEqual(len(lcore._cookie_cache), lcore._cookie_cache_max)
+
+
 if __name__ == '__main__':
     unittest.main()
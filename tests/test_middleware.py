@@ -1,5 +1,6 @@
 """Tests for Lcore middleware engine."""
 
+import threading
 import unittest
 import sys, os
 
@@ -561,6 +562,229 @@ class TestMiddlewarePipelineDirectly(unittest.TestCase):
         self.assertIs(post_chain[1], high)
 
 
+class TestCompiledChains(unittest.TestCase):
+    """Chains are folded into closures once and reused across requests."""
+
+    def setUp(self):
+        self.app = Lcore()
+        self.log = []
+
+        class Tag(Middleware):
+            def __init__(mw, tag):
+                mw.name = tag
+                mw.tag = tag
+
+            def __call__(mw, c, next_handler):
+                self.log.append(mw.tag)
+                return next_handler(c)
+
+        self.Tag = Tag
+
+    def test_shared_per_membership(self):
+        self.app.use(self.Tag('all'))
+        self.app.use(self.Tag('api'), routes='^/api')
+        for path in ('/api/a', '/api/b', '/home'):
+            self.app.route(path)(lambda: 'ok')
+            run_request(self.app, 'GET', path)
+        pipeline = self.app.middleware
+        a, b, home = (pipeline._get_chains(p)[1] for p in ('/api/a', '/api/b', '/home'))
+        self.assertIs(a, b)
+        self.assertIs(a._links, b._links)
+        self.assertEqual([m.tag for m in home], ['all'])
+        self.assertEqual(self.log, ['all', 'api', 'all', 'api', 'all'])
+
+    def test_retry_reenters_inner_chain(self):
+        class Retry(Middleware):
+            order = 1
+
+            def __call__(mw, c, next_handler):
+                next_handler(c)
+                return next_handler(c)
+
+        self.app.use(Retry())
+        self.app.use(self.Tag('inner'))
+        calls = []
+
+        @self.app.route('/')
+        def index():
+            calls.append(1)
+            return 'n=%d' % len(calls)
+
+        _, _, body = run_request(self.app, 'GET', '/')
+        self.assertEqual(body, b'n=2')
+        self.assertEqual(self.log, ['inner', 'inner'])
+
+    def test_skiplist_and_async_middleware(self):
+        class Async(Middleware):
+            async def __call__(mw, c, next_handler):
+                return next_handler(c) + '!'
+
+        self.app.use(self.Tag('audit'))
+        self.app.use(Async())
+        self.app.route('/a', skip=['audit'])(lambda: 'a')
+        for _ in range(2):
+            _, _, body = run_request(self.app, 'GET', '/a')
+            self.assertEqual(body, b'a!')
+        self.assertEqual(self.log, [])
+        post = self.app.middleware._frozen.routes[self.app.routes[0]]
+        self.assertEqual([type(m).__name__ for m in post], ['Async'])
+        self.assertIs(self.app.middleware._get_chains('/a', ['audit'])[1],
+                      self.app.middleware._get_chains('/a', ['audit'])[1])
+
+    def test_next_handler_on_another_thread(self):
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(1)
+        self.addCleanup(pool.shutdown)
+
+        class Offload(Middleware):
+            def __call__(mw, c, next_handler):
+                return pool.submit(next_handler, c).result()
+
+        self.app.use(Offload())
+        self.app.use(self.Tag('inner'))
+        self.app.route('/')(lambda: 'done')
+        status, _, body = run_request(self.app, 'GET', '/')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, b'done')
+        self.assertEqual(self.log, ['inner'])
+
+    def test_nested_pipeline_restores_handler(self):
+        inner = MiddlewarePipeline()
+        inner.add(self.Tag('inner'))
+
+        class Nested(Middleware):
+            def __call__(mw, c, next_handler):
+                self.log.append(inner.execute(c, lambda: 'sub'))
+                return next_handler(c)
+
+        self.app.use(Nested())
+        self.app.route('/')(lambda: 'outer')
+        _, _, body = run_request(self.app, 'GET', '/')
+        self.assertEqual(body, b'outer')
+        self.assertEqual(self.log, ['inner', 'sub'])
+
+
+class TestRouteKeyedChains(unittest.TestCase):
+    """Post chains are resolved once per route, not per request path."""
+
+    def setUp(self):
+        self.app = Lcore()
+        self.log = []
+        log = self.log
+
+        class Tag(Middleware):
+            def __init__(self, tag, phase='post'):
+                self.tag = tag
+                self.phase = phase
+
+            def __call__(self, c, next_handler):
+                log.append(self.tag)
+                return next_handler(c)
+
+        self.Tag = Tag
+
+    def test_dynamic_routes_resolved_once(self):
+        self.app.use(self.Tag('api'), routes='^/api/')
+        self.app.use(self.Tag('admin'), routes='^/admin')
+        self.app.route('/api/users/<id>')(lambda id: id)
+        for i in range(50):
+            _, _, body = run_request(self.app, 'GET', '/api/users/%d' % i)
+            self.assertEqual(body, str(i).encode())
+        self.assertEqual(self.log, ['api'] * 50)
+        pipeline = self.app.middleware
+        self.assertEqual(getattr(pipeline._local, 'paths', {}), {})
+        self.assertEqual([m.tag for m in pipeline._frozen.routes[self.app.routes[0]]],
+                         ['api'])
+
+    def test_wildcard_dependent_pattern_falls_back_to_path(self):
+        self.app.use(self.Tag('numeric'), routes=r'^/users/\d+$')
+        self.app.route('/users/<id>')(lambda id: id)
+        for path in ('/users/12', '/users/abc', '/users/7'):
+            run_request(self.app, 'GET', path)
+        self.assertEqual(self.log, ['numeric', 'numeric'])
+        self.assertNotIn(self.app.routes[0], self.app.middleware._frozen.routes)
+
+    def test_scoped_pre_phase_uses_path(self):
+        self.app.use(self.Tag('pre-api', phase='pre'), routes='^/api')
+        self.app.use(self.Tag('post'))
+        self.app.route('/api/<name>')(lambda name: name)
+        self.app.route('/home')(lambda: 'home')
+        run_request(self.app, 'GET', '/api/x')
+        run_request(self.app, 'GET', '/home')
+        run_request(self.app, 'GET', '/api/missing/route')
+        self.assertEqual(self.log, ['pre-api', 'post', 'post', 'pre-api'])
+
+
+class TestFrozenPipeline(unittest.TestCase):
+    """Requests only read a snapshot that writers replace wholesale."""
+
+    def test_snapshot_is_immutable(self):
+        app = Lcore()
+        app.use(Middleware())
+        app.route('/')(lambda: 'ok')
+        run_request(app, 'GET', '/')
+        frozen = app.middleware._frozen
+        with self.assertRaises(AttributeError):
+            frozen.pre = None
+        with self.assertRaises(AttributeError):
+            frozen.post.run = None
+        run_request(app, 'GET', '/')
+        self.assertIs(app.middleware._frozen, frozen)
+
+    def test_routes_folded_in_once_per_batch(self):
+        app = Lcore()
+        app.use(Middleware())
+        frozen = app.middleware._frozen
+        for i in range(100):
+            app.route('/r%d' % i)(lambda: 'ok')
+        self.assertIs(app.middleware._frozen, frozen)
+        self.assertEqual(len(app.middleware._pending), 100)
+        run_request(app, 'GET', '/r42')
+        self.assertEqual(app.middleware._pending, [])
+        self.assertEqual(len(app.middleware._frozen.routes), 100)
+        app.route('/late')(lambda: 'late')
+        _, _, body = run_request(app, 'GET', '/late')
+        self.assertEqual(body, b'late')
+        self.assertIn(app.routes[-1], app.middleware._frozen.routes)
+
+    def test_concurrent_requests_and_writers(self):
+        app = Lcore()
+
+        class Tag(Middleware):
+            def __init__(self, tag, phase='post'):
+                self.tag, self.phase = tag, phase
+
+            def __call__(self, c, next_handler):
+                c.response.add_header('X-Tag', self.tag)
+                return next_handler(c)
+
+        app.use(Tag('pre', phase='pre'), routes='^/api')
+        app.use(Tag('num'), routes=r'^/api/\d+$')
+        app.route('/api/<name>')(lambda name: name)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(200):
+                    path = '/api/%d' % (n * 1000 + i) if i % 2 else '/api/x%d' % i
+                    _, headers, body = run_request(app, 'GET', path)
+                    self.assertEqual(body.decode(), path[5:])
+                    self.assertEqual(headers['X-Tag'], 'num' if i % 2 else 'pre')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        extra = Middleware()
+        for _ in range(20):
+            app.use(extra)
+            app.middleware.remove(extra)
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+
 class TestBaseMiddlewareClass(unittest.TestCase):
     """The base Middleware class provides sensible defaults."""
 
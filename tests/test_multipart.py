@@ -0,0 +1,377 @@
+"""Tests for the multipart/form-data parser."""
+
+import unittest
+import hashlib
+import shutil
+import tempfile
+import sys, os
+from io import BytesIO
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import run_request
+import lcore
+from lcore import Lcore, request, FileUpload, MultipartError, StreamingPart, \
+    _MultipartParser
+
+
+BOUNDARY = 'lcoreTestBoundary'
+
+
+def encode_multipart(fields=(), files=(), boundary=BOUNDARY):
+    """Build a multipart body from (name, value) fields and
+    (name, filename, bytes) files."""
+    out = []
+    for name, value in fields:
+        out.append(('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n'
+                    % (boundary, name)).encode() + value.encode() + b'\r\n')
+    for name, filename, data in files:
+        out.append(('--%s\r\nContent-Disposition: form-data; name="%s"; '
+                    'filename="%s"\r\nContent-Type: application/octet-stream'
+                    '\r\n\r\n' % (boundary, name, filename)).encode()
+                   + data + b'\r\n')
+    out.append(('--%s--\r\n' % boundary).encode())
+    return b''.join(out)
+
+
+def parse(body, boundary=BOUNDARY, **options):
+    parser = _MultipartParser(BytesIO(body), boundary, len(body), **options)
+    return [(p.name, p.filename, p.raw) for p in parser.parse()]
+
+
+class TestMultipartParser(unittest.TestCase):
+
+    def test_fields_and_files(self):
+        body = encode_multipart([('a', 'one'), ('b', 'two')],
+                                [('f', 'x.bin', b'\x00\x01\r\n\x02')])
+        self.assertEqual(parse(body), [
+            ('a', None, b'one'),
+            ('b', None, b'two'),
+            ('f', 'x.bin', b'\x00\x01\r\n\x02'),
+        ])
+
+    def test_boundary_split_across_reads(self):
+        data = b'x' * 50 + b'\r\n--lcoreTest' + b'y' * 40 + b'\r\n'
+        body = encode_multipart(files=[('f', 'a.txt', data)])
+        for size in (24, 25, 31, 64):
+            with self.subTest(buffer_size=size):
+                self.assertEqual(parse(body, buffer_size=size)[0][2], data)
+
+    def test_crlf_runs_preserved(self):
+        data = b'\r\n' * 100 + b'line\r\n\r\n'
+        body = encode_multipart(files=[('f', 'a.txt', data)])
+        self.assertEqual(parse(body, buffer_size=32)[0][2], data)
+
+    def test_boundary_at_line_start_after_headers(self):
+        body = (b'--lcoreTestBoundary\r\nContent-Disposition: form-data; '
+                b'name="a"\r\n\r\n--lcoreTestBoundary\r\nContent-Disposition: '
+                b'form-data; name="b"\r\n\r\nv\r\n--lcoreTestBoundary--\r\n')
+        self.assertEqual(parse(body), [('a', None, b''), ('b', None, b'v')])
+
+    def test_boundary_prefix_inside_body_is_data(self):
+        data = b'--lcoreTestBoundaryX\r\n--lcoreTestBoundary-- trailing'
+        body = encode_multipart(files=[('f', 'a.txt', b'\r\n' + data)])
+        self.assertEqual(parse(body)[0][2], b'\r\n' + data)
+
+    def test_preamble_and_epilogue_ignored(self):
+        body = b'preamble\r\n' + encode_multipart([('a', '1')]) + b'epilogue'
+        self.assertEqual(parse(body), [('a', None, b'1')])
+
+    def test_transport_padding_after_boundary(self):
+        body = (b'--lcoreTestBoundary  \r\nContent-Disposition: form-data; '
+                b'name="a"\r\n\r\n1\r\n--lcoreTestBoundary-- \t\r\n')
+        self.assertEqual(parse(body), [('a', None, b'1')])
+
+    def test_folded_header_lines(self):
+        body = (b'--lcoreTestBoundary\r\nContent-Disposition: form-data;\r\n'
+                b' name="folded"\r\n\r\nv\r\n--lcoreTestBoundary--\r\n')
+        self.assertEqual(parse(body), [('folded', None, b'v')])
+
+    def test_empty_stream(self):
+        self.assertEqual(parse(b'--lcoreTestBoundary--\r\n'), [])
+        with self.assertRaises(MultipartError):
+            parse(b'--lcoreTestBoundary--\r\nmore data')
+
+    def test_missing_boundary(self):
+        with self.assertRaises(MultipartError):
+            parse(b'no boundary anywhere\r\n')
+
+    def test_truncated_stream(self):
+        body = encode_multipart(files=[('f', 'a.txt', b'abc' * 100)])
+        for cut in (10, 80, len(body) - 4):
+            with self.subTest(cut=cut):
+                with self.assertRaises(MultipartError):
+                    parse(body[:cut])
+
+    def test_header_without_colon(self):
+        body = (b'--lcoreTestBoundary\r\nbroken header\r\n\r\nv\r\n'
+                b'--lcoreTestBoundary--\r\n')
+        with self.assertRaises(MultipartError):
+            parse(body)
+
+    def test_large_part_spills_to_disk(self):
+        data = os.urandom(300 * 1024)
+        body = encode_multipart(files=[('f', 'big.bin', data)])
+        parser = _MultipartParser(BytesIO(body), BOUNDARY, len(body),
+                                  memfile_limit=1024)
+        part = next(parser.parse())
+        self.assertFalse(part.is_buffered())
+        self.assertEqual(part.size, len(data))
+        self.assertEqual(part.raw, data)
+        part.close()
+
+    def test_memory_limit(self):
+        body = encode_multipart([('a', 'x' * 5000), ('b', 'y' * 5000)])
+        with self.assertRaises(MultipartError):
+            parse(body, mem_limit=8000, memfile_limit=8000)
+
+    def test_disk_limit(self):
+        body = encode_multipart(files=[('f', 'big.bin', b'z' * 50000)])
+        with self.assertRaises(MultipartError):
+            parse(body, disk_limit=20000, memfile_limit=1024)
+
+
+class TestMultipartRequest(unittest.TestCase):
+
+    def test_forms_and_files(self):
+        app = Lcore()
+        body = encode_multipart([('title', 'hello')],
+                                [('upload', 'notes.txt', b'line1\r\nline2')])
+
+        @app.post('/upload')
+        def upload():
+            f = request.files.get('upload')
+            self.assertIsInstance(f, FileUpload)
+            return '%s|%s|%s' % (request.forms.get('title'), f.filename,
+                                 f.file.read().decode())
+
+        status, _, out = run_request(
+            app, 'POST', '/upload', body=body,
+            content_type='multipart/form-data; boundary=' + BOUNDARY)
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(out, b'hello|notes.txt|line1\r\nline2')
+
+
+def spooled_upload(data):
+    """A FileUpload backed by a parser temp file, as request.files builds it."""
+    body = encode_multipart(files=[('f', 'data.bin', data)])
+    parser = _MultipartParser(BytesIO(body), BOUNDARY, len(body),
+                              memfile_limit=1024)
+    part = next(parser.parse())
+    upload = FileUpload(part.file, part.name, part.filename, part.headerlist)
+    upload._spooled = not part.is_buffered()
+    return upload
+
+
+class TestFileUploadSave(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.data = os.urandom(100 * 1024)
+        self.upload = spooled_upload(self.data)
+        self.addCleanup(self.upload.file.close)
+
+    def read(self, name):
+        with open(os.path.join(self.tmpdir, name), 'rb') as fp:
+            return fp.read()
+
+    def test_spooled_upload_is_linked(self):
+        self.assertTrue(self.upload._spooled)
+        self.upload.save(self.tmpdir)
+        dest = os.path.join(self.tmpdir, 'data.bin')
+        self.assertEqual(os.stat(dest).st_ino,
+                         os.fstat(self.upload.file.fileno()).st_ino)
+        self.assertEqual(os.stat(dest).st_mode & 0o777,
+                         0o666 & ~lcore._current_umask())
+        self.assertEqual(self.read('data.bin'), self.data)
+        self.assertEqual(self.upload.file.read(), self.data)
+
+    def test_second_save_is_a_copy(self):
+        first, second = (os.path.join(self.tmpdir, n) for n in ('a.bin', 'b.bin'))
+        self.upload.save(first)
+        self.upload.save(second)
+        self.assertNotEqual(os.stat(first).st_ino, os.stat(second).st_ino)
+        with open(first, 'ab') as fp:
+            fp.write(b'edit')
+        self.assertEqual(self.read('b.bin'), self.data)
+
+    def test_unknown_umask_copies_instead(self):
+        with mock.patch('lcore._current_umask', return_value=None):
+            self.upload.save(self.tmpdir)
+        dest = os.path.join(self.tmpdir, 'data.bin')
+        self.assertNotEqual(os.stat(dest).st_ino,
+                            os.fstat(self.upload.file.fileno()).st_ino)
+        self.assertEqual(self.read('data.bin'), self.data)
+        with mock.patch('builtins.open', side_effect=OSError), \
+                mock.patch('lcore.os.umask') as umask:
+            self.assertIsNone(lcore._current_umask())
+        umask.assert_not_called()
+
+    def test_link_respects_overwrite(self):
+        dest = os.path.join(self.tmpdir, 'out.bin')
+        with open(dest, 'wb') as fp:
+            fp.write(b'old')
+        with self.assertRaises(IOError):
+            self.upload.save(dest)
+        self.assertEqual(self.read('out.bin'), b'old')
+        self.upload.save(dest, overwrite=True)
+        self.assertEqual(self.read('out.bin'), self.data)
+        self.assertEqual(os.listdir(self.tmpdir), ['out.bin'])
+
+    def test_cross_device_falls_back_to_copy(self):
+        err = OSError(18, 'Invalid cross-device link')
+        with mock.patch('lcore.os.link', side_effect=err):
+            self.upload.save(self.tmpdir)
+        dest = os.path.join(self.tmpdir, 'data.bin')
+        self.assertNotEqual(os.stat(dest).st_ino,
+                            os.fstat(self.upload.file.fileno()).st_ino)
+        self.assertEqual(self.read('data.bin'), self.data)
+
+    def test_kernel_copy_into_open_file(self):
+        dest = os.path.join(self.tmpdir, 'out.bin')
+        with open(dest, 'wb') as fp:
+            fp.write(b'head')
+            self.upload.save(fp)
+            self.assertEqual(fp.tell(), 4 + len(self.data))
+            fp.write(b'tail')
+        self.assertEqual(self.read('out.bin'), b'head' + self.data + b'tail')
+
+    def test_copy_resumes_from_current_offset(self):
+        self.upload.file.seek(1000)
+        self.upload.save(os.path.join(self.tmpdir, 'rest.bin'))
+        self.assertEqual(self.read('rest.bin'), self.data[1000:])
+        self.assertEqual(self.upload.file.tell(), 1000)
+
+    def test_python_fallback_without_kernel_copy(self):
+        fail = OSError(38, 'Function not implemented')
+        with mock.patch('lcore.os.copy_file_range', side_effect=fail,
+                        create=True), \
+                mock.patch('lcore.os.sendfile', side_effect=fail, create=True):
+            self.upload.save(BytesIO())  # no fileno(): plain loop
+            dest = os.path.join(self.tmpdir, 'out.bin')
+            with open(dest, 'wb') as fp:
+                self.upload.save(fp)
+        self.assertEqual(self.read('out.bin'), self.data)
+
+    def test_buffered_upload_is_not_linked(self):
+        upload = FileUpload(BytesIO(b'small'), 'f', 'small.txt')
+        upload.save(self.tmpdir)
+        self.assertEqual(self.read('small.txt'), b'small')
+
+
+class _TrackingReader:
+    """wsgi.input stand-in that records how far the body has been read."""
+
+    def __init__(self, data):
+        self.stream = BytesIO(data)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+class TestIterParts(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Lcore()
+        self.ctype = 'multipart/form-data; boundary=' + BOUNDARY
+
+    def post(self, body, path='/upload'):
+        return run_request(self.app, 'POST', path, body=body,
+                           content_type=self.ctype)
+
+    def test_parts_stream_lazily(self):
+        data = os.urandom(200 * 1024)
+        body = encode_multipart([('title', 'report')], [('doc', 'a.bin', data)])
+        seen = {}
+
+        @self.app.post('/upload')
+        def upload():
+            reader = _TrackingReader(body)
+            request.environ['wsgi.input'] = reader
+            parts = request.iter_parts(buffer_size=4096)
+            field = next(parts)
+            self.assertIsInstance(field, StreamingPart)
+            self.assertEqual(field.value, 'report')
+            self.assertLess(reader.stream.tell(), len(body))
+            doc = next(parts)
+            digest = hashlib.sha256()
+            chunks = 0
+            for chunk in doc:
+                digest.update(chunk)
+                chunks += 1
+            seen.update(name=doc.name, filename=doc.filename, size=doc.size,
+                        digest=digest.hexdigest(), chunks=chunks)
+            self.assertEqual(list(parts), [])
+            return 'ok'
+
+        status, _, out = self.post(body)
+        self.assertEqual(out, b'ok')
+        self.assertEqual(seen['name'], 'doc')
+        self.assertEqual(seen['filename'], 'a.bin')
+        self.assertEqual(seen['size'], len(data))
+        self.assertEqual(seen['digest'], hashlib.sha256(data).hexdigest())
+        self.assertGreater(seen['chunks'], 1)
+
+    def test_skipped_parts_are_drained(self):
+        body = encode_multipart([('a', '1'), ('b', '2')],
+                                [('f', 'x.txt', b'skip me'), ('g', 'y.txt', b'keep')])
+
+        @self.app.post('/upload')
+        def upload():
+            return ','.join('%s=%s' % (p.name, p.read().decode())
+                            for p in request.iter_parts() if p.name in 'ag')
+
+        _, _, out = self.post(body)
+        self.assertEqual(out, b'a=1,g=keep')
+
+    def test_save_writes_without_temp_file(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        data = b'payload\r\n' * 5000
+        body = encode_multipart(files=[('f', '../../evil name.txt', data)])
+
+        @self.app.post('/upload')
+        def upload():
+            for part in request.iter_parts():
+                part.save(tmpdir)
+                return part.filename
+
+        _, _, out = self.post(body)
+        self.assertEqual(out, b'evil-name.txt')
+        with open(os.path.join(tmpdir, 'evil-name.txt'), 'rb') as fp:
+            self.assertEqual(fp.read(), data)
+
+    def test_after_post_was_parsed(self):
+        body = encode_multipart([('a', '1')], [('f', 'x.txt', b'abc')])
+
+        @self.app.post('/upload')
+        def upload():
+            self.assertEqual(request.forms.get('a'), '1')
+            return b'|'.join(p.read() for p in request.iter_parts())
+
+        _, _, out = self.post(body)
+        self.assertEqual(out, b'1|abc')
+
+    def test_rejects_non_multipart(self):
+        @self.app.post('/upload')
+        def upload():
+            request.iter_parts()
+
+        status, _, _ = run_request(self.app, 'POST', '/upload', body=b'a=1',
+                                   content_type='application/x-www-form-urlencoded')
+        self.assertEqual(status, '400 Bad Request')
+
+    def test_malformed_stream_raises_400(self):
+        @self.app.post('/upload')
+        def upload():
+            for part in request.iter_parts():
+                part.read()
+
+        status, _, _ = self.post(encode_multipart([('a', '1')])[:-12])
+        self.assertEqual(status, '400 Bad Request')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,13 +2,17 @@
 
 import unittest
 import json
+import dataclasses
+import datetime
+from typing import List, Optional, TypedDict
 
 from helpers import run_request
 
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from lcore import Lcore
+import lcore
+from lcore import Lcore, HTTPResponse
 
 
 class SimplePlugin:
@@ -131,6 +135,185 @@ class TestBuiltinJSONPlugin(unittest.TestCase):
         self.assertEqual(body, b'plain text')
 
 
+class TestJSONBackends(unittest.TestCase):
+    def test_dump_func_callable(self):
+        app = Lcore()
+        app.config['json.dump_func'] = lambda obj: 'custom:%d' % len(obj)
+
+        @app.route('/api')
+        def api():
+            return {'a': 1, 'b': 2}
+
+        _, headers, body = run_request(app, 'GET', '/api')
+        self.assertEqual(body, b'custom:2')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+
+    def test_bytes_backend(self):
+        app = Lcore()
+        app.config['json.dump_func'] = lambda obj: json.dumps(obj).encode('utf8')
+
+        @app.route('/api')
+        def api():
+            return {'name': 'caf\xe9'}
+
+        @app.route('/created')
+        def created():
+            return HTTPResponse({'id': 7}, status=201)
+
+        _, headers, body = run_request(app, 'GET', '/api')
+        self.assertEqual(json.loads(body), {'name': 'caf\xe9'})
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        status, _, body = run_request(app, 'GET', '/created')
+        self.assertEqual((status, body), ('201 Created', b'{"id": 7}'))
+
+    def test_per_route_backend(self):
+        app = Lcore()
+
+        @app.route('/compact', **{'json.dump_func': lambda o: json.dumps(o, separators=(',', ':'))})
+        def compact():
+            return {'a': [1, 2]}
+
+        @app.route('/default')
+        def default():
+            return {'a': [1, 2]}
+
+        self.assertEqual(run_request(app, 'GET', '/compact')[2], b'{"a":[1,2]}')
+        self.assertEqual(run_request(app, 'GET', '/default')[2], b'{"a": [1, 2]}')
+
+    def test_backend_names(self):
+        self.assertIs(lcore._json_backend('json'), json.dumps)
+        self.assertTrue(callable(lcore._json_backend('auto')))
+        with self.assertRaises(ValueError):
+            lcore._json_backend('simplejson')
+        try:
+            import orjson
+        except ImportError:
+            with self.assertRaises(ImportError):
+                lcore._json_backend('orjson')
+        else:
+            self.assertIs(lcore._json_backend('orjson'), orjson.dumps)
+            self.assertIs(lcore._json_backend('auto'), orjson.dumps)
+
+
+class TestResponseModels(unittest.TestCase):
+    @dataclasses.dataclass
+    class Address:
+        city: str
+        since: Optional[datetime.date] = None
+
+    @dataclasses.dataclass
+    class User:
+        id: int
+        created: datetime.datetime
+        address: 'TestResponseModels.Address'
+        tags: List[str] = dataclasses.field(default_factory=list)
+
+    class Event(TypedDict):
+        name: str
+        at: datetime.datetime
+
+    def user(self, uid=1):
+        return self.User(uid, datetime.datetime(2024, 5, 1, 12, 30),
+                         self.Address('Kathmandu', datetime.date(2020, 1, 2)),
+                         ['admin'])
+
+    def test_annotated_dataclass(self):
+        app = Lcore()
+        User = self.User
+
+        @app.route('/user')
+        def get_user() -> User:
+            return self.user()
+
+        _, headers, body = run_request(app, 'GET', '/user')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(body), {
+            'id': 1, 'created': '2024-05-01T12:30:00',
+            'address': {'city': 'Kathmandu', 'since': '2020-01-02'},
+            'tags': ['admin']})
+
+    def test_list_and_typeddict_models(self):
+        app = Lcore()
+        User, Event = self.User, self.Event
+
+        @app.route('/users')
+        def users() -> List[User]:
+            return [self.user(1), self.user(2)]
+
+        @app.route('/event')
+        def event() -> Event:
+            return {'name': 'launch', 'at': datetime.datetime(2024, 1, 1)}
+
+        data = json.loads(run_request(app, 'GET', '/users')[2])
+        self.assertEqual([u['id'] for u in data], [1, 2])
+        self.assertEqual(json.loads(run_request(app, 'GET', '/event')[2]),
+                         {'name': 'launch', 'at': '2024-01-01T00:00:00'})
+
+    @unittest.skipIf(sys.version_info < (3, 9), 'PEP 585 generics need 3.9+')
+    def test_builtin_generic_annotations(self):
+        app = Lcore()
+        User = self.User
+
+        @app.route('/users')
+        def users() -> list[User]:
+            return [self.user(1), self.user(2)]
+
+        @app.route('/by-id')
+        def by_id() -> dict[str, User]:
+            return {'a': self.user(3)}
+
+        status, _, body = run_request(app, 'GET', '/users')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual([u['address']['since'] for u in json.loads(body)],
+                         ['2020-01-02', '2020-01-02'])
+        data = json.loads(run_request(app, 'GET', '/by-id')[2])
+        self.assertEqual(data['a']['created'], '2024-05-01T12:30:00')
+        self.assertEqual(lcore._response_model(users)[0], list)
+
+    def test_unannotated_dataclass_and_http_response(self):
+        app = Lcore()
+
+        @app.route('/plain')
+        def plain():
+            return self.Address('Pokhara')
+
+        @app.route('/created')
+        def created():
+            return HTTPResponse(self.Address('Lalitpur'), status=201)
+
+        self.assertEqual(json.loads(run_request(app, 'GET', '/plain')[2]),
+                         {'city': 'Pokhara', 'since': None})
+        status, _, body = run_request(app, 'GET', '/created')
+        self.assertEqual(status, '201 Created')
+        self.assertEqual(json.loads(body), {'city': 'Lalitpur', 'since': None})
+
+    def test_other_results_untouched(self):
+        app = Lcore()
+        User = self.User
+
+        @app.route('/maybe')
+        def maybe() -> Optional[User]:
+            return 'not a user'
+
+        @app.route('/error')
+        def error() -> User:
+            return HTTPResponse({'error': 'gone'}, status=410)
+
+        self.assertEqual(run_request(app, 'GET', '/maybe')[2], b'not a user')
+        self.assertEqual(json.loads(run_request(app, 'GET', '/error')[2]),
+                         {'error': 'gone'})
+
+    def test_encoder_matches_asdict(self):
+        encode = lcore._json_encoder(self.User)
+        self.assertIs(encode, lcore._json_encoder(self.User))
+        user = self.user()
+        expected = dataclasses.asdict(user)
+        expected['created'] = user.created.isoformat()
+        expected['address']['since'] = user.address.since.isoformat()
+        self.assertEqual(encode(user), expected)
+        self.assertIsNone(lcore._json_encoder(List[int]))
+
+
 class TestRouteSpecificPluginSkip(unittest.TestCase):
     def test_skip_plugin_on_route(self):
         app = Lcore()
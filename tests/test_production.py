@@ -1,21 +1,23 @@
-import sys, os, unittest, json, threading, time, hashlib, hmac, base64, tempfile
+import sys, os, unittest, unittest.mock, concurrent.futures, json, threading, time, hashlib, hmac, base64, tempfile, gzip, zlib
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from io import BytesIO, StringIO
 from datetime import timedelta
+import lcore
 from lcore import (
     Lcore, request, response, ctx, tob, touni, json_dumps, json_loads,
-    HTTPError, HTTPResponse, _lscmp, load,
+    HTTPError, HTTPResponse, _lscmp, _negotiate_encoding, load,
     rate_limit, static_file, html_escape,
-    CORSMiddleware, CompressionMiddleware, BodyLimitMiddleware,
+    CORSMiddleware, CompressionMiddleware, BodyLimitMiddleware, ETagMiddleware,
+    ResponseCacheMiddleware, ResponseCacheBackend, MemoryResponseCacheBackend,
     MiddlewareHook, DependencyContainer, Middleware,
     RequestIDMiddleware, SecurityHeadersMiddleware,
     on_shutdown, _shutdown_hooks,
     cached_property as CachedProperty,
     hash_password, verify_password,
     TestClient, TestResponse,
-    BackgroundTaskPool,
+    BackgroundTaskPool, memoize,
 )
 from tests.helpers import create_environ, run_request
 
@@ -859,10 +861,11 @@ class TestMiddlewarePipelineCache(unittest.TestCase):
             return 'b'
 
         run_request(app, 'GET', '/a')
-        chain1 = app.middleware._global_post_chain
+        chain1 = app.middleware._frozen.routes[app.routes[0]]
         run_request(app, 'GET', '/b')
-        chain2 = app.middleware._global_post_chain
+        chain2 = app.middleware._frozen.routes[app.routes[1]]
         self.assertIs(chain1, chain2)
+        self.assertIs(chain1, app.middleware._frozen.post)
 
     def test_cache_invalidated_on_add(self):
         app = Lcore()
@@ -873,10 +876,13 @@ class TestMiddlewarePipelineCache(unittest.TestCase):
             return 'a'
 
         run_request(app, 'GET', '/a')
-        old_chain = app.middleware._global_post_chain
+        old_chain = app.middleware._frozen.post
 
         app.use(SecurityHeadersMiddleware())
-        self.assertIsNone(app.middleware._global_post_chain)
+        new_chain = app.middleware._frozen.post
+        self.assertIsNot(new_chain, old_chain)
+        self.assertEqual(len(new_chain), 2)
+        self.assertIs(app.middleware._frozen.routes[app.routes[0]], new_chain)
 
 
 class TestEdgeCases(unittest.TestCase):
@@ -1110,6 +1116,713 @@ class TestCompressionMiddlewareFix(unittest.TestCase):
         )
         self.assertNotIn('Content-Encoding', headers)
 
+    def test_partial_and_non_200_responses_untouched(self):
+        self.app.use(ETagMiddleware())
+        root = tempfile.mkdtemp()
+        self.addCleanup(__import__('shutil').rmtree, root)
+        with open(os.path.join(root, 'data.txt'), 'wb') as f:
+            f.write(b'0123456789' * 1200)
+
+        @self.app.route('/data')
+        def data():
+            return static_file('data.txt', root=root)
+
+        @self.app.route('/moved')
+        def moved():
+            return HTTPResponse('see other ' * 50, status=303, Location='/data')
+
+        status, headers, body = run_request(
+            self.app, 'GET', '/data',
+            headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=0-999'})
+        self.assertTrue(status.startswith('206'))
+        self.assertEqual(headers['Content-Range'], 'bytes 0-999/12000')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, (b'0123456789' * 100))
+        status, headers, body = run_request(
+            self.app, 'GET', '/moved', headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue(status.startswith('303'))
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, b'see other ' * 50)
+
+
+class TestStreamingCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Lcore()
+        self.app.use(CompressionMiddleware(min_size=100, flush_size=1000))
+        self.produced = []
+        self.closed = []
+
+    def rows(self, count, size=100):
+        try:
+            for i in range(count):
+                self.produced.append(i)
+                yield ('%04d' % i) + 'x' * (size - 5) + '\n'
+        finally:
+            self.closed.append(True)
+
+    def open_stream(self, path):
+        headers = {}
+        environ = create_environ('GET', path, headers={'Accept-Encoding': 'gzip'})
+        out = self.app(environ, lambda s, h, e=None: headers.update(h))
+        return headers, out
+
+    def test_generator_compressed_incrementally(self):
+        @self.app.route('/export')
+        def export():
+            return self.rows(1000)
+
+        headers, out = self.open_stream('/export')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', headers)
+        decoder = zlib.decompressobj(31)
+        received = decoder.decompress(next(iter(out)))
+        self.assertTrue(received.startswith(b'0000x'))
+        self.assertLess(len(self.produced), 1000)
+        received += b''.join(decoder.decompress(c) for c in out)
+        out.close()
+        self.assertEqual(received, ''.join(self.rows(1000)).encode())
+        self.assertEqual(self.closed, [True, True])
+
+    def test_event_stream_flushed_per_event(self):
+        @self.app.route('/events')
+        def events():
+            response.content_type = 'text/event-stream'
+            return ('data: %d %s\n\n' % (i, '.' * 100) for i in range(5))
+
+        _, out = self.open_stream('/events')
+        decoder = zlib.decompressobj(31)
+        events = [decoder.decompress(chunk) for chunk in out]
+        self.assertEqual(events[0], b'data: 0 ' + b'.' * 100 + b'\n\n')
+        self.assertEqual(events[4], b'data: 4 ' + b'.' * 100 + b'\n\n')
+
+    def test_event_stream_first_event_not_held_back(self):
+        def events():
+            for i in range(50):
+                self.produced.append(i)
+                yield 'data: %d\n\n' % i
+
+        @self.app.route('/ticks')
+        def ticks():
+            response.content_type = 'text/event-stream'
+            return events()
+
+        headers, out = self.open_stream('/ticks')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        decoder = zlib.decompressobj(31)
+        self.assertEqual(decoder.decompress(next(iter(out))), b'data: 0\n\n')
+        self.assertEqual(self.produced, [0])
+        out.close()
+
+    def test_short_stream_sent_uncompressed(self):
+        @self.app.route('/short')
+        def short():
+            return self.rows(1, size=20)
+
+        status, headers, body = run_request(self.app, 'GET', '/short',
+                                            headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, b'0000' + b'x' * 15 + b'\n')
+        self.assertEqual(self.closed, [True])
+
+    def test_buffered_mode(self):
+        app = Lcore()
+        app.use(CompressionMiddleware(min_size=100, stream=False))
+
+        @app.route('/export')
+        def export():
+            return self.rows(50)
+
+        _, headers, body = run_request(app, 'GET', '/export',
+                                       headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(gzip.decompress(body), ''.join(self.rows(50)).encode())
+
+    def test_source_closed_on_disconnect(self):
+        @self.app.route('/export')
+        def export():
+            return self.rows(100000)
+
+        _, out = self.open_stream('/export')
+        next(iter(out))
+        out.close()
+        self.assertEqual(self.closed, [True])
+        self.assertLess(len(self.produced), 1000)
+
+
+class TestCompressionNegotiation(unittest.TestCase):
+
+    def test_q_values(self):
+        available = ('gzip', 'deflate')
+        for header, expected in [('gzip, deflate, br', 'gzip'),
+                                 ('deflate;q=1.0, gzip;q=0.5', 'deflate'),
+                                 ('x-gzip', 'gzip'),
+                                 ('*', 'gzip'),
+                                 ('gzip;q=0, *;q=0.2', 'deflate'),
+                                 ('gzip;q=0', None),
+                                 ('identity', None),
+                                 ('gzip;q=high', None)]:
+            self.assertEqual(_negotiate_encoding(header, available), expected, header)
+
+    def test_deflate_response(self):
+        app = Lcore()
+        app.use(CompressionMiddleware(min_size=10))
+
+        @app.route('/data')
+        def data():
+            return 'D' * 500
+
+        _, headers, body = run_request(app, 'GET', '/data', headers={
+            'Accept-Encoding': 'gzip;q=0.8, deflate'})
+        self.assertEqual(headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(body), b'D' * 500)
+
+    def test_optional_codecs(self):
+        class FakeBrotli:
+            def compress(self, body, level):
+                return b'br:' + body
+
+            def stream(self, level):
+                return (lambda data: data, lambda: b'|', lambda: b'.')
+
+        def missing():
+            raise ImportError('zstandard')
+
+        with unittest.mock.patch.dict(lcore._compression_codecs,
+                                      {'br': FakeBrotli, 'zstd': missing}):
+            middleware = CompressionMiddleware(min_size=10, flush_size=1)
+        self.assertEqual(list(middleware.codecs), ['br', 'gzip', 'deflate'])
+        app = Lcore()
+        app.use(middleware)
+
+        @app.route('/data')
+        def data():
+            return 'B' * 20
+
+        @app.route('/stream')
+        def stream():
+            return iter(['abcdefghij', 'klm'])
+
+        accept = {'Accept-Encoding': 'gzip, deflate, br, zstd'}
+        _, headers, body = run_request(app, 'GET', '/data', headers=accept)
+        self.assertEqual((headers['Content-Encoding'], body), ('br', b'br:' + b'B' * 20))
+        _, headers, body = run_request(app, 'GET', '/stream', headers=accept)
+        self.assertEqual(body, b'abcdefghij|klm|.')
+
+
+class TestParallelCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.body = b''.join(b'{"id": %d, "name": "user%d"}\n' % (i, i * 7)
+                             for i in range(5000))
+
+    def test_blocks_form_one_stream(self):
+        pool = concurrent.futures.ThreadPoolExecutor(2)
+        for wbits, decompress in ((31, gzip.decompress), (15, zlib.decompress)):
+            codec = lcore._ZlibCodec(wbits)
+            for block_size in (1000, 32768, len(self.body) + 1):
+                data = codec.compress_blocks(self.body, 6, block_size, pool)
+                self.assertEqual(decompress(data), self.body)
+            serial = len(codec.compress(self.body, 6))
+            self.assertLess(len(codec.compress_blocks(self.body, 6, 16384, pool)),
+                            serial * 1.05)
+        pool.shutdown()
+
+    def test_middleware_threshold(self):
+        app = Lcore()
+        middleware = CompressionMiddleware(parallel_size=100000, block_size=16384,
+                                           workers=2)
+        app.use(middleware)
+
+        @app.route('/big')
+        def big():
+            return self.body
+
+        @app.route('/small')
+        def small():
+            return self.body[:50000]
+
+        _, headers, body = run_request(app, 'GET', '/small',
+                                       headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(middleware._pool)
+        self.assertEqual(gzip.decompress(body), self.body[:50000])
+        for encoding, decompress in (('gzip', gzip.decompress),
+                                     ('deflate', zlib.decompress)):
+            _, headers, body = run_request(app, 'GET', '/big',
+                                           headers={'Accept-Encoding': encoding})
+            self.assertEqual(headers['Content-Encoding'], encoding)
+            self.assertEqual(headers['Content-Length'], str(len(body)))
+            self.assertEqual(decompress(body), self.body)
+        self.assertIsNotNone(middleware._pool)
+
+
+class TestCompressionCache(unittest.TestCase):
+
+    def test_repeated_bodies_hit_cache(self):
+        app = Lcore()
+        middleware = CompressionMiddleware(min_size=10, cache_bytes=10000)
+        app.use(middleware)
+        catalog = json.dumps([{'sku': i, 'name': 'item %d' % i} for i in range(200)])
+
+        @app.route('/catalog')
+        def get_catalog():
+            return catalog
+
+        with unittest.mock.patch.object(middleware, '_compress',
+                                        wraps=middleware._compress) as compress:
+            bodies = [run_request(app, 'GET', '/catalog',
+                                  headers={'Accept-Encoding': enc})[2]
+                      for enc in ('gzip', 'gzip', 'gzip', 'deflate')]
+        self.assertEqual(compress.call_count, 2)
+        self.assertEqual(bodies[0], bodies[2])
+        self.assertEqual(gzip.decompress(bodies[1]), catalog.encode())
+        self.assertEqual(zlib.decompress(bodies[3]), catalog.encode())
+        info = middleware.cache_info()
+        self.assertEqual((info['hits'], info['misses'], info['entries']), (2, 2, 2))
+        self.assertEqual(info['hit_rate'], 0.5)
+        self.assertEqual(info['bytes_saved'], 2 * len(catalog))
+
+    def test_bounded_by_bytes(self):
+        middleware = CompressionMiddleware(cache_bytes=300)
+        bodies = [os.urandom(120) for _ in range(4)]
+        for body in bodies:
+            middleware._compress_cached(body, 'gzip')
+        info = middleware.cache_info()
+        self.assertLessEqual(info['size'], 300)
+        self.assertEqual(info['entries'], 2)
+        middleware._compress_cached(bodies[-1], 'gzip')
+        middleware._compress_cached(bodies[0], 'gzip')
+        self.assertEqual(middleware.cache_info()['hits'], 1)
+        middleware._compress_cached(os.urandom(1000), 'gzip')  # too big to keep
+        self.assertEqual(middleware.cache_info()['entries'], 2)
+
+
+class TestETagMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Lcore()
+        self.app.use(ETagMiddleware())
+        self.calls = []
+
+        @self.app.route('/items')
+        def items():
+            self.calls.append('items')
+            return {'items': [1, 2, 3]}
+
+    def test_hash_and_304(self):
+        _, headers, body = run_request(self.app, 'GET', '/items')
+        etag = headers['Etag']
+        self.assertRegex(etag, r'^"[0-9a-f]{32}"$')
+        status, headers, body = run_request(
+            self.app, 'GET', '/items', headers={'If-None-Match': 'W/%s, "x"' % etag})
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, b'')
+        self.assertEqual(headers['Etag'], etag)
+        self.assertNotIn('Content-Length', headers)
+        status, _, body = run_request(
+            self.app, 'GET', '/items', headers={'If-None-Match': '"other"'})
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(json.loads(body), {'items': [1, 2, 3]})
+
+    def test_handler_etag_and_weak_option(self):
+        app = Lcore()
+        app.use(ETagMiddleware(weak=True))
+
+        @app.route('/own')
+        def own():
+            response.set_header('ETag', '"v7"')
+            return 'body'
+
+        @app.route('/hashed')
+        def hashed():
+            return HTTPResponse('body', headers={'Cache-Control': 'no-cache'})
+
+        status, headers, _ = run_request(app, 'GET', '/own',
+                                         headers={'If-None-Match': '"v7"'})
+        self.assertEqual((status, headers['Etag']), ('304 Not Modified', '"v7"'))
+        _, headers, _ = run_request(app, 'GET', '/hashed')
+        self.assertTrue(headers['Etag'].startswith('W/"'))
+        self.assertEqual(headers['Cache-Control'], 'no-cache')
+
+    def test_route_version_skips_handler(self):
+        @self.app.route('/feed/<name>', etag=lambda name: 'feed-%s-3' % name)
+        def feed(name):
+            self.calls.append(name)
+            return {'name': name}
+
+        _, headers, _ = run_request(self.app, 'GET', '/feed/news')
+        self.assertEqual(headers['Etag'], '"feed-news-3"')
+        status, _, _ = run_request(self.app, 'GET', '/feed/news',
+                                   headers={'If-None-Match': '"feed-news-3"'})
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(self.calls, ['news'])
+
+    def test_app_config_etag_not_inherited(self):
+        self.app.config['etag'] = lambda **_: 'global'
+        _, headers, _ = run_request(self.app, 'GET', '/items')
+        self.assertNotEqual(headers['Etag'], '"global"')
+        self.assertEqual(self.calls, ['items'])
+
+    def test_untagged_requests(self):
+        @self.app.route('/stream')
+        def stream():
+            yield b'a'
+            yield b'b'
+
+        @self.app.post('/items')
+        def create():
+            return {'ok': True}
+
+        _, headers, body = run_request(self.app, 'GET', '/stream')
+        self.assertEqual((body, headers.get('Etag')), (b'ab', None))
+        _, headers, _ = run_request(self.app, 'POST', '/items')
+        self.assertNotIn('Etag', headers)
+
+    def test_compression_weakens_etag(self):
+        self.app.use(CompressionMiddleware(min_size=10))
+
+        @self.app.route('/big')
+        def big():
+            return 'x' * 500
+
+        _, plain, _ = run_request(self.app, 'GET', '/big')
+        _, gzipped, _ = run_request(self.app, 'GET', '/big',
+                                    headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzipped['Etag'], 'W/' + plain['Etag'])
+        status, _, _ = run_request(self.app, 'GET', '/big', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': gzipped['Etag']})
+        self.assertEqual(status, '304 Not Modified')
+
+
+class TestResponseCacheMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Lcore()
+        self.cache = ResponseCacheMiddleware()
+        self.app.use(RequestIDMiddleware())
+        self.app.use(self.cache)
+        self.calls = []
+
+        @self.app.route('/items')
+        def items():
+            self.calls.append(request.query.get('page'))
+            response.set_header('X-Generated', str(len(self.calls)))
+            return {'items': [1, 2, 3]}
+
+    def test_hit_replays_handler_response(self):
+        _, first, body = run_request(self.app, 'GET', '/items')
+        status, second, cached = run_request(self.app, 'GET', '/items')
+        self.assertEqual((status, cached), ('200 OK', body))
+        self.assertEqual(second['Content-Type'], 'application/json')
+        self.assertEqual(second['X-Generated'], '1')
+        self.assertNotEqual(second['X-Request-Id'], first['X-Request-Id'])
+        _, _, head = run_request(self.app, 'HEAD', '/items')
+        self.assertEqual(head, b'')
+        run_request(self.app, 'GET', '/items', query_string='page=2')
+        self.assertEqual(self.calls, [None, '2'])
+        info = self.cache.cache_info()
+        self.assertEqual((info['hits'], info['misses']), (2, 2))
+
+    def test_uncacheable_responses(self):
+        @self.app.route('/private')
+        def private():
+            self.calls.append('private')
+            response.set_header('Cache-Control', 'private, max-age=60')
+            return 'mine'
+
+        @self.app.route('/login')
+        def login():
+            self.calls.append('login')
+            response.set_cookie('session', 'abc')
+            return 'hi'
+
+        @self.app.route('/missing')
+        def missing():
+            self.calls.append('missing')
+            raise HTTPError(404)
+
+        @self.app.route('/expired')
+        def expired():
+            self.calls.append('expired')
+            return HTTPResponse('old', headers={'Cache-Control': 'max-age=0'})
+
+        for path in ('/private', '/login', '/missing', '/expired') * 2:
+            run_request(self.app, 'GET', path)
+        run_request(self.app, 'GET', '/items', headers={'Authorization': 'Bearer x'})
+        run_request(self.app, 'GET', '/items', headers={'Authorization': 'Bearer x'})
+        self.assertEqual(self.calls, ['private', 'login', 'missing', 'expired'] * 2
+                         + [None, None])
+
+    def test_cookie_requests_bypass_by_default(self):
+        @self.app.route('/me')
+        def me():
+            return 'hello ' + request.get_cookie('user', 'anon')
+
+        for user in ('alice', 'bob'):
+            _, _, body = run_request(self.app, 'GET', '/me',
+                                     headers={'Cookie': 'user=' + user})
+            self.assertEqual(body, ('hello ' + user).encode())
+        self.assertEqual(self.cache.cache_info()['hits'], 0)
+
+        app, keyed = Lcore(), ResponseCacheMiddleware(key_headers=('Cookie',))
+        app.use(keyed)
+        app.route('/me')(me)
+        for user in ('alice', 'bob', 'alice'):
+            _, _, body = run_request(app, 'GET', '/me',
+                                     headers={'Cookie': 'user=' + user})
+            self.assertEqual(body, ('hello ' + user).encode())
+        self.assertEqual(keyed.cache_info()['hits'], 1)
+
+    def test_vary_splits_entries(self):
+        @self.app.route('/greeting')
+        def greeting():
+            lang = request.get_header('Accept-Language', 'en')
+            self.calls.append(lang)
+            response.set_header('Vary', 'Accept-Language')
+            return 'hello' if lang == 'en' else 'hola'
+
+        for lang in ('en', 'es', 'en', 'es'):
+            _, headers, body = run_request(self.app, 'GET', '/greeting',
+                                           headers={'Accept-Language': lang})
+            self.assertEqual(body, b'hello' if lang == 'en' else b'hola')
+            self.assertEqual(headers['Vary'], 'Accept-Language')
+        self.assertEqual(self.calls, ['en', 'es'])
+
+    def test_concurrent_misses_run_handler_once(self):
+        started, release = threading.Event(), threading.Event()
+
+        @self.app.route('/slow')
+        def slow():
+            self.calls.append('slow')
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        bodies = []
+        threads = [threading.Thread(target=lambda: bodies.append(
+            run_request(self.app, 'GET', '/slow')[2])) for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        deadline = time.time() + 5
+        while self.cache.cache_info()['misses'] < 4 and time.time() < deadline:
+            time.sleep(0.005)
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(bodies, [b'done'] * 4)
+        self.assertEqual(self.calls, ['slow'])
+        self.assertEqual(self.cache.cache_info()['coalesced'], 3)
+
+    def test_threaded_counters_add_up(self):
+        self.app.route('/hot')(lambda: 'hot')
+
+        def hammer():
+            for _ in range(50):
+                run_request(self.app, 'GET', '/hot')
+
+        threads = [threading.Thread(target=hammer) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        info = self.cache.cache_info()
+        self.assertEqual(info['hits'] + info['misses'], 400)
+
+    def test_memory_backend_ttl_and_size(self):
+        backend = MemoryResponseCacheBackend(max_bytes=100)
+        with unittest.mock.patch('lcore.time.monotonic', return_value=1000.0):
+            backend.set('a', ('200 OK', (), b'a'), 10, 40)
+            backend.set('b', ('200 OK', (), b'b'), 10, 40)
+            self.assertEqual(backend.get('a')[2], b'a')
+            backend.set('c', ('200 OK', (), b'c'), 10, 40)  # evicts b, the LRU
+            backend.set('huge', ('200 OK', (), b''), 10, 101)
+        self.assertEqual((backend.get('b'), backend.get('huge')), (None, None))
+        self.assertEqual((len(backend), backend.size), (2, 80))
+        with unittest.mock.patch('lcore.time.monotonic', return_value=1010.0):
+            self.assertIsNone(backend.get('a'))
+        self.assertEqual(backend.size, 40)
+
+    def test_custom_backend(self):
+        class DictBackend(ResponseCacheBackend):
+            def __init__(self):
+                self.data = {}
+
+            def get(self, key):
+                return self.data.get(key)
+
+            def set(self, key, entry, ttl, size):
+                self.data[key] = entry
+
+        backend = DictBackend()
+        app = Lcore()
+        app.use(ResponseCacheMiddleware(backend=backend, key_headers=['X-Tenant']))
+        app.route('/')(lambda: 'tenant ' + request.get_header('X-Tenant', '-'))
+        for tenant in ('a', 'b', 'a'):
+            _, _, body = run_request(app, 'GET', '/', headers={'X-Tenant': tenant})
+            self.assertEqual(body, tob('tenant ' + tenant))
+        self.assertEqual(sorted(entry[2] for entry in backend.data.values()),
+                         [b'tenant a', b'tenant b'])
+        with self.assertRaises(TypeError):
+            ResponseCacheBackend()
+
+
+class TestMemoize(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Lcore()
+        self.calls = []
+
+    def test_route_option(self):
+        @self.app.get('/users/<id:int>', cache=dict(ttl=30))
+        def user(id):
+            self.calls.append(id)
+            return {'id': id, 'page': request.query.get('page')}
+
+        @self.app.get('/ping', cache=30)
+        def ping():
+            self.calls.append('ping')
+            return 'pong'
+
+        for path in ('/users/1', '/users/2', '/users/1', '/ping', '/ping'):
+            status, headers, body = run_request(self.app, 'GET', path)
+            self.assertEqual(status, '200 OK')
+        self.assertEqual(self.calls, [1, 2, 'ping'])
+        _, headers, body = run_request(self.app, 'GET', '/users/2',
+                                       query_string='page=9')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(body), {'id': 2, 'page': None})
+
+    def test_app_config_not_inherited(self):
+        self.app.config['cache.redis_url'] = 'redis://x'
+        self.app.config['cache.ttl'] = 60
+
+        @self.app.get('/live')
+        def live():
+            self.calls.append('live')
+            return 'ok'
+
+        for _ in range(2):
+            status, _, _ = run_request(self.app, 'GET', '/live')
+            self.assertEqual(status, '200 OK')
+        self.assertEqual(self.calls, ['live', 'live'])
+        with self.assertRaises(TypeError):
+            self.app.get('/bad', cache=dict(ttl=5, redis_url='x'))(lambda: 'x')
+
+    def test_stale_while_revalidate(self):
+        pool = BackgroundTaskPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        clock = [1000.0]
+
+        @self.app.get('/report', cache=dict(ttl=10, swr=60, pool=pool))
+        def report():
+            self.calls.append(request.query.get('v'))
+            return {'version': len(self.calls)}
+
+        def get(v):
+            with unittest.mock.patch('lcore.time.monotonic', lambda: clock[0]):
+                body = run_request(self.app, 'GET', '/report',
+                                   query_string='v=%s' % v)[2]
+                deadline = time.time() + 5
+                while pool.pending and time.time() < deadline:
+                    time.sleep(0.005)
+            return json.loads(body)['version']
+
+        self.assertEqual(get('a'), 1)
+        clock[0] += 5
+        self.assertEqual(get('b'), 1)           # fresh
+        clock[0] += 10
+        self.assertEqual(get('c'), 1)           # stale, refreshed in background
+        self.assertEqual(self.calls, ['a', 'c'])
+        self.assertEqual(get('d'), 2)
+        clock[0] += 100
+        self.assertEqual(get('e'), 3)           # past swr: synchronous miss
+        self.assertEqual(self.calls, ['a', 'c', 'e'])
+
+    def test_refresh_binds_context(self):
+        pool = BackgroundTaskPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        clock = [1000.0]
+        closed = []
+
+        class Session:
+            def close(self):
+                closed.append(True)
+
+        self.app.inject('db', Session, lifetime='scoped')
+
+        @self.app.get('/me', cache=dict(ttl=10, swr=60, pool=pool))
+        def me():
+            self.calls.append((ctx.app is self.app, ctx.route.rule,
+                               isinstance(ctx.db, Session)))
+            return 'ok'
+
+        with unittest.mock.patch('lcore.time.monotonic', lambda: clock[0]):
+            run_request(self.app, 'GET', '/me')
+            clock[0] += 20
+            run_request(self.app, 'GET', '/me')
+            deadline = time.time() + 5
+            while pool.pending and time.time() < deadline:
+                time.sleep(0.005)
+        self.assertEqual(self.calls, [(True, '/me', True)] * 2)
+        self.assertEqual(len(closed), 2)
+        leftover = pool.submit(lambda: dict(request.environ)).result(5)
+        self.assertNotIn('PATH_INFO', leftover)
+
+    def test_concurrent_misses_run_once(self):
+        release = threading.Event()
+
+        @memoize(ttl=30)
+        def slow(id):
+            self.calls.append(id)
+            release.wait(5)
+            return {'id': id}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow(id=7)))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        deadline = time.time() + 5
+        while slow.cache_info()['misses'] < 4 and time.time() < deadline:
+            time.sleep(0.005)
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(self.calls, [7])
+        self.assertEqual(results, [{'id': 7}] * 4)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_eviction_and_uncacheable_values(self):
+        @memoize(ttl=30, max_entries=2, key=lambda id, **_: id)
+        def item(id, extra=None):
+            self.calls.append(id)
+            return [id] * 10
+
+        for id in (1, 2, 1, 3, 2):
+            item(id=id, extra=object())
+        self.assertEqual(self.calls, [1, 2, 3, 2])
+        self.assertEqual(item.cache_info()['entries'], 2)
+
+        @memoize(ttl=30, max_bytes=2000)
+        def sized(n):
+            self.calls.append(n)
+            return 'x' * n
+
+        sized(n=1500), sized(n=1500), sized(n=5000), sized(n=5000)
+        self.assertEqual(self.calls[-3:], [1500, 5000, 5000])
+        self.assertLessEqual(sized.cache_info()['size'], 2000)
+
+        @memoize(ttl=30)
+        def stream():
+            self.calls.append('stream')
+            yield b'chunk'
+
+        list(stream()), list(stream())
+        self.assertEqual(self.calls[-2:], ['stream', 'stream'])
+        stream.cache_clear()
+
 
 class TestPasswordHashing(unittest.TestCase):
 
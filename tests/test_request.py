@@ -8,7 +8,7 @@ from helpers import create_environ, run_request
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from lcore import Lcore, request, BaseRequest
+from lcore import Lcore, request, BaseRequest, WSGIHeaderDict
 
 
 class TestQueryParameters(unittest.TestCase):
@@ -73,6 +73,59 @@ class TestRequestHeaders(unittest.TestCase):
         self.assertEqual(body, b'localhost:8080')
 
 
+class TestWSGIHeaderDict(unittest.TestCase):
+    def setUp(self):
+        self.environ = create_environ(
+            headers={'X-Custom': 'a', 'Accept-Encoding': 'gzip',
+                     'X-Utf8': 'caf\xc3\xa9'},
+            content_type='text/plain')
+        self.headers = WSGIHeaderDict(self.environ)
+
+    def test_lookup_any_spelling(self):
+        for name in ('x-custom', 'X-Custom', 'X_CUSTOM', 'x-CUSTOM'):
+            self.assertEqual(self.headers.get(name), 'a')
+        self.assertEqual(self.headers['content-type'], 'text/plain')
+        self.assertEqual(self.headers.get('X-Utf8'), 'caf\xe9')
+        self.assertEqual(self.headers.raw('X-Utf8'), 'caf\xc3\xa9')
+        self.assertIsNone(self.headers.get('X-Missing'))
+        self.assertEqual(self.headers.get('X-Missing', 'd'), 'd')
+        self.assertIn('accept-encoding', self.headers)
+
+    def test_snapshot(self):
+        snap = self.headers.snapshot()
+        self.assertEqual(snap, {
+            'Host': 'localhost:8080', 'Content-Length': '0',
+            'Content-Type': 'text/plain', 'X-Custom': 'a',
+            'Accept-Encoding': 'gzip', 'X-Utf8': 'caf\xe9'})
+        snap['X-Custom'] = 'changed'
+        self.assertEqual(self.headers['X-Custom'], 'a')
+
+    def test_index_follows_environ_changes(self):
+        self.assertEqual(len(self.headers), 6)
+        self.environ['HTTP_X_ADDED'] = '1'
+        self.assertIn('X-Added', self.headers.keys())
+        self.assertEqual(self.headers.snapshot()['X-Added'], '1')
+        del self.environ['HTTP_X_CUSTOM']
+        self.assertNotIn('X-Custom', list(self.headers))
+
+    def test_index_follows_same_size_rename(self):
+        self.assertIn('X-Custom', self.headers.keys())
+        self.environ['HTTP_X_RENAMED'] = self.environ.pop('HTTP_X_CUSTOM')
+        self.assertEqual(self.headers.snapshot()['X-Renamed'], 'a')
+        self.assertNotIn('X-Custom', list(self.headers))
+
+    def test_cgi_key_wins_over_http_duplicate(self):
+        self.environ['HTTP_CONTENT_TYPE'] = 'text/html'
+        self.assertEqual(self.headers.snapshot()['Content-Type'], 'text/plain')
+        self.assertEqual(self.headers.keys().count('Content-Type'), 1)
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            self.headers['X-Custom'] = 'b'
+        with self.assertRaises(TypeError):
+            del self.headers['X-Custom']
+
+
 class TestRequestMethod(unittest.TestCase):
     def setUp(self):
         self.app = Lcore()
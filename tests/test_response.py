@@ -1,6 +1,7 @@
 """Tests for Lcore response handling."""
 
 import unittest
+import gzip
 import json
 
 from helpers import run_request
@@ -8,7 +9,8 @@ from helpers import run_request
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from lcore import Lcore, response, HTTPResponse, HTTPError, BaseResponse
+from lcore import Lcore, response, HTTPResponse, HTTPError, BaseResponse, \
+    HeaderBlock, PrecomputedResponse, CompressionMiddleware, StreamingJSON
 
 
 class TestStatusCodes(unittest.TestCase):
@@ -118,6 +120,151 @@ class TestHTTPResponse(unittest.TestCase):
         self.assertIn('500', status)
 
 
+class TestPrecomputedResponse(unittest.TestCase):
+    def setUp(self):
+        self.app = Lcore()
+
+    def test_returned_from_handler(self):
+        health = PrecomputedResponse('ok \u2713', headers={'Cache-Control': 'no-store'})
+
+        @self.app.route('/health')
+        def check():
+            return health
+
+        for _ in range(2):
+            status, headers, body = run_request(self.app, 'GET', '/health')
+            self.assertEqual(status, '200 OK')
+            self.assertEqual(body, 'ok \u2713'.encode('utf8'))
+            self.assertEqual(headers['Content-Length'], str(len(body)))
+            self.assertEqual(headers['Cache-Control'], 'no-store')
+        _, headers, body = run_request(self.app, 'HEAD', '/health')
+        self.assertEqual(body, b'')
+
+    def test_json_body_and_status(self):
+        created = PrecomputedResponse({}, status=201)
+
+        @self.app.post('/items')
+        def create():
+            raise created
+
+        status, headers, body = run_request(self.app, 'POST', '/items')
+        self.assertEqual(status, '201 Created')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(body, b'{}')
+
+    def test_error_handler_result(self):
+        not_found = PrecomputedResponse({'error': 'not found'}, status=404)
+        self.app.error(404)(lambda err: not_found)
+
+        @self.app.route('/html')
+        def html():
+            response.content_type = 'text/html'
+            raise HTTPError(404)
+
+        status, headers, body = run_request(self.app, 'GET', '/missing')
+        self.assertEqual(status, '404 Not Found')
+        self.assertEqual(body, b'{"error": "not found"}')
+        _, headers, _ = run_request(self.app, 'GET', '/html')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+
+    def test_shared_template_is_not_mutated(self):
+        tpl = PrecomputedResponse(b'x', headers={'Link': '</a>'})
+
+        @self.app.route('/')
+        def index():
+            response.set_header('X-Handler', '1')
+            return tpl
+
+        @self.app.hook('after_request')
+        def more_links():
+            response.add_header('Link', '</b>')
+
+        _, headers, _ = run_request(self.app, 'GET', '/')
+        self.assertEqual(headers['X-Handler'], '1')
+        self.assertEqual(tpl.headers.getall('Link'), ['</a>'])
+        for mutate in (lambda: tpl.set_header('A', '1'),
+                       lambda: tpl.add_header('A', '1'),
+                       lambda: tpl.set_cookie('a', '1'),
+                       lambda: setattr(tpl, 'status', 500),
+                       lambda: setattr(tpl, 'body', b'y')):
+            with self.assertRaises(TypeError):
+                mutate()
+        with self.assertRaises(TypeError):
+            PrecomputedResponse(42)
+
+    def test_compression_applies_headers_first(self):
+        self.app.use(CompressionMiddleware(min_size=10))
+        page = PrecomputedResponse(b'{"k": "' + b'v' * 500 + b'"}', status=202,
+                                   headers={'Content-Type': 'application/json'})
+
+        @self.app.route('/')
+        def index():
+            return page
+
+        status, headers, body = run_request(
+            self.app, 'GET', '/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(status, '202 Accepted')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(gzip.decompress(body), page.body)
+
+
+class TestStreamingJSON(unittest.TestCase):
+    def setUp(self):
+        self.app = Lcore()
+
+    def test_large_array_is_chunked(self):
+        rows = [{'id': i, 'name': 'row %d' % i} for i in range(5000)]
+
+        @self.app.route('/export')
+        def export():
+            return StreamingJSON(iter(rows), chunk_size=4096)
+
+        status, headers, body = run_request(self.app, 'GET', '/export')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertNotIn('Content-Length', headers)
+        self.assertEqual(json.loads(body), rows)
+
+    def test_chunks_are_coalesced(self):
+        chunks = list(StreamingJSON(range(10000), batch_size=100,
+                                    chunk_size=1000).body)
+        self.assertGreater(len(chunks), 10)
+        self.assertTrue(all(len(c) >= 1000 for c in chunks[:-1]))
+        self.assertEqual(json.loads(b''.join(chunks)), list(range(10000)))
+
+    def test_empty_and_small(self):
+        self.assertEqual(b''.join(StreamingJSON([]).body), b'[]')
+        self.assertEqual(json.loads(b''.join(StreamingJSON(['a', None]).body)),
+                         ['a', None])
+
+    def test_custom_dumps_and_status(self):
+        compact = lambda o: json.dumps(o, separators=(',', ':')).encode()
+        resp = StreamingJSON([{'a': 1}, {'b': 2}], dumps=compact, status=206,
+                             headers={'Content-Type': 'application/x-ndjson'})
+        self.assertEqual(b''.join(resp.body), b'[{"a":1},{"b":2}]')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp.content_type, 'application/x-ndjson')
+
+    def test_source_closed(self):
+        closed = []
+
+        def rows():
+            try:
+                for i in range(100000):
+                    yield i
+            finally:
+                closed.append(True)
+
+        @self.app.route('/export')
+        def export():
+            return StreamingJSON(rows(), batch_size=10, chunk_size=64)
+
+        _, _, body = run_request(self.app, 'HEAD', '/export')
+        self.assertEqual(body, b'')
+        self.assertEqual(closed, [True])
+
+
 class TestBaseResponse(unittest.TestCase):
     def test_status_code(self):
         r = BaseResponse()
@@ -141,5 +288,56 @@ class TestBaseResponse(unittest.TestCase):
         self.assertEqual(r.charset, 'utf-8')
 
 
+class TestHeaderBlock(unittest.TestCase):
+    def test_names_normalized_and_values_validated(self):
+        block = HeaderBlock([('x_frame-options', 'DENY'), ('Link', '</a>'),
+                             ('link', '</b>')])
+        self.assertEqual(list(block), [('X-Frame-Options', 'DENY'),
+                                       ('Link', '</a>'), ('Link', '</b>')])
+        self.assertEqual(len(block), 3)
+        with self.assertRaises(ValueError):
+            HeaderBlock({'X-Bad': 'a\nb'})
+        with self.assertRaises(ValueError):
+            HeaderBlock({'X-Bad\r': 'a'})
+
+    def test_immutable(self):
+        block = HeaderBlock({'A': '1'})
+        with self.assertRaises(AttributeError):
+            block._items = ()
+        self.assertEqual(block, HeaderBlock({'a': '1'}))
+        self.assertEqual(hash(block), hash(HeaderBlock({'a': '1'})))
+
+    def test_set_headers_replaces_existing(self):
+        block = HeaderBlock({'X-A': '1', 'Cache-Control': 'no-store'})
+        r = BaseResponse()
+        r.add_header('X-A', 'old')
+        r.add_header('X-A', 'older')
+        r.set_headers(block)
+        r.add_header('X-A', '2')
+        self.assertEqual(r.headers.getall('X-A'), ['1', '2'])
+        self.assertEqual(r.get_header('Cache-Control'), 'no-store')
+        other = BaseResponse()
+        other.set_headers(block)
+        self.assertEqual(other.headers.getall('X-A'), ['1'])
+
+    def test_set_headers_from_dict(self):
+        r = BaseResponse()
+        r.set_headers({'x-one': '1', 'X-Two': '2'})
+        self.assertEqual(r.get_header('X-One'), '1')
+        with self.assertRaises(ValueError):
+            r.set_headers({'X-Bad': '\0'})
+
+    def test_headerlist_encoding(self):
+        r = BaseResponse()
+        r.set_header('X-Ascii', 'plain')
+        r.set_header('X-Utf8', 'caf\xe9')
+        r.set_cookie('c', 'v')
+        headers = dict(r.headerlist)
+        self.assertEqual(headers['X-Ascii'], 'plain')
+        self.assertEqual(headers['X-Utf8'], 'caf\xc3\xa9')
+        self.assertEqual(headers['Content-Type'], r.default_content_type)
+        self.assertTrue(headers['Set-Cookie'].startswith('c=v'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -5,13 +5,14 @@ import json as json_mod
 import re
 import sys
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List, Optional
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from helpers import create_environ, run_request
 from lcore import (Lcore, SecurityHeadersMiddleware, CSRFMiddleware,
-                   rate_limit, validate_request)
+                   rate_limit, validate_request, request)
 
 
 def _run_environ(app, environ):
@@ -116,6 +117,27 @@ class TestSecurityHeadersMiddleware(unittest.TestCase):
         # Other defaults still present
         self.assertEqual(headers.get('X-Content-Type-Options'), 'nosniff')
 
+    def test_headers_edited_after_construction(self):
+        """Changes to mw.headers after construction are still applied."""
+        app = Lcore()
+        mw = SecurityHeadersMiddleware()
+        app.use(mw)
+
+        @app.route('/test')
+        def handler():
+            return 'ok'
+
+        mw.headers['X-Frame-Options'] = 'DENY'
+        del mw.headers['X-XSS-Protection']
+        _, headers, _ = run_request(app, 'GET', '/test')
+        self.assertEqual(headers.get('X-Frame-Options'), 'DENY')
+        self.assertNotIn('X-Xss-Protection', headers)
+
+    def test_invalid_header_rejected_at_construction(self):
+        """Control characters in configured headers fail fast."""
+        with self.assertRaises(ValueError):
+            SecurityHeadersMiddleware(**{'X-Bad': 'a\r\nSet-Cookie: x=1'})
+
 
 # ---------------------------------------------------------------------------
 # CSRFMiddleware
@@ -322,6 +344,21 @@ class SearchQuery:
     page: int
 
 
+@dataclass
+class Address:
+    city: str
+    zip: Optional[int] = None
+
+
+@dataclass
+class CreateOrder:
+    address: Address
+    quantities: List[int]
+    note: Optional[str] = None
+    tags: List[str] = field(default_factory=list)
+    priority: int = 1
+
+
 class TestValidateRequest(unittest.TestCase):
     """Tests for the validate_request decorator."""
 
@@ -447,6 +484,166 @@ class TestValidateRequest(unittest.TestCase):
         self.assertEqual(status, '200 OK')
         self.assertEqual(body, b'ok')
 
+    def test_nested_schema_coerced_with_defaults(self):
+        """Nested dataclasses and lists are coerced; defaults are filled in."""
+        app = Lcore()
+
+        @app.route('/orders', method='POST')
+        @validate_request(body=CreateOrder)
+        def create_order():
+            return json_mod.dumps(request.json, sort_keys=True)
+
+        payload = json_mod.dumps({'address': {'city': ' Kathmandu ', 'zip': '44600'},
+                                  'quantities': ['1', 2], 'note': None}).encode()
+        status, _, body = run_request(app, 'POST', '/orders', body=payload,
+                                      content_type='application/json')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(json_mod.loads(body), {
+            'address': {'city': 'Kathmandu', 'zip': 44600},
+            'quantities': [1, 2], 'note': None, 'tags': [], 'priority': 1})
+
+    def test_nested_errors_use_paths(self):
+        """Errors inside nested objects and lists are keyed by their path."""
+        app = Lcore()
+
+        app.error(422)(lambda err: err.body)
+
+        @app.route('/orders', method='POST')
+        @validate_request(body=CreateOrder)
+        def create_order():
+            return 'created'
+
+        payload = json_mod.dumps({'address': {'zip': 'x'},
+                                  'quantities': [1, 'two']}).encode()
+        status, _, body = run_request(app, 'POST', '/orders', body=payload,
+                                      content_type='application/json')
+        self.assertIn('422', status)
+        self.assertEqual(json_mod.loads(body)['fields'], {
+            'address.city': 'address.city is required',
+            'address.zip': 'address.zip must be int',
+            'quantities[1]': 'quantities[1] must be int'})
+
+        payload = json_mod.dumps({'address': 'nowhere', 'quantities': 3}).encode()
+        _, _, body = run_request(app, 'POST', '/orders', body=payload,
+                                 content_type='application/json')
+        self.assertEqual(json_mod.loads(body)['fields'], {
+            'address': 'address must be Address',
+            'quantities': 'quantities must be list'})
+
+    def test_query_params_coerced(self):
+        """Query parameters are type-checked and replaced by coerced values."""
+        app = Lcore()
+
+        app.error(400)(lambda err: err.body)
+
+        @app.route('/search')
+        @validate_request(query={'q': str, 'page': int, 'exact': Optional[bool]})
+        def search():
+            return json_mod.dumps([request.query.q, request.query.get('page'),
+                                   request.query.get('exact'),
+                                   'exact' in request.query])
+
+        _, _, body = run_request(app, 'GET', '/search',
+                                 query_string='q=+hello+&page=3&exact=yes')
+        self.assertEqual(json_mod.loads(body), ['hello', 3, True, True])
+        _, _, body = run_request(app, 'GET', '/search', query_string='q=a&page=1')
+        self.assertEqual(json_mod.loads(body), ['a', 1, None, False])
+        status, _, body = run_request(app, 'GET', '/search',
+                                      query_string='q=hello&page=last')
+        self.assertIn('400', status)
+        self.assertEqual(json_mod.loads(body)['fields'],
+                         {'page': 'page must be int'})
+
+    def test_repeated_query_params(self):
+        """List fields see every value; scalar fields keep the extras."""
+        app = Lcore()
+        app.error(400)(lambda err: err.body)
+
+        @app.route('/filter')
+        @validate_request(query={'ids': List[int], 'tag': str})
+        def filter_():
+            return json_mod.dumps([request.query.getall('ids'),
+                                   request.query.getall('tag')])
+
+        status, _, body = run_request(app, 'GET', '/filter',
+                                      query_string='ids=1&ids=2&tag=a&tag=b')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(json_mod.loads(body), [[1, 2], ['a', 'b']])
+        status, _, body = run_request(app, 'GET', '/filter',
+                                      query_string='ids=1&ids=x&tag=a')
+        self.assertIn('400', status)
+        self.assertEqual(json_mod.loads(body)['fields'],
+                         {'ids[1]': 'ids[1] must be int'})
+
+
+class TestValidateRequestBatch(unittest.TestCase):
+    """Tests for validate_request(body=List[Schema])."""
+
+    def setUp(self):
+        self.app = Lcore()
+        self.app.error(422)(lambda err: err.body)
+        self.seen = []
+
+    def post(self, path, payload):
+        body = payload if isinstance(payload, bytes) else json_mod.dumps(payload).encode()
+        return run_request(self.app, 'POST', path, body=body,
+                           content_type='application/json')
+
+    def route(self, **options):
+        @self.app.route('/import', method='POST')
+        @validate_request(body=List[CreateItem], **options)
+        def bulk_import():
+            self.seen.append(request.json)
+            return 'imported %d' % len(request.json)
+
+    def test_valid_array_is_coerced(self):
+        self.route()
+        status, _, body = self.post('/import', [{'name': ' a ', 'price': '1.5'},
+                                                {'name': 'b', 'price': 2}])
+        self.assertEqual((status, body), ('200 OK', b'imported 2'))
+        self.assertEqual(self.seen, [[{'name': 'a', 'price': 1.5},
+                                      {'name': 'b', 'price': 2.0}]])
+
+    def test_errors_are_indexed_and_capped(self):
+        self.route(max_errors=3)
+        items = [{'name': 'ok', 'price': 1}, {'name': 'x'}, 'junk'] + \
+                [{'price': 'free'}] * 50
+        status, _, body = self.post('/import', items)
+        self.assertIn('422', status)
+        result = json_mod.loads(body)
+        self.assertEqual(result['fields'], {
+            '[1].price': '[1].price is required',
+            '[2]': '[2] must be CreateItem',
+            '[3].name': '[3].name is required'})
+        self.assertTrue(result['truncated'])
+        self.assertEqual(self.seen, [])
+
+    def test_object_body_rejected(self):
+        for stream in (False, True):
+            self.app = Lcore()
+            self.route(stream=stream)
+            status, _, _ = self.post('/import', {'name': 'a', 'price': 1})
+            self.assertIn('400', status)
+
+    def test_stream_validates_while_parsing(self):
+        self.route(stream=True)
+        items = [{'name': 'item %d' % i, 'price': str(i)} for i in range(3000)]
+        status, _, body = self.post('/import', items)
+        self.assertEqual((status, body), ('200 OK', b'imported 3000'))
+        self.assertEqual(self.seen[0][2999], {'name': 'item 2999', 'price': 2999.0})
+
+        self.app.error(400)(lambda err: 'bad json')
+        status, _, body = self.post('/import', b'[{"name": "a", "price": 1}, {')
+        self.assertEqual((status, body), ('400 Bad Request', b'bad json'))
+
+    def test_stream_stops_at_error_cap(self):
+        self.route(stream=True, max_errors=1)
+        # Everything after the first bad element is never parsed.
+        status, _, body = self.post('/import', b'[{"name": "a"}, not json at all')
+        self.assertIn('422', status)
+        self.assertEqual(json_mod.loads(body)['fields'],
+                         {'[0].price': '[0].price is required'})
+
 
 if __name__ == '__main__':
     unittest.main()
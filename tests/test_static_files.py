@@ -1,15 +1,18 @@
 """Tests for Lcore static file serving."""
 
 import unittest
+import gzip
 import os
 import tempfile
+from unittest import mock
 
 from helpers import run_request
 
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from lcore import Lcore, static_file
+import lcore
+from lcore import Lcore, static_file, precompress_static, CompressionMiddleware
 
 
 class TestStaticFile(unittest.TestCase):
@@ -108,5 +111,137 @@ class TestStaticFile(unittest.TestCase):
         self.assertIn('Last-Modified', headers)
 
 
+class TestPrecompressedStatic(unittest.TestCase):
+    def setUp(self):
+        self.app = Lcore()
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = b'console.log("precompressed");\n' * 200
+        self.js = os.path.join(self.tmpdir, 'app.js')
+        with open(self.js, 'wb') as f:
+            f.write(self.source)
+
+        @self.app.route('/static/<filename:path>')
+        def serve(filename):
+            return static_file(filename, root=self.tmpdir, precompressed=True)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir)
+
+    def get(self, encoding=None, **headers):
+        if encoding:
+            headers['Accept-Encoding'] = encoding
+        return run_request(self.app, 'GET', '/static/app.js', headers=headers)
+
+    def test_serves_gzip_sidecar(self):
+        self.assertEqual(precompress_static(self.tmpdir, encodings=('gzip',)),
+                         [self.js + '.gz'])
+        status, headers, body = self.get('gzip, deflate')
+        self.assertIn('200', status)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertIn('javascript', headers['Content-Type'])
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(gzip.decompress(body), self.source)
+
+        _, plain, body = self.get('identity')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(plain['Vary'], 'Accept-Encoding')
+        self.assertEqual(body, self.source)
+        self.assertNotEqual(plain['Etag'], headers['Etag'])
+        _, bare, body = self.get()
+        self.assertNotIn('Content-Encoding', bare)
+        self.assertEqual(bare['Vary'], 'Accept-Encoding')
+        self.assertEqual(body, self.source)
+
+        status, _, body = self.get('gzip', If_None_Match=headers['Etag'])
+        self.assertIn('304', status)
+        self.assertEqual(body, b'')
+
+    def test_prefers_negotiated_encoding(self):
+        with open(self.js + '.br', 'wb') as f:
+            f.write(b'brotli bytes')
+        precompress_static(self.tmpdir, encodings=('gzip',))
+        _, headers, body = self.get('gzip, br')
+        self.assertEqual(headers['Content-Encoding'], 'br')
+        self.assertEqual(body, b'brotli bytes')
+        _, headers, _ = self.get('gzip;q=1, br;q=0.5')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+
+    def test_stale_sidecar_ignored(self):
+        precompress_static(self.tmpdir, encodings=('gzip',))
+        st = os.stat(self.js)
+        os.utime(self.js + '.gz', (st.st_atime, st.st_mtime - 10))
+        _, headers, body = self.get('gzip')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, self.source)
+        # Rebuilding refreshes only the stale file
+        self.assertEqual(len(precompress_static(self.tmpdir, encodings=('gzip',))), 1)
+        self.assertEqual(precompress_static(self.tmpdir, encodings=('gzip',)), [])
+
+    def test_compression_middleware_skips_sidecar(self):
+        self.app.use(CompressionMiddleware(min_size=10))
+        precompress_static(self.tmpdir, encodings=('gzip',))
+        _, headers, body = self.get('gzip')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), self.source)
+
+    def test_precompress_filters(self):
+        with open(os.path.join(self.tmpdir, 'tiny.css'), 'wb') as f:
+            f.write(b'a{}')
+        with open(os.path.join(self.tmpdir, 'photo.png'), 'wb') as f:
+            f.write(b'\x89PNG' * 1000)
+        with open(os.path.join(self.tmpdir, 'random.txt'), 'wb') as f:
+            f.write(os.urandom(4096))
+        written = precompress_static(self.tmpdir, encodings=('br', 'gzip'))
+        brotli = self._has('brotli')
+        expected = [self.js + '.gz'] + ([self.js + '.br'] if brotli else [])
+        self.assertEqual(sorted(written), sorted(expected))
+
+    def test_explicit_etag_per_representation(self):
+        precompress_static(self.tmpdir, encodings=('gzip',))
+
+        @self.app.route('/tagged')
+        def tagged():
+            return static_file('app.js', root=self.tmpdir, etag='v1',
+                               precompressed=True)
+
+        _, gz, _ = run_request(self.app, 'GET', '/tagged',
+                               headers={'Accept-Encoding': 'gzip'})
+        _, plain, _ = run_request(self.app, 'GET', '/tagged')
+        self.assertEqual(gz['Content-Encoding'], 'gzip')
+        self.assertEqual(gz['Etag'], 'v1-gzip')
+        self.assertEqual(plain['Etag'], 'v1')
+
+    def test_off_by_default(self):
+        precompress_static(self.tmpdir, encodings=('gzip',))
+        self.app.route('/plain')(lambda: static_file('app.js', root=self.tmpdir))
+        _, headers, body = run_request(self.app, 'GET', '/plain',
+                                       headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertNotIn('Vary', headers)
+        self.assertEqual(body, self.source)
+
+    def test_unsupported_encoding_rejected(self):
+        with self.assertRaises(ValueError):
+            precompress_static(self.tmpdir, encodings=('gzip', 'deflate'))
+        self.assertFalse(os.path.exists(self.js + '.gz'))
+
+    def test_cli(self):
+        with mock.patch('sys.stdout'):
+            with self.assertRaises(SystemExit) as exit:
+                lcore._main(['lcore', '--precompress', self.tmpdir])
+        self.assertEqual(exit.exception.code, 0)
+        self.assertTrue(os.path.exists(self.js + '.gz'))
+
+    @staticmethod
+    def _has(module):
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            return False
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -11,6 +11,7 @@ from lcore import (
     http_date, parse_date, cookie_encode, cookie_decode, cookie_is_encoded,
     MultiDict, FormsDict, HeaderDict, BaseResponse
 )
+import lcore
 
 
 class TestStringHelpers(unittest.TestCase):
@@ -152,5 +153,37 @@ class TestHeaderDict(unittest.TestCase):
         self.assertEqual(len(d.getall('Set-Cookie')), 2)
 
 
+class TestHeaderNameNormalization(unittest.TestCase):
+    def test_matches_title_case_rule(self):
+        names = list(lcore._STANDARD_HEADERS) + [
+            'content_type', 'x-my-header', 'X_CUSTOM_thing', 'etag', 'te']
+        for name in names:
+            for spelling in (name, name.lower(), name.upper()):
+                self.assertEqual(lcore._hkey(spelling),
+                                 spelling.title().replace('_', '-'))
+        self.assertEqual(lcore._hkey(b'x-from-bytes'), 'X-From-Bytes')
+        self.assertEqual(lcore._hkey(None), '')
+
+    def test_standard_names_are_interned(self):
+        self.assertIs(lcore._hkey('content-type'), lcore._hkey('Content-Type'))
+        self.assertIs(lcore._hkey('x-new-' + 'header'), lcore._hkey('X-New-Header'))
+
+    def test_control_characters_rejected(self):
+        for bad in ('X-Bad\n', 'X\rBad', b'X-\0', 'Set-Cookie\r\nX: 1'):
+            with self.assertRaises(ValueError):
+                lcore._hkey(bad)
+        self.assertNotIn('X-Bad\n', lcore._hkey_cache)
+        with self.assertRaises(ValueError):
+            lcore._hval('a\r\nb')
+
+    def test_memo_is_bounded(self):
+        saved = dict(lcore._hkey_cache)
+        self.addCleanup(lambda: (lcore._hkey_cache.clear(),
+                                 lcore._hkey_cache.update(saved)))
+        for i in range(lcore._hkey_cache_max + 50):
+            self.assertEqual(lcore._hkey('x-h%d' % i), 'X-H%d' % i)
+        self.assertEqual(len(lcore._hkey_cache), lcore._hkey_cache_max)
+
+
 if __name__ == '__main__':
     unittest.main()